@@ -0,0 +1,440 @@
+"""
+Benchmarks the bulk write and read paths against a database
+
+Each case reports rows/sec, peak Python memory (tracemalloc) and the number of queries executed. Results can be
+written as JSON and compared with an earlier run, to catch regressions between releases
+
+    python benchmarks/bulk_ops.py [--database sqlite|postgresql] [--rows 1000,10000] [--fields 1,3,5]
+                                  [--repeat N] [--only PREFIX] [--output results.json]
+                                  [--compare baseline.json] [--threshold 0.1]
+
+SQLite runs against a temporary file, so concurrent writers share the database. PostgreSQL connects with
+the BENCH_PG_NAME, BENCH_PG_USER, BENCH_PG_PASSWORD, BENCH_PG_HOST and BENCH_PG_PORT environment variables
+(by default to a local database named bulkmodel_bench) and also runs the COPY cases.
+
+Queries are counted with execute wrappers, so COPY statements, which don't go through them, aren't counted.
+With --compare the script exits with status 1 if any case's rows/sec dropped by more than the threshold
+
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.conf import settings
+
+
+def get_database_settings(vendor):
+    if vendor == 'sqlite':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(tempfile.mkdtemp(prefix='bulkmodel_bench_'), 'bench.sqlite3'),
+        }
+
+    if vendor == 'postgresql':
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BENCH_PG_NAME', 'bulkmodel_bench'),
+            'USER': os.environ.get('BENCH_PG_USER', ''),
+            'PASSWORD': os.environ.get('BENCH_PG_PASSWORD', ''),
+            'HOST': os.environ.get('BENCH_PG_HOST', 'localhost'),
+            'PORT': os.environ.get('BENCH_PG_PORT', ''),
+        }
+
+    raise ValueError('Unknown database: {}'.format(vendor))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark bulk write and read paths')
+    parser.add_argument('--database', choices=['sqlite', 'postgresql'], default='sqlite')
+    parser.add_argument('--rows', default='1000,10000', help='comma separated row counts')
+    parser.add_argument('--fields', default='1,3,5', help='comma separated numbers of fields to update')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='batch size of every case; SQLite inserts at most 500 rows per statement')
+    parser.add_argument('--workers', type=int, default=4, help='workers used by the concurrent cases')
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per case; the fastest is reported')
+    parser.add_argument('--only', default=None, help='only run cases whose name starts with this prefix')
+    parser.add_argument('--output', default=None, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, help='compare with results from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction of rows/sec a case can lose before it counts as a regression')
+    return parser.parse_args(argv)
+
+
+args = parse_args()
+
+settings.configure(
+    INSTALLED_APPS=['bulkmodel'],
+    DATABASES={'default': get_database_settings(args.database)},
+    USE_TZ=True,
+)
+django.setup()
+
+from django.db import connection, models
+from django.db.backends.signals import connection_created
+from bulkmodel.models import BulkModel
+
+
+FIELD_NAMES = ['f1', 'f2', 'f3', 'f4', 'f5']
+
+
+class BenchRow(BulkModel):
+    name = models.CharField(max_length=50)
+    f1 = models.IntegerField(default=0)
+    f2 = models.IntegerField(default=0)
+    f3 = models.FloatField(default=0)
+    f4 = models.FloatField(default=0)
+    f5 = models.CharField(max_length=20, default='')
+
+    class Meta:
+        app_label = 'bulkmodel'
+
+
+
+class BenchTag(models.Model):
+    name = models.CharField(max_length=20)
+
+    class Meta:
+        app_label = 'bulkmodel'
+
+
+
+class BenchItem(BulkModel):
+    name = models.CharField(max_length=50)
+    tags = models.ManyToManyField(BenchTag)
+
+    class Meta:
+        app_label = 'bulkmodel'
+
+
+
+class QueryCounter(object):
+    """
+    Counts queries on every connection, including those opened by worker threads
+
+    """
+    def __init__(self):
+        self.n = 0
+        self._lock = threading.Lock()
+
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.n += 1
+
+        return execute(sql, params, many, context)
+
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+queries = QueryCounter()
+connection_created.connect(queries.install)
+
+
+def create_tables():
+    with connection.schema_editor() as schema_editor:
+        for model in [BenchRow, BenchTag, BenchItem]:
+            schema_editor.create_model(model)
+
+
+def clear_tables():
+    for model in [BenchItem.tags.through, BenchItem, BenchTag, BenchRow]:
+        model._base_manager.all()._raw_delete(connection.alias)
+
+
+def make_rows(n):
+    return [
+        BenchRow(name='row %d' % i, f1=i, f2=-i, f3=i / 7.0, f4=i / 3.0, f5='v%d' % i)
+        for i in range(n)
+    ]
+
+
+def seed_rows(n):
+    BenchRow.objects.bulk_create(make_rows(n), batch_size=args.batch_size, send_signal=False)
+
+
+
+class Case(object):
+    """
+    A benchmark case; setup() prepares the database and returns the argument passed to run()
+
+    """
+    def __init__(self, name, n_rows, run, setup=None, n_fields=None):
+        self.name = name
+        self.n_rows = n_rows
+        self.n_fields = n_fields
+        self._run = run
+        self._setup = setup
+
+
+    def setup(self):
+        clear_tables()
+        return self._setup() if self._setup else None
+
+
+    def measure(self):
+        seconds = None
+        n_queries = None
+
+        for _ in range(max(1, args.repeat)):
+            state = self.setup()
+
+            queries.install(connection)
+            before = queries.n
+            start = time.perf_counter()
+            self._run(state)
+            elapsed = time.perf_counter() - start
+
+            n_queries = queries.n - before
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+        # memory is measured on a separate run, since tracing slows the code down
+        state = self.setup()
+        tracemalloc.start()
+        try:
+            self._run(state)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'name': self.name,
+            'database': connection.vendor,
+            'rows': self.n_rows,
+            'fields': self.n_fields,
+            'seconds': seconds,
+            'rows_per_sec': self.n_rows / seconds if seconds else None,
+            'peak_memory': peak_memory,
+            'queries': n_queries,
+        }
+
+
+
+def get_cases(row_counts, field_counts):
+    batch_size = args.batch_size
+    workers = args.workers
+    cases = []
+
+    for n in row_counts:
+        cases.extend([
+            Case('bulk_create/plain/{}'.format(n), n, lambda objs: BenchRow.objects.bulk_create(
+                objs, batch_size=batch_size, send_signal=False
+            ), setup=lambda n=n: make_rows(n)),
+
+            Case('bulk_create/concurrent/{}'.format(n), n, lambda objs: BenchRow.objects.bulk_create(
+                objs, batch_size=batch_size, send_signal=False, concurrent=True, max_concurrent_workers=workers
+            ), setup=lambda n=n: make_rows(n)),
+
+            Case('bulk_create/return_queryset/{}'.format(n), n, lambda objs: list(BenchRow.objects.bulk_create(
+                objs, batch_size=batch_size, send_signal=False, return_queryset=True
+            )), setup=lambda n=n: make_rows(n)),
+        ])
+
+        for n_fields in field_counts:
+            fieldnames = FIELD_NAMES[:n_fields]
+            values = {'f1': 1, 'f2': 2, 'f3': 3.0, 'f4': 4.0, 'f5': 'x'}
+
+            cases.append(Case(
+                'update/{}/{}'.format(n, n_fields), n,
+                lambda _, fieldnames=fieldnames: BenchRow.objects.all().update(
+                    batch_size=batch_size, send_signals=False, **{f: values[f] for f in fieldnames}
+                ),
+                setup=lambda n=n: seed_rows(n), n_fields=n_fields,
+            ))
+
+            cases.append(Case(
+                'update_fields/{}/{}'.format(n, n_fields), n,
+                lambda qs, fieldnames=fieldnames: qs.update_fields(
+                    *fieldnames, batch_size=batch_size, send_signal=False
+                ),
+                setup=lambda n=n: get_changed_queryset(n), n_fields=n_fields,
+            ))
+
+        if connection.vendor == 'postgresql':
+            cases.extend([
+                Case('copy_from_objects/{}'.format(n), n, lambda objs: BenchRow.objects.copy_from_objects(
+                    objs, batch_size=batch_size, signal=False
+                ), setup=lambda n=n: make_rows(n)),
+
+                Case('copy_from_objects/binary/{}'.format(n), n, lambda objs: BenchRow.objects.copy_from_objects(
+                    objs, batch_size=batch_size, signal=False, format='binary'
+                ), setup=lambda n=n: make_rows(n)),
+
+                Case('copy_to_instances/{}'.format(n), n, lambda _: BenchRow.objects.copy_to_instances(),
+                     setup=lambda n=n: seed_rows(n)),
+            ])
+
+        cases.extend([
+            Case('update_m2m_fields/insert/{}'.format(n), n * 3, lambda state: BenchItem.objects.update_m2m_fields(
+                'tags', state[1], batch_size=batch_size, send_signal=False
+            ), setup=lambda n=n: seed_m2m(n)),
+
+            Case('update_m2m_fields/diff/{}'.format(n), n * 3, lambda state: BenchItem.objects.update_m2m_fields(
+                'tags', state[2], batch_size=batch_size, send_signal=False
+            ), setup=lambda n=n: seed_m2m(n, write=True)),
+        ])
+
+    return cases
+
+
+def get_changed_queryset(n):
+    seed_rows(n)
+
+    qs = BenchRow.objects.all()
+    for obj in qs:
+        obj.f1 += 1
+        obj.f2 -= 1
+        obj.f3 += 0.5
+        obj.f4 -= 0.5
+        obj.f5 = 'w%d' % obj.pk
+
+    return qs
+
+
+def seed_m2m(n, write=False):
+    """
+    Creates n items and a pool of tags; returns (items, mapping of 3 tags per item, the mapping with one tag
+    of every item replaced)
+    """
+    rng = random.Random(n)
+
+    tags = [BenchTag(name='tag %d' % i) for i in range(50)]
+    BenchTag.objects.bulk_create(tags)
+    tag_pks = list(BenchTag.objects.values_list('pk', flat=True))
+
+    BenchItem.objects.bulk_create([BenchItem(name='item %d' % i) for i in range(n)], send_signal=False)
+    item_pks = list(BenchItem.objects.values_list('pk', flat=True))
+
+    mapping = {pk: rng.sample(tag_pks, 3) for pk in item_pks}
+    changed = {}
+    for pk, related in mapping.items():
+        replacement = rng.choice([t for t in tag_pks if t not in related])
+        changed[pk] = related[1:] + [replacement]
+
+    if write:
+        BenchItem.objects.update_m2m_fields('tags', mapping, batch_size=args.batch_size, send_signal=False)
+
+    return item_pks, mapping, changed
+
+
+def get_git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_metadata():
+    connection.ensure_connection()
+
+    if connection.vendor == 'sqlite':
+        version = connection.Database.sqlite_version
+    else:
+        version = str(connection.pg_version)
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': get_git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'database_version': version,
+        'batch_size': args.batch_size,
+        'workers': args.workers,
+        'repeat': args.repeat,
+    }
+
+
+def format_memory(n):
+    return '{:.1f} MB'.format(n / 1024.0 / 1024.0)
+
+
+def print_result(result):
+    print('{:<40} {:>12,.0f} rows/sec {:>10} {:>7} queries'.format(
+        result['name'], result['rows_per_sec'] or 0, format_memory(result['peak_memory']), result['queries']
+    ))
+
+
+def compare(results, path, threshold):
+    """
+    Prints the change in rows/sec of each case against an earlier run
+
+    :return: names of the cases that regressed
+    """
+    with open(path) as f:
+        baseline = {(r['name'], r['database']): r for r in json.load(f)['results']}
+
+    regressions = []
+    print()
+    print('compared with {}'.format(path))
+
+    for result in results:
+        before = baseline.get((result['name'], result['database']))
+        if not before or not before['rows_per_sec'] or not result['rows_per_sec']:
+            continue
+
+        change = result['rows_per_sec'] / before['rows_per_sec'] - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(result['name'])
+
+        print('{:<40} {:>+8.1%} rows/sec {:>+8.1%} memory {:>+6} queries{}'.format(
+            result['name'], change,
+            result['peak_memory'] / before['peak_memory'] - 1 if before['peak_memory'] else 0,
+            result['queries'] - before['queries'],
+            '  REGRESSION' if regressed else '',
+        ))
+
+    return regressions
+
+
+def main():
+    row_counts = [int(n) for n in args.rows.split(',')]
+    field_counts = [int(n) for n in args.fields.split(',')]
+
+    create_tables()
+    metadata = get_metadata()
+    print('{database} {database_version}, django {django}, python {python}'.format(**metadata))
+    print()
+
+    results = []
+    for case in get_cases(row_counts, field_counts):
+        if args.only and not case.name.startswith(args.only):
+            continue
+
+        result = case.measure()
+        print_result(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': metadata, 'results': results}, f, indent=2)
+
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+
+    if connection.vendor == 'sqlite':
+        connection.close()
+        shutil.rmtree(os.path.dirname(settings.DATABASES['default']['NAME']), ignore_errors=True)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
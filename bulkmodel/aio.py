@@ -0,0 +1,81 @@
+def supports_async_copy(connection):
+    """
+    Returns whether COPY can be run natively from asyncio, i.e. on PostgreSQL through psycopg 3
+
+    :param connection:
+    :return:
+    """
+    if connection.vendor != 'postgresql':
+        return False
+
+    return getattr(connection.Database, '__name__', None) == 'psycopg'
+
+
+
+class AsyncCopyWriter(object):
+    """
+    Runs COPY ... FROM STDIN over psycopg 3 async connections opened with the settings of a Django connection
+
+    A connection is opened for each concurrent write and reused by later ones, so the number of connections
+    is bounded by the number of writes awaited at once. Connections are in autocommit mode, like the
+    connections used by the synchronous COPY methods
+
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self._idle = []
+
+
+    def get_connection_params(self):
+        params = self.connection.get_connection_params()
+
+        # the cursor class Django configures is synchronous
+        params.pop('cursor_factory', None)
+        return params
+
+
+    async def _acquire(self):
+        if self._idle:
+            return self._idle.pop()
+
+        import psycopg
+
+        conn = await psycopg.AsyncConnection.connect(autocommit=True, **self.get_connection_params())
+
+        # match the session time zone Django sets on its own connections
+        timezone_name = getattr(self.connection, 'timezone_name', None)
+        if timezone_name:
+            await conn.execute('SELECT set_config(%s, %s, false)', ['TimeZone', timezone_name])
+
+        return conn
+
+
+    async def write(self, sql, blocks):
+        """
+        Runs a COPY ... FROM STDIN statement, sending blocks of data as they're produced
+
+        :param str sql:
+        :param collections.Iterable blocks: str or bytes
+        :return: number of characters (or bytes) sent
+        """
+        conn = await self._acquire()
+        n = 0
+
+        try:
+            async with conn.cursor() as cursor:
+                async with cursor.copy(sql) as copy:
+                    for block in blocks:
+                        await copy.write(block)
+                        n += len(block)
+
+        except BaseException:
+            await conn.close()
+            raise
+
+        self._idle.append(conn)
+        return n
+
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
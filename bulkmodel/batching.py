@@ -0,0 +1,111 @@
+import itertools
+import threading
+import time
+from django.conf import settings
+
+
+# bound parameters per statement for backends that don't declare a limit; PostgreSQL's protocol counts them in 16 bits
+DEFAULT_MAX_QUERY_PARAMS = 65535
+
+
+def get_max_query_params(connection):
+    """
+    Returns the maximum number of parameters that can be bound to a single statement
+
+    :param connection:
+    :return: int
+    """
+    return getattr(connection.features, 'max_query_params', None) or DEFAULT_MAX_QUERY_PARAMS
+
+
+
+def get_max_batch_size(connection, params_per_row):
+    """
+    Returns the most rows a single statement can hold when each row binds params_per_row parameters
+
+    :param connection:
+    :param int params_per_row:
+    :return: int
+    """
+    return max(1, get_max_query_params(connection) // max(1, params_per_row))
+
+
+
+class AdaptiveBatchSize(object):
+    """
+    Picks chunk sizes for batch_size='auto'
+
+    Sizes never exceed upper_bound, the most rows the backend's limits allow in one statement. After each
+    chunk the size moves toward the number of rows that would take the target time at the rate just measured:
+    it shrinks at once but at most doubles per chunk, so a single fast chunk can't overshoot. The size reached
+    is remembered by key, so later operations of the same kind start from it
+
+    """
+    # sizes reached by earlier operations, by key
+    learned = {}
+
+    _lock = threading.Lock()
+
+
+    def __init__(self, key, upper_bound, target=None):
+        """
+        :param tuple key: identifies the kind of operation, e.g. (alias, model label, operation, fields per row)
+        :param int upper_bound: most rows per chunk
+        :param float target: seconds a chunk should take; defaults to the AUTO_BATCH_TARGET_SECONDS setting
+        """
+        self.key = key
+        self.upper_bound = max(1, int(upper_bound))
+        self.target = target or getattr(settings, 'AUTO_BATCH_TARGET_SECONDS', 0.25)
+
+        initial = self.learned.get(key) or getattr(settings, 'AUTO_BATCH_INITIAL_SIZE', 1000)
+        self.size = max(1, min(int(initial), self.upper_bound))
+
+
+    def record(self, rows, seconds):
+        """
+        Adjusts the size from a chunk's measured latency
+
+        :param int rows: number of rows in the chunk
+        :param float seconds: time taken to write it
+        :return:
+        """
+        if rows <= 0 or seconds <= 0:
+            return
+
+        ideal = int(rows / seconds * self.target)
+
+        with self._lock:
+            self.size = max(1, min(ideal, self.size * 2, self.upper_bound))
+            self.learned[self.key] = self.size
+
+
+    def split(self, items):
+        """
+        Lazily splits items into chunks of the current size, adjusting it as chunks are written
+
+        A chunk's latency is the time until the next chunk is requested, so each chunk must be written
+        before the next one is requested. Sequences (anything with a length that can be sliced) are sliced;
+        any other iterable is read into a list one chunk at a time
+
+        :param items:
+        :return: generator of chunks
+        """
+        if hasattr(items, '__len__') and hasattr(items, '__getitem__'):
+            chunks = self._iter_slices(items)
+        else:
+            iterator = iter(items)
+            chunks = iter(lambda: list(itertools.islice(iterator, self.size)), [])
+
+        for chunk in chunks:
+            start = time.perf_counter()
+            yield chunk
+            self.record(len(chunk), time.perf_counter() - start)
+
+
+    def _iter_slices(self, items):
+        # the size is read again for each chunk, after the previous one has been written
+        start = 0
+        while start < len(items):
+            end = start + self.size
+            yield items[start:end]
+            start = end
@@ -0,0 +1,730 @@
+import datetime
+import decimal
+import io
+import itertools
+import json
+import operator
+import queue
+import re
+import threading
+import uuid
+
+
+class CopyBuffer(io.IOBase):
+    """
+    A read-only file-like object over an iterator of COPY lines
+
+    Lines are pulled from the iterator only as the database driver reads from the buffer,
+    so memory use doesn't depend on the number of rows being copied
+
+    """
+    def __init__(self, lines, binary=False):
+        """
+        :param collections.Iterable lines: blocks of encoded lines (str), each terminated by a newline,
+            or blocks of bytes if binary is set
+        :param bool binary:
+        """
+        self._lines = iter(lines)
+        self._empty = b'' if binary else ''
+        self._pending = self._empty
+        self.bytes_read = 0
+
+
+    def readable(self):
+        return True
+
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._pending + self._empty.join(self._lines)
+            self._pending = self._empty
+            self.bytes_read += len(data)
+            return data
+
+        parts = [self._pending]
+        n = len(self._pending)
+
+        while n < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+
+            parts.append(line)
+            n += len(line)
+
+        data = self._empty.join(parts)
+        self._pending = data[size:]
+        data = data[:size]
+
+        self.bytes_read += len(data)
+        return data
+
+
+    def readline(self, size=-1):
+        newline = b'\n' if isinstance(self._empty, bytes) else '\n'
+        limited = size is not None and size >= 0
+
+        # blocks hold many lines, so they're only pulled until the first newline is found
+        data = self._pending
+        while newline not in data and not (limited and len(data) >= size):
+            block = next(self._lines, None)
+            if block is None:
+                break
+
+            data += block
+
+        end = data.find(newline) + 1 or len(data)
+        if limited:
+            end = min(end, size)
+
+        line, self._pending = data[:end], data[end:]
+        self.bytes_read += len(line)
+        return line
+
+
+
+# backslash, tab, newline and carriage return must be escaped in text-format COPY
+COPY_TEXT_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+def escape_copy_text(value):
+    return str(value).translate(COPY_TEXT_ESCAPES)
+
+
+
+# fields whose str() never contains characters that need escaping
+UNESCAPED_INTERNAL_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField',
+    'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+    'FloatField', 'DecimalField', 'BooleanField', 'NullBooleanField',
+    'UUIDField', 'DateField', 'DateTimeField', 'TimeField',
+}
+
+# faster formatters for the python type a field usually holds; they raise on other types
+TYPED_FORMATTERS = {
+    'UUIDField': operator.attrgetter('hex'),
+    'DateTimeField': datetime.datetime.isoformat,
+    'DateField': datetime.date.isoformat,
+    'TimeField': datetime.time.isoformat,
+}
+
+
+def get_text_formatter(field):
+    """
+    Returns the function used to format non-null values of a field in text-format COPY
+
+    :param field:
+    :return:
+    """
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return get_text_formatter(field.target_field)
+
+    if internal_type in UNESCAPED_INTERNAL_TYPES:
+        return str
+
+    return escape_copy_text
+
+
+def get_typed_text_formatter(field):
+    """
+    Returns a faster formatter for values of the field's usual python type, or the
+    field's general formatter if there isn't one
+
+    :param field:
+    :return:
+    """
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return get_typed_text_formatter(field.target_field)
+
+    return TYPED_FORMATTERS.get(internal_type) or get_text_formatter(field)
+
+
+def get_values_getter(attnames):
+    """
+    Returns a function reading attnames off an object as a tuple
+
+    :param List[str] attnames:
+    :return:
+    """
+    getter = operator.attrgetter(*attnames)
+
+    if len(attnames) == 1:
+        return lambda obj: (getter(obj),)
+
+    return getter
+
+
+
+def get_row_values(rows, get_values):
+    """
+    Returns the values of each row as a sequence; rows can be model instances or tuples of values
+
+    :param list rows:
+    :param get_values: a function reading the values off a model instance
+    :return:
+    """
+    if isinstance(rows[0], (tuple, list)):
+        if all(map(isinstance, rows, itertools.repeat((tuple, list)))):
+            return rows
+
+    else:
+        try:
+            return list(map(get_values, rows))
+        except AttributeError:
+            pass
+
+    # a mix of instances and tuples
+    return [row if isinstance(row, (tuple, list)) else get_values(row) for row in rows]
+
+
+
+class TextRowEncoder(object):
+    """
+    Encodes rows into text-format COPY lines for a fixed list of fields
+
+    The attribute getter and per-column formatters are resolved once. Rows are encoded in blocks,
+    column by column, so most of the work happens in map() and str.join() rather than per value
+
+    """
+    # rows encoded per block yielded by encode_rows()
+    block_size = 1000
+
+
+    def __init__(self, fields):
+        self.attnames = [f.attname for f in fields]
+        self.get_values = get_values_getter(self.attnames)
+        self.formatters = tuple(get_text_formatter(f) for f in fields)
+        self.typed_formatters = tuple(get_typed_text_formatter(f) for f in fields)
+
+
+    def encode(self, values):
+        return '\t'.join([
+            '\\N' if value is None else fmt(value) for fmt, value in zip(self.formatters, values)
+        ]) + '\n'
+
+
+    def _format_column(self, typed_fmt, fmt, column):
+        if None in column:
+            return ['\\N' if value is None else fmt(value) for value in column]
+
+        if fmt is escape_copy_text:
+            # escape the whole column with one translate(); NUL can't appear in postgres text, so it's a safe separator
+            formatted = '\x00'.join(map(str, column)).translate(COPY_TEXT_ESCAPES).split('\x00')
+            if len(formatted) == len(column):
+                return formatted
+
+        if typed_fmt is not fmt:
+            try:
+                return list(map(typed_fmt, column))
+            except (TypeError, AttributeError):
+                # the column holds values of another type (e.g., strings assigned to a date field)
+                pass
+
+        return list(map(fmt, column))
+
+
+    def encode_many(self, rows):
+        """
+        Encodes a batch of rows into a single block of lines
+
+        :param list rows: model instances, or tuples of values ordered like fields
+        :return: str
+        """
+        if not rows:
+            return ''
+
+        return self.encode_columns(list(zip(*get_row_values(rows, self.get_values))))
+
+
+    def encode_columns(self, columns):
+        """
+        Encodes a batch of rows given as one sequence of values per field
+
+        :param list columns: sequences of values, ordered like fields and all of the same length
+        :return: str
+        """
+        if not columns or not len(columns[0]):
+            return ''
+
+        formatted = [
+            self._format_column(typed_fmt, fmt, column)
+            for typed_fmt, fmt, column in zip(self.typed_formatters, self.formatters, columns)
+        ]
+
+        return '\n'.join(map('\t'.join, zip(*formatted))) + '\n'
+
+
+    def encode_rows(self, rows):
+        rows = iter(rows)
+
+        while True:
+            block = list(itertools.islice(rows, self.block_size))
+            if not block:
+                return
+
+            yield self.encode_many(block)
+
+
+
+# compiled encoders, keyed on the model, the copied attnames and the encoding
+_row_encoders = {}
+
+
+def get_row_encoder(fields, format='text', connection=None):
+    """
+    Returns a cached row encoder for a list of fields
+
+    :param list fields: model fields being copied; all fields must belong to the same model
+    :param str format: 'text' or 'binary'
+    :param connection: the connection data is copied into; required for the binary format
+    :return: TextRowEncoder or pgcopy.BinaryRowEncoder
+    """
+    if not fields:
+        raise ValueError('Cannot encode rows without fields')
+
+    key = (
+        fields[0].model, tuple(f.attname for f in fields), format,
+        connection.alias if connection is not None else None,
+    )
+
+    encoder = _row_encoders.get(key)
+    if encoder is None:
+        if format == 'binary':
+            from .pgcopy import BinaryRowEncoder
+            encoder = BinaryRowEncoder(fields, connection)
+        else:
+            encoder = TextRowEncoder(fields)
+
+        _row_encoders[key] = encoder
+
+    return encoder
+
+
+
+def encode_text_rows(rows, fields):
+    """
+    Lazily encodes rows into text-format COPY lines
+
+    :param collections.Iterable rows: model instances, or tuples of values ordered like fields
+    :param list fields: model fields being copied
+    :return: generator of lines
+    """
+    return get_row_encoder(fields).encode_rows(rows)
+
+
+
+def init_encoding_process():
+    """
+    Initializer for processes that encode COPY payloads; sets up django when the process was spawned
+    rather than forked
+
+    :return:
+    """
+    from django.apps import apps
+
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _is_uuid_field(field):
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return _is_uuid_field(field.target_field)
+
+    return internal_type == 'UUIDField'
+
+
+def pack_copy_columns(rows, fields, get_values):
+    """
+    Transposes rows into columns that are cheap to pickle; UUIDs (which pickle slowly) are sent as their bytes
+
+    :param list rows: model instances, or tuples of values ordered like fields
+    :param list fields:
+    :param get_values: a function reading the values off a model instance
+    :return: list of lists
+    """
+    columns = [list(column) for column in zip(*get_row_values(rows, get_values))]
+
+    for i, field in enumerate(fields):
+        if _is_uuid_field(field):
+            columns[i] = [value.bytes if isinstance(value, uuid.UUID) else value for value in columns[i]]
+
+    return columns
+
+
+def encode_copy_payload(model_label, fieldnames, columns, format='text', using=None):
+    """
+    Encodes columns packed by pack_copy_columns() into a complete COPY payload; meant to run in a worker
+    process, so it takes picklable arguments only
+
+    :param str model_label: app_label.ModelName of the model being copied
+    :param list fieldnames: names of the fields being copied
+    :param list columns: one list of values per field
+    :param str format: 'text' or 'binary'
+    :param str using: alias of the database the payload is copied into; used by the binary format
+    :return: str, or bytes for the binary format
+    """
+    from django.apps import apps
+
+    opts = apps.get_model(model_label)._meta
+    fields = [opts.get_field(name) for name in fieldnames]
+
+    for i, field in enumerate(fields):
+        if _is_uuid_field(field):
+            columns[i] = [uuid.UUID(bytes=value) if isinstance(value, bytes) else value for value in columns[i]]
+
+    if format == 'binary':
+        from django.db import connections
+        from .pgcopy import PGCOPY_HEADER, PGCOPY_TRAILER
+
+        encoder = get_row_encoder(fields, 'binary', connections[using or 'default'])
+        return PGCOPY_HEADER + encoder.encode_columns(columns) + PGCOPY_TRAILER
+
+    return get_row_encoder(fields).encode_columns(columns)
+
+
+
+# escape sequences postgres emits in text-format COPY output
+COPY_TEXT_UNESCAPES = {
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+}
+
+_copy_escape_re = re.compile(r'\\(?:([0-7]{1,3})|x([0-9a-fA-F]{1,2})|(.))')
+
+
+def _unescape_match(match):
+    octal, hexadecimal, char = match.groups()
+
+    if octal:
+        return chr(int(octal, 8))
+
+    if hexadecimal:
+        return chr(int(hexadecimal, 16))
+
+    return COPY_TEXT_UNESCAPES.get(char, char)
+
+
+def unescape_copy_text(value):
+    if '\\' not in value:
+        return value
+
+    return _copy_escape_re.sub(_unescape_match, value)
+
+
+def _parse_bool(value):
+    return value == 't'
+
+
+def _parse_bytea(value):
+    # bytea is output in hex format, with its backslash escaped: \\x0a0b...
+    return bytes.fromhex(unescape_copy_text(value)[2:])
+
+
+def _parse_json(value):
+    return json.loads(unescape_copy_text(value))
+
+
+TEXT_PARSERS = {
+    'AutoField': int,
+    'BigAutoField': int,
+    'SmallAutoField': int,
+    'IntegerField': int,
+    'BigIntegerField': int,
+    'SmallIntegerField': int,
+    'PositiveIntegerField': int,
+    'PositiveBigIntegerField': int,
+    'PositiveSmallIntegerField': int,
+    'FloatField': float,
+    'DecimalField': decimal.Decimal,
+    'BooleanField': _parse_bool,
+    'NullBooleanField': _parse_bool,
+    'UUIDField': uuid.UUID,
+    'CharField': unescape_copy_text,
+    'SlugField': unescape_copy_text,
+    'TextField': unescape_copy_text,
+    'FileField': unescape_copy_text,
+    'FilePathField': unescape_copy_text,
+    'BinaryField': _parse_bytea,
+    'JSONField': _parse_json,
+}
+
+
+def get_text_parser(field):
+    """
+    Returns the function converting a non-null value of the field, as output by text-format COPY, to python
+
+    :param field:
+    :return:
+    """
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return get_text_parser(field.target_field)
+
+    parser = TEXT_PARSERS.get(internal_type)
+    if parser is not None:
+        return parser
+
+    def parse(value):
+        return field.to_python(unescape_copy_text(value))
+
+    return parse
+
+
+
+def iter_copy_lines(chunks):
+    """
+    Regroups text-format COPY output, split at arbitrary points, into lists of complete lines
+
+    :param collections.Iterable chunks: str chunks
+    :return: generator of lists of str
+    """
+    pending = ''
+
+    for chunk in chunks:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+
+        if lines:
+            yield lines
+
+    if pending:
+        yield [pending]
+
+
+
+def iter_copy_blocks(chunks):
+    """
+    Regroups text-format COPY output, split at arbitrary points, into blocks of complete lines
+
+    :param collections.Iterable chunks: str chunks
+    :return: generator of str, each holding one or more lines without the final newline
+    """
+    pending = ''
+
+    for chunk in chunks:
+        chunk = pending + chunk
+        end = chunk.rfind('\n')
+
+        if end < 0:
+            pending = chunk
+            continue
+
+        # a block can be a single empty line: an empty string in a one-column export
+        pending = chunk[end + 1:]
+        yield chunk[:end]
+
+    if pending:
+        yield pending
+
+
+
+class TextRowParser(object):
+    """
+    Parses text-format COPY output into rows of python values for a fixed list of fields
+
+    """
+    def __init__(self, fields):
+        self.attnames = [f.attname for f in fields]
+        self.parsers = tuple(get_text_parser(f) for f in fields)
+
+
+    def parse_line(self, line):
+        return [
+            None if value == '\\N' else parse(value) for parse, value in zip(self.parsers, line.split('\t'))
+        ]
+
+
+    def parse_chunks(self, chunks, offset=0):
+        """
+        Parses a stream of COPY output, split at arbitrary points
+
+        :param collections.Iterable chunks: str chunks
+        :param int offset: position of the first column parsed in each line; columns before it are skipped
+        :return: generator of lists of values
+        """
+        parse_line = self.parse_line
+
+        if not offset:
+            for lines in iter_copy_lines(chunks):
+                for line in lines:
+                    yield parse_line(line)
+
+            return
+
+        parsers = self.parsers
+        for lines in iter_copy_lines(chunks):
+            for line in lines:
+                yield [
+                    None if value == '\\N' else parse(value)
+                    for parse, value in zip(parsers, line.split('\t')[offset:])
+                ]
+
+
+
+# compiled parsers, keyed on the model and the attnames being read
+_row_parsers = {}
+
+
+def get_row_parser(fields):
+    """
+    Returns a cached row parser for a list of fields
+
+    :param list fields:
+    :return: TextRowParser
+    """
+    key = (tuple(f.model for f in fields), tuple(f.attname for f in fields))
+
+    parser = _row_parsers.get(key)
+    if parser is None:
+        parser = _row_parsers[key] = TextRowParser(fields)
+
+    return parser
+
+
+
+class CopyAborted(Exception):
+    pass
+
+
+
+class _QueueSink(io.TextIOBase):
+    # file-like target for COPY TO; groups the driver's writes into chunks and hands them to a bounded queue
+
+    def __init__(self, chunks, chunk_size):
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+        self.aborted = False
+
+
+    def writable(self):
+        return True
+
+
+    def write(self, data):
+        if self.aborted:
+            raise CopyAborted('The reader stopped consuming COPY output')
+
+        self.parts.append(data)
+        self.size += len(data)
+
+        if self.size >= self.chunk_size:
+            self.flush()
+
+        return len(data)
+
+
+    def flush(self):
+        if self.parts:
+            self.chunks.put(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+
+
+_COPY_DONE = object()
+
+
+def _cancel_copy(cursor):
+    # asks the server to stop a COPY TO that's still sending output, so it isn't read to the end
+    cancel = getattr(getattr(cursor, 'connection', None), 'cancel', None)
+    if cancel is not None:
+        cancel()
+
+
+
+def iter_copy_to(cursor, sql, chunk_size=65536, max_pending_chunks=16):
+    """
+    Runs a COPY ... TO STDOUT statement and lazily yields its output in chunks of roughly chunk_size characters
+
+    psycopg2 pushes COPY output into a file, so the copy runs on a helper thread that fills a bounded queue;
+    it blocks while the queue is full, so at most max_pending_chunks chunks are held in memory.
+    psycopg3 cursors are read directly
+
+    If the generator is closed before the output ends, the COPY is cancelled with the driver connection's
+    cancel() rather than read to the end. In a transaction this aborts the transaction, as any failed
+    statement would
+
+    :param cursor: database cursor
+    :param str sql: a COPY ... TO STDOUT statement
+    :param int chunk_size:
+    :param int max_pending_chunks:
+    :return: generator of str
+    """
+    if not hasattr(cursor, 'copy_expert') and hasattr(cursor, 'copy'):
+        with cursor.copy(sql) as copy:
+            done = False
+            try:
+                for data in copy:
+                    yield bytes(data).decode('utf-8')
+
+                done = True
+
+            finally:
+                if not done:
+                    _cancel_copy(cursor)
+
+        return
+
+    chunks = queue.Queue(max_pending_chunks)
+    sink = _QueueSink(chunks, chunk_size)
+
+    def run():
+        try:
+            cursor.copy_expert(sql, sink)
+            sink.flush()
+            chunks.put(_COPY_DONE)
+        except BaseException as e:
+            chunks.put(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    done = False
+
+    try:
+        while True:
+            item = chunks.get()
+            if item is _COPY_DONE:
+                break
+
+            if isinstance(item, BaseException):
+                done = True
+                raise item
+
+            yield item
+
+        done = True
+
+    finally:
+        # if the reader stopped early, make the next write fail and unblock the copy thread
+        sink.aborted = True
+        if not done:
+            _cancel_copy(cursor)
+
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        thread.join()
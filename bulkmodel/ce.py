@@ -1,5 +1,168 @@
 import asyncio
-import collections
+import collections.abc
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+from django.db import connections
+
+
+class ConnectionThreadPool(Executor):
+    """
+    A bounded pool of worker threads for database jobs
+
+    Django connections are per thread, so each worker opens at most one connection per database alias,
+    reuses it for every job it runs and closes it when the pool is shut down. Threads are started as jobs
+    are submitted, up to max_workers
+
+    """
+    def __init__(self, max_workers):
+        self.max_workers = max(1, int(max_workers))
+
+        self._jobs = queue.SimpleQueue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit jobs after the pool has been shut down')
+
+            self._jobs.put((future, fn, args, kwargs))
+
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+        return future
+
+
+    def _work(self):
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+
+                future, fn, args, kwargs = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+
+        finally:
+            connections.close_all()
+
+
+    def shutdown(self, wait=True, **kwargs):
+        """
+        Lets the workers finish the submitted jobs, then stops them and closes their connections
+
+        :param bool wait: block until the workers have stopped
+        :return:
+        """
+        with self._lock:
+            if not self._shutdown:
+                self._shutdown = True
+                for _ in self._threads:
+                    self._jobs.put(None)
+
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+
+class BoundedSubmitter(object):
+    """
+    Submits calls to an executor lazily, so at most max_pending results are submitted but not yet consumed
+
+    Results are taken by position with result(); each one taken lets the next call be submitted. A result
+    that hasn't been submitted yet is waited for, so callers can take results from several threads
+
+    """
+    def __init__(self, executor, calls, max_pending):
+        """
+        :param Executor executor:
+        :param iterable calls: (function, arg, arg, ...) tuples, submitted in order
+        :param int max_pending:
+        """
+        self.executor = executor
+        self.calls = iter(calls)
+
+        self._futures = {}
+        self._n_submitted = 0
+        self._exhausted = False
+        self._condition = threading.Condition()
+
+        with self._condition:
+            self._submit(max(1, int(max_pending)))
+
+
+    def _submit(self, n):
+        # must be called with the condition held
+        for _ in range(n):
+            call = next(self.calls, None)
+            if call is None:
+                self._exhausted = True
+                break
+
+            self._futures[self._n_submitted] = self.executor.submit(*call)
+            self._n_submitted += 1
+
+        self._condition.notify_all()
+
+
+    def result(self, i):
+        """
+        Waits for the result of the i-th call, then submits the next call
+
+        :param int i:
+        :return:
+        """
+        with self._condition:
+            while i not in self._futures:
+                if self._exhausted or i < self._n_submitted:
+                    raise IndexError('No call {} to take a result from'.format(i))
+
+                self._condition.wait()
+
+            future = self._futures.pop(i)
+
+        try:
+            return future.result()
+        finally:
+            with self._condition:
+                self._submit(1)
+
+
+
+async def gather_bounded(factories, limit):
+    """
+    Awaits the awaitables returned by factories, running at most limit of them at once
+
+    :param list factories: callables returning an awaitable; each is only called once a slot is free
+    :param int limit:
+    :return: list of results, in the order of factories
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*[run(factory) for factory in factories])
+
 
 
 class ConcurrentExecutor(object):
@@ -7,45 +170,130 @@ class ConcurrentExecutor(object):
     Executes functions concurrently that would normally block and makes the results available
     as a memory of the object instance
 
+    Jobs run on a ConnectionThreadPool of at most max_workers threads, so each worker reuses a single
+    connection per database alias and closes it once there are no jobs left
+
     """
-    def __init__(self, jobs):
+    # number of workers used when max_workers isn't given
+    default_max_workers = 30
+
+
+    def __init__(self, jobs, max_workers=None, stats=None):
+        """
+        :param list jobs:
+        :param int max_workers:
+        :param OperationStats stats: records the time each worker spends running jobs, if given
+        """
         self.jobs = jobs
+        self.max_workers = max_workers
+        self.stats = stats
 
-        # results from running the blocking jobs
+        # results from running the blocking jobs, in the order the jobs were given
         self.results = []
 
 
-    async def _asynchronous(self):
-        # get a reference to the running loop
-        loop = asyncio.get_event_loop()
+    def get_n_workers(self):
+        n = int(self.max_workers or self.default_max_workers)
+        return max(1, min(n, len(self.jobs)))
 
-        futures = []
-        for job in self.jobs:
-            if isinstance(job, collections.Iterable):
-                f = job[0]
-                args = job[1:]
-                futures.append(
-                    loop.run_in_executor(None, f, *args)
-                )
 
-            elif callable(job):
-                futures.append(
-                    loop.run_in_executor(None, job)
-                )
+    @staticmethod
+    def _run_job(job):
+        if isinstance(job, collections.abc.Iterable):
+            f = job[0]
+            args = job[1:]
+            return f(*args)
+
+        elif callable(job):
+            return job()
+
+
+    def _run_timed_job(self, job):
+        start = time.perf_counter()
+
+        try:
+            return self._run_job(job)
+        finally:
+            self.stats.add_worker_time(threading.current_thread().name, time.perf_counter() - start)
 
-        for i, future in enumerate(asyncio.as_completed(futures)):
-            result = await future
-            self.results.append(result)
+
+    def _get_job_runner(self):
+        return self._run_job if self.stats is None else self._run_timed_job
 
 
     def run_async(self):
         """
-        Run jobs asynchronously
+        Run jobs concurrently and wait for all of them to finish
 
-        :return:
+        :return: list of results, in the order of the jobs
+        """
+        if not self.jobs:
+            self.results = []
+            return self.results
+
+        n_workers = self.get_n_workers()
+        run = self._get_job_runner()
+        start = time.perf_counter()
+
+        with ConnectionThreadPool(n_workers) as pool:
+            futures = [pool.submit(run, job) for job in self.jobs]
+
+            try:
+                self.results = [future.result() for future in futures]
+            except BaseException:
+                # don't start jobs that haven't been picked up yet
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if self.stats is not None:
+            self.stats.add_pool_time(n_workers, time.perf_counter() - start)
+
+        return self.results
+
+
+    async def arun(self, pool=None):
         """
-        ioloop = asyncio.new_event_loop()
-        ioloop.run_until_complete(self._asynchronous())
-        ioloop.close()
+        Runs jobs from a running event loop without blocking it
+
+        At most max_workers jobs run at once. Jobs whose function is a coroutine function are awaited
+        on the loop; other jobs run on the pool's threads
+
+        :param ConnectionThreadPool pool: pool to run blocking jobs on; by default a pool is created for the call
+            and shut down afterwards
+        :return: list of results, in the order of the jobs
+        """
+        if not self.jobs:
+            self.results = []
+            return self.results
+
+        loop = asyncio.get_running_loop()
+        n_workers = self.get_n_workers()
+
+        own_pool = pool is None
+        if own_pool:
+            pool = ConnectionThreadPool(n_workers)
+
+        run = self._get_job_runner()
+        start = time.perf_counter()
+
+        factories = []
+        for job in self.jobs:
+            f = job[0] if isinstance(job, collections.abc.Iterable) else job
+
+            if asyncio.iscoroutinefunction(f):
+                factories.append(lambda job=job: self._run_job(job))
+            else:
+                factories.append(lambda job=job: loop.run_in_executor(pool, run, job))
+
+        try:
+            self.results = await gather_bounded(factories, n_workers)
+        finally:
+            if own_pool:
+                # all jobs are done (or failed); the workers close their connections as they exit
+                pool.shutdown(wait=False)
+
+        if self.stats is not None:
+            self.stats.add_pool_time(n_workers, time.perf_counter() - start)
 
         return self.results
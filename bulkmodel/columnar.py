@@ -0,0 +1,490 @@
+import datetime
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .buffers import get_text_parser, iter_copy_blocks
+from .helpers import get_related_pk, to_list
+
+
+COLUMN_OUTPUTS = ('lists', 'tuples', 'numpy', 'pandas')
+
+_NULL = '\\N'
+
+_INTEGER_TYPES = {
+    'AutoField',
+    'BigAutoField',
+    'SmallAutoField',
+    'IntegerField',
+    'BigIntegerField',
+    'SmallIntegerField',
+    'PositiveIntegerField',
+    'PositiveBigIntegerField',
+    'PositiveSmallIntegerField',
+}
+
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required to export columns as arrays')
+
+    return numpy
+
+
+def _import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError('pandas is required to export columns as a DataFrame')
+
+    return pandas
+
+
+def _get_internal_type(field):
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return _get_internal_type(field.target_field)
+
+    return internal_type
+
+
+
+def parse_column(parse, raw):
+    """
+    Parses one column of raw COPY values into a list, calling parse once per non-null value
+
+    :param parse: text parser of the column's field
+    :param list raw: raw values
+    :return: list
+    """
+    if _NULL in raw:
+        return [None if value == _NULL else parse(value) for value in raw]
+
+    return list(map(parse, raw))
+
+
+
+def _to_utc_naive(value):
+    if value is None:
+        return 'NaT'
+
+    dt = parse_datetime(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return dt.isoformat()
+
+
+
+def get_array_parser(field):
+    """
+    Returns a function converting one column of raw COPY values into a NumPy array
+
+    Numbers, booleans, dates and datetimes are converted by NumPy in a single call per column; datetimes
+    become naive UTC datetime64[us] values. Integer columns holding nulls are returned as floats with NaN,
+    boolean columns holding nulls as object arrays. Other fields are parsed into object arrays
+
+    :param field:
+    :return:
+    """
+    np = _import_numpy()
+    internal_type = _get_internal_type(field)
+
+    if internal_type in _INTEGER_TYPES:
+        def parse(raw):
+            if _NULL in raw:
+                return np.array([value if value != _NULL else 'nan' for value in raw], dtype=np.float64)
+
+            return np.array(raw, dtype=np.int64)
+
+    elif internal_type == 'FloatField':
+        def parse(raw):
+            if _NULL in raw:
+                raw = [value if value != _NULL else 'nan' for value in raw]
+
+            return np.array(raw, dtype=np.float64)
+
+    elif internal_type in ('BooleanField', 'NullBooleanField'):
+        def parse(raw):
+            if _NULL in raw:
+                return _object_array(np, [None if value == _NULL else value == 't' for value in raw])
+
+            return np.array(raw) == 't'
+
+    elif internal_type == 'DateField':
+        def parse(raw):
+            if _NULL in raw:
+                raw = [value if value != _NULL else 'NaT' for value in raw]
+
+            return np.array(raw, dtype='datetime64[D]')
+
+    elif internal_type == 'DateTimeField':
+        def parse(raw):
+            # the session time zone is UTC when USE_TZ is set, so offsets are normally all +00
+            if all(value.endswith('+00') for value in raw if value != _NULL):
+                values = [value[:-3] if value != _NULL else 'NaT' for value in raw]
+            else:
+                values = [_to_utc_naive(None if value == _NULL else value) for value in raw]
+
+            return np.array(values, dtype='datetime64[us]')
+
+    else:
+        parse_value = get_text_parser(field)
+
+        def parse(raw):
+            return _object_array(np, parse_column(parse_value, raw))
+
+    return parse
+
+
+def _object_array(np, values):
+    # np.array() would build a multi-dimensional array from values that are sequences (e.g., arrays)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+
+def read_columns(chunks, fields, names, output='lists', offset=0):
+    """
+    Parses text-format COPY output into columns
+
+    Output is split into blocks of whole lines as it arrives; each block is split into values once and
+    parsed column by column, so no per-row objects are kept
+
+    :param collections.Iterable chunks: str chunks of COPY output
+    :param list fields: fields read, in column order
+    :param list names: column names, aligned with fields
+    :param str output: 'lists' or 'tuples' for python values, 'numpy' for arrays, 'pandas' for a DataFrame
+    :param int offset: position of the first field's column in each row; the output may hold other columns
+        before and after the fields (e.g., extra() selects), so the row width is read from the output
+    :return: dict of name to list or array, a list of tuples, or a DataFrame
+    """
+    if output not in COLUMN_OUTPUTS:
+        raise ValueError('Unknown column output: {}'.format(output))
+
+    as_arrays = output in ('numpy', 'pandas')
+
+    if as_arrays:
+        parsers = [get_array_parser(f) for f in fields]
+    else:
+        parsers = [get_text_parser(f) for f in fields]
+
+    blocks = [[] for _ in fields]
+
+    n_fields = len(fields)
+    n_columns = None
+
+    for text in iter_copy_blocks(chunks):
+        if n_columns is None:
+            # every row has as many columns as the first one
+            first_end = text.find('\n')
+            n_columns = text.count('\t', 0, first_end if first_end >= 0 else len(text)) + 1
+            if n_columns < offset + n_fields:
+                raise ValueError('COPY output does not have {} columns per row'.format(offset + n_fields))
+
+        # tabs and newlines inside values are escaped, so the block splits into a flat row-major list of values
+        values = text.replace('\n', '\t').split('\t')
+        if len(values) % n_columns:
+            raise ValueError('COPY output does not have {} columns per row'.format(n_columns))
+
+        for i, (block, parse) in enumerate(zip(blocks, parsers)):
+            raw = values[offset + i::n_columns]
+            if as_arrays:
+                block.append(parse(raw))
+            else:
+                block.extend(parse_column(parse, raw))
+
+    if not as_arrays:
+        if output == 'tuples':
+            return list(zip(*blocks))
+
+        return dict(zip(names, blocks))
+
+    np = _import_numpy()
+
+    columns = {}
+    for name, parse, block in zip(names, parsers, blocks):
+        columns[name] = np.concatenate(block) if block else parse(())
+
+    return _get_array_output(columns, fields, names, output)
+
+
+
+def _get_array_output(columns, fields, names, output):
+    # columns is a dict of arrays, returned as it is for 'numpy'
+    if output == 'numpy':
+        return columns
+
+    pd = _import_pandas()
+    frame = pd.DataFrame(columns, columns=names)
+
+    if settings.USE_TZ:
+        for field, name in zip(fields, names):
+            if _get_internal_type(field) == 'DateTimeField':
+                frame[name] = frame[name].dt.tz_localize('UTC')
+
+    return frame
+
+
+
+def _to_utc_datetime(value):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return value
+
+
+def get_array(field, values):
+    """
+    Converts a column of python values read for field into a NumPy array, with the same dtypes and null
+    handling as get_array_parser()
+
+    :param field:
+    :param list values:
+    :return:
+    """
+    np = _import_numpy()
+    internal_type = _get_internal_type(field)
+    has_nulls = None in values
+
+    if internal_type in _INTEGER_TYPES:
+        if has_nulls:
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+        return np.array(values, dtype=np.int64)
+
+    if internal_type == 'FloatField':
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+    if internal_type in ('BooleanField', 'NullBooleanField'):
+        return _object_array(np, values) if has_nulls else np.array(values, dtype=bool)
+
+    if internal_type == 'DateField':
+        return np.array(values, dtype='datetime64[D]')
+
+    if internal_type == 'DateTimeField':
+        return np.array([_to_utc_datetime(value) for value in values], dtype='datetime64[us]')
+
+    return _object_array(np, values)
+
+
+
+def rows_to_columns(rows, fields, names, output='lists'):
+    """
+    Turns rows of python values, read by a loader without COPY, into the same output as read_columns()
+
+    :param collections.Iterable rows: sequences of values, aligned with fields
+    :param list fields:
+    :param list names: column names, aligned with fields
+    :param str output: 'lists', 'tuples', 'numpy' or 'pandas'
+    :return:
+    """
+    if output not in COLUMN_OUTPUTS:
+        raise ValueError('Unknown column output: {}'.format(output))
+
+    if output == 'tuples':
+        return [tuple(row) for row in rows]
+
+    columns = [list(column) for column in zip(*rows)] or [[] for _ in fields]
+
+    if output == 'lists':
+        return dict(zip(names, columns))
+
+    arrays = {name: get_array(field, column) for field, name, column in zip(fields, names, columns)}
+    return _get_array_output(arrays, fields, names, output)
+
+
+
+# NumPy dtype kinds accepted for each kind of field, besides numbers; object arrays are accepted for any field
+_ARRAY_KINDS = {
+    'BooleanField': 'b',
+    'NullBooleanField': 'b',
+    'DateField': 'M',
+    'DateTimeField': 'M',
+    'DurationField': 'm',
+}
+
+
+def _get_array_kinds(internal_type):
+    if internal_type in _INTEGER_TYPES or internal_type in ('FloatField', 'DecimalField'):
+        return 'iuf'
+
+    return _ARRAY_KINDS.get(internal_type, 'US')
+
+
+
+def _array_to_list(field, internal_type, array):
+    """
+    Converts a NumPy array or pandas series into a list of python values for field
+
+    datetime64 values are taken to be naive UTC, as copy_to_columns() returns them, and NaN in a float
+    column is read as null when the field is nullable
+
+    :param field:
+    :param str internal_type:
+    :param array:
+    :return: list
+    """
+    kind = array.dtype.kind
+
+    if kind == 'M':
+        np = _import_numpy()
+
+        if getattr(array.dtype, 'tz', None) is not None:
+            # a time zone aware pandas series
+            array = array.dt.tz_convert('UTC').dt.tz_localize(None)
+
+        if internal_type == 'DateField':
+            return np.asarray(array).astype('datetime64[D]').tolist()
+
+        values = np.asarray(array).astype('datetime64[us]').tolist()
+        if settings.USE_TZ:
+            values = [None if value is None else value.replace(tzinfo=datetime.timezone.utc) for value in values]
+
+        return values
+
+    if kind == 'm':
+        return _import_numpy().asarray(array).astype('timedelta64[us]').tolist()
+
+    values = array.tolist()
+
+    if kind == 'f':
+        if field.null:
+            values = [None if value != value else value for value in values]
+
+        if internal_type in _INTEGER_TYPES:
+            if not all(value is None or value.is_integer() for value in values):
+                raise ValueError('Column {} holds values that are not integers'.format(field.name))
+
+            values = [None if value is None else int(value) for value in values]
+
+    return values
+
+
+
+def _check_value(field, values):
+    # the first value that isn't null is converted once, to catch columns of the wrong type early
+    value = next((value for value in values if value is not None), None)
+    if value is None:
+        return
+
+    try:
+        field.to_python(value)
+    except ValidationError as e:
+        raise ValueError('Invalid value for {}: {}'.format(field.name, '; '.join(e.messages)))
+
+
+
+def get_insert_column(field, column, key=None):
+    """
+    Validates a column of values written to field and converts it into a list of python values
+
+    Arrays are checked by dtype, other columns by converting their first value with the field
+
+    :param field:
+    :param column: list, NumPy array or pandas series
+    :param str key: name the column was given under; related objects are read by primary key unless it's the attname
+    :return: list
+    """
+    internal_type = _get_internal_type(field)
+    dtype = getattr(column, 'dtype', None)
+
+    if dtype is not None and dtype.kind != 'O':
+        if dtype.kind not in _get_array_kinds(internal_type):
+            raise ValueError('Column {} of dtype {} cannot be written to {} ({})'.format(
+                key or field.name, dtype, field.name, internal_type
+            ))
+
+        return _array_to_list(field, internal_type, column)
+
+    values = to_list(column)
+
+    if field.is_relation and key != field.attname:
+        values = [get_related_pk(value) for value in values]
+
+    _check_value(field, values)
+
+    return values
+
+
+
+def get_default_column(field, n):
+    """
+    Returns a column of n default values for a field that wasn't given
+
+    :param field:
+    :param int n: number of rows
+    :return: list
+    """
+    if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+        # the same value pre_save() would set on each instance
+        if isinstance(field, models.DateTimeField):
+            return [timezone.now()] * n
+
+        if isinstance(field, models.DateField):
+            return [datetime.date.today()] * n
+
+        return [datetime.datetime.now().time()] * n
+
+    if field.has_default() and callable(field.default):
+        return [field.default() for _ in range(n)]
+
+    value = field.get_default()
+    if value is None and not field.null:
+        raise ValueError('No column or default for {}'.format(field.name))
+
+    return [value] * n
+
+
+
+def get_insert_columns(model, columns):
+    """
+    Resolves a mapping of columns to the concrete fields they fill, validating each column once, and fills
+    every other concrete field except the auto-incrementing primary key with its default
+
+    :param model:
+    :param Mapping columns: lists, NumPy arrays or pandas series keyed by field name or attname (or 'pk')
+    :return: tuple of (fields, list of columns aligned with fields, number of rows)
+    """
+    opts = model._meta
+
+    by_key = {'pk': opts.pk}
+    for field in opts.concrete_fields:
+        by_key[field.name] = by_key[field.attname] = field
+
+    given = {}
+    for key, column in columns.items():
+        field = by_key.get(key)
+        if field is None:
+            raise ValueError('{} is not a concrete field of {}'.format(key, opts.label))
+
+        if field in given:
+            raise ValueError('More than one column for {}'.format(field.name))
+
+        given[field] = get_insert_column(field, column, key)
+
+    lengths = {len(column) for column in given.values()}
+    if len(lengths) > 1:
+        raise ValueError('Columns must all have the same length; got lengths {}'.format(sorted(lengths)))
+
+    n = lengths.pop() if lengths else 0
+
+    fields, values = [], []
+    for field in opts.concrete_fields:
+        if field in given:
+            column = given[field]
+        elif field is opts.auto_field:
+            continue
+        else:
+            column = get_default_column(field, n)
+
+        fields.append(field)
+        values.append(column)
+
+    return fields, values, n
@@ -0,0 +1,201 @@
+from collections import Counter
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.deletion import (
+    CASCADE,
+    DO_NOTHING,
+    PROTECT,
+    SET_DEFAULT,
+    SET_NULL,
+    Collector,
+    ProtectedError,
+    get_candidate_relations_to_delete,
+)
+from .helpers import get_chunks, get_pk_filter
+
+
+# on_delete handlers that can be applied with one statement per relation
+SET_BASED_HANDLERS = (CASCADE, DO_NOTHING, PROTECT, SET_DEFAULT, SET_NULL)
+
+
+
+class BulkDeleter(object):
+    """
+    Deletes rows by primary key, together with the rows that depend on them, without loading instances
+
+    Relations are resolved one at a time with set-based statements: CASCADE deletes the related rows
+    (recursing only when they have dependents of their own), SET_NULL and SET_DEFAULT update them,
+    PROTECT raises if any exist and DO_NOTHING is skipped. Models whose relations need python (e.g.,
+    SET(...) or generic relations) or that inherit from another concrete model are deleted with
+    Django's collector instead
+
+    No pre_delete / post_delete signals are sent, except by the collector fallback
+
+    """
+    def __init__(self, using, cascade=True, batch_size=None):
+        """
+        :param str using: database alias
+        :param bool cascade: resolve relations pointing at the deleted rows; when false only the rows
+            themselves are deleted and the database enforces its constraints
+        :param int batch_size: max number of keys per statement when deleting dependent rows
+        """
+        self.using = using
+        self.cascade = cascade
+        self.batch_size = batch_size
+
+        # number of rows deleted, by model label
+        self.deleted = Counter()
+
+        # keys already deleted (or being deleted), by model; guards against reference cycles
+        self.seen = {}
+
+
+    def get_relations(self, model):
+        return [
+            related for related in get_candidate_relations_to_delete(model._meta)
+            if related.field.remote_field.on_delete is not DO_NOTHING
+        ]
+
+
+    def can_delete_set_based(self, model, via=None):
+        """
+        Returns whether rows of model can be deleted without instances
+
+        :param model:
+        :param via: the relation field rows are being deleted through, if any
+        :return: bool
+        """
+        opts = model._meta
+
+        # deleting a child row also deletes its parent rows, which the collector handles
+        if any(ptr is not via for ptr in opts.parents.values()):
+            return False
+
+        # generic relations are followed with python
+        if any(hasattr(f, 'bulk_related_objects') for f in opts.private_fields):
+            return False
+
+        for related in self.get_relations(model):
+            field = related.field
+
+            if field.remote_field.on_delete not in SET_BASED_HANDLERS:
+                return False
+
+            # foreign keys to a field other than the primary key would need that field's values
+            if field.target_field != opts.pk:
+                return False
+
+        return True
+
+
+    def get_queryset(self, model, q):
+        return model._base_manager.using(self.using).filter(q)
+
+
+    def delete(self, model, pks, via=None):
+        """
+        Deletes rows of model by primary key
+
+        :param model:
+        :param list pks: sorted, distinct primary keys
+        :param via: the relation field rows are being deleted through, if any
+        :return: number of rows of model deleted
+        """
+        model = model._meta.concrete_model
+        seen = self.seen.setdefault(model, set())
+
+        pks = [pk for pk in pks if pk not in seen]
+        if not pks:
+            return 0
+
+        seen.update(pks)
+
+        if self.cascade and not self.can_delete_set_based(model, via):
+            return self.collect(model, pks)
+
+        n = 0
+        for chunk in get_chunks(pks, self.batch_size):
+            if self.cascade:
+                self.delete_related(model, chunk)
+
+            n += self.get_queryset(model, get_pk_filter('pk', chunk))._raw_delete(self.using)
+
+        self.deleted[model._meta.label] += n
+        return n
+
+
+    def delete_related(self, model, pks):
+        """
+        Applies the on_delete handler of every relation pointing at the given rows
+
+        :param model:
+        :param list pks: sorted, distinct primary keys of rows about to be deleted
+        :return:
+        """
+        for related in self.get_relations(model):
+            field = related.field
+            on_delete = field.remote_field.on_delete
+            related_model = related.related_model._meta.concrete_model
+
+            # filter on the target column, so a range doesn't need a join
+            lookup = '{}__{}'.format(field.name, field.target_field.name)
+            qs = self.get_queryset(related_model, get_pk_filter(lookup, pks))
+
+            if on_delete is PROTECT:
+                protected = list(qs[:20])
+                if protected:
+                    raise ProtectedError(
+                        "Cannot delete some instances of model '{}' because they are referenced through "
+                        "a protected foreign key: '{}.{}'".format(
+                            model.__name__, related_model.__name__, field.name
+                        ),
+                        protected
+                    )
+
+            elif on_delete is SET_NULL:
+                models.QuerySet.update(qs, **{field.name: None})
+
+            elif on_delete is SET_DEFAULT:
+                models.QuerySet.update(qs, **{field.name: field.get_default()})
+
+            elif self.get_relations(related_model) or not self.can_delete_set_based(related_model, field):
+                # the related rows have dependents of their own; read their keys and recurse
+                related_pks = sorted(set(qs.values_list('pk', flat=True)))
+                self.delete(related_model, related_pks, via=field)
+
+            else:
+                self.deleted[related_model._meta.label] += qs._raw_delete(self.using)
+
+
+    def collect(self, model, pks):
+        n = 0
+
+        for chunk in get_chunks(pks, self.batch_size):
+            collector = Collector(using=self.using)
+            collector.collect(self.get_queryset(model, Q(pk__in=chunk)))
+
+            _, deleted = collector.delete()
+            self.deleted.update(deleted)
+            n += deleted.get(model._meta.label, 0)
+
+        return n
+
+
+
+def delete_pks(model, pks, using, cascade=True, batch_size=None):
+    """
+    Deletes one chunk of rows and their dependents in a single transaction
+
+    :param model:
+    :param list pks: sorted, distinct primary keys
+    :param str using: database alias
+    :param bool cascade:
+    :param int batch_size:
+    :return: a dictionary of the number of rows deleted, by model label
+    """
+    deleter = BulkDeleter(using, cascade=cascade, batch_size=batch_size)
+
+    with transaction.atomic(using=using, savepoint=False):
+        deleter.delete(model, pks)
+
+    return dict(deleter.deleted)
@@ -0,0 +1,644 @@
+import uuid
+from django.db import NotSupportedError, transaction
+from .batching import get_max_query_params
+from .stats import NULL_CHUNK
+
+
+class Engine(object):
+    """
+    Base class for vendor-specific bulk statements
+
+    """
+    vendor = None
+
+    # maximum number of bound parameters in a single statement; None defers to the backend features, or
+    # batching.DEFAULT_MAX_QUERY_PARAMS when the backend declares no limit
+    max_query_params = None
+
+    # ChunkStats of the chunk being written, if stats are being collected
+    stats = NULL_CHUNK
+
+
+    def __init__(self, model, connection):
+        self.model = model
+        self.connection = connection
+        self.qn = connection.ops.quote_name
+
+
+    @classmethod
+    def is_supported(cls, connection):
+        return connection.vendor == cls.vendor
+
+
+    def get_max_query_params(self):
+        return self.max_query_params or get_max_query_params(self.connection)
+
+
+    def get_batch_size(self, n_columns):
+        """
+        Returns the number of rows that fit into a single statement
+
+        :param int n_columns: number of parameters bound per row
+        :return:
+        """
+        return max(1, self.get_max_query_params() // max(1, n_columns))
+
+
+
+class UpdateEngine(Engine):
+    """
+    Applies a heterogeneous update by joining the target table against a derived table of
+    (pk, value, value, ...) rows, so each row is matched by primary key instead of
+    evaluating a CASE expression with one branch per row
+
+    Subclasses provide the vendor-specific SQL
+
+    """
+    # alias of the derived table holding the new values
+    alias = 'bm_v'
+
+
+    def column_alias(self, i):
+        return self.qn('c%d' % i)
+
+
+    def placeholder(self, field):
+        return '%s'
+
+
+    def row_sql(self, fields):
+        pk_field = self.model._meta.pk
+        return '(%s)' % ', '.join(self.placeholder(f) for f in [pk_field] + list(fields))
+
+
+    def as_sql(self, fields, n_rows):
+        raise NotImplementedError('subclasses of UpdateEngine must provide an as_sql() method')
+
+
+    def get_params(self, fields, pks, columns, start, end):
+        pk_field = self.model._meta.pk
+        conn = self.connection
+
+        prepped = [[pk_field.get_db_prep_save(pk, conn) for pk in pks[start:end]]]
+        for field, values in zip(fields, columns):
+            prepped.append([field.get_db_prep_save(v, conn) for v in values[start:end]])
+
+        params = []
+        for row in zip(*prepped):
+            params.extend(row)
+
+        return params
+
+
+    def execute(self, fields, pks, columns):
+        """
+        Writes values to the rows identified by pks
+
+        :param list fields: model fields to write; must not include the primary key
+        :param list pks: primary keys of the rows to update
+        :param list[list] columns: one list of values per field, aligned with pks
+        :return: number of rows updated
+        """
+        n_rows = len(pks)
+        if not n_rows or not fields:
+            return 0
+
+        batch_size = self.get_batch_size(len(fields) + 1) or n_rows
+        n = 0
+
+        with transaction.atomic(using=self.connection.alias, savepoint=False):
+            with self.connection.cursor() as cursor:
+                for start in range(0, n_rows, batch_size):
+                    end = min(start + batch_size, n_rows)
+
+                    with self.stats.timing('build'):
+                        statement = self.as_sql(fields, end - start)
+                        params = self.get_params(fields, pks, columns, start, end)
+
+                    with self.stats.timing('execute'):
+                        cursor.execute(statement, params)
+
+                    n += cursor.rowcount
+
+        return n
+
+
+
+class PostgresUpdateEngine(UpdateEngine):
+    """
+    UPDATE ... FROM (VALUES ...) AS v (...) WHERE table.pk = v.pk
+
+    """
+    vendor = 'postgresql'
+    max_query_params = 65535
+
+
+    def placeholder(self, field):
+        # values in a VALUES list are untyped; cast them so they match the target columns
+        cast_db_type = getattr(field, 'cast_db_type', field.db_type)
+        return '%%s::%s' % cast_db_type(self.connection)
+
+
+    def as_sql(self, fields, n_rows):
+        qn = self.qn
+        table = qn(self.model._meta.db_table)
+        alias = qn(self.alias)
+
+        assignments = ', '.join(
+            '%s = %s.%s' % (qn(f.column), alias, self.column_alias(i + 1)) for i, f in enumerate(fields)
+        )
+        column_aliases = ', '.join(self.column_alias(i) for i in range(len(fields) + 1))
+        row = self.row_sql(fields)
+
+        return 'UPDATE %s SET %s FROM (VALUES %s) AS %s (%s) WHERE %s.%s = %s.%s' % (
+            table, assignments, ', '.join([row] * n_rows), alias, column_aliases,
+            table, qn(self.model._meta.pk.column), alias, self.column_alias(0),
+        )
+
+
+
+class SQLiteUpdateEngine(UpdateEngine):
+    """
+    UPDATE table SET ... FROM (SELECT column1 AS c0, ... FROM (VALUES ...)) AS v WHERE table.pk = v.pk
+
+    Requires SQLite 3.33 or newer
+
+    """
+    vendor = 'sqlite'
+
+
+    @classmethod
+    def is_supported(cls, connection):
+        if connection.vendor != cls.vendor:
+            return False
+
+        return connection.Database.sqlite_version_info >= (3, 33, 0)
+
+
+    def as_sql(self, fields, n_rows):
+        qn = self.qn
+        table = qn(self.model._meta.db_table)
+        alias = qn(self.alias)
+
+        assignments = ', '.join(
+            '%s = %s.%s' % (qn(f.column), alias, self.column_alias(i + 1)) for i, f in enumerate(fields)
+        )
+        # sqlite names VALUES columns column1, column2, ...; alias them so they can be referenced by position
+        column_aliases = ', '.join(
+            'column%d AS %s' % (i + 1, self.column_alias(i)) for i in range(len(fields) + 1)
+        )
+        row = self.row_sql(fields)
+
+        # the statement must start with UPDATE so the driver reports the affected row count
+        return 'UPDATE %s SET %s FROM (SELECT %s FROM (VALUES %s)) AS %s WHERE %s.%s = %s.%s' % (
+            table, assignments, column_aliases, ', '.join([row] * n_rows), alias,
+            table, qn(self.model._meta.pk.column), alias, self.column_alias(0),
+        )
+
+
+
+class MySQLUpdateEngine(UpdateEngine):
+    """
+    UPDATE table INNER JOIN (SELECT ... UNION ALL SELECT ...) AS v ON table.pk = v.pk SET ...
+
+    """
+    vendor = 'mysql'
+    # placeholders in a statement are counted in 16 bits; without a bound a whole chunk would go into one
+    # statement, which can exceed max_allowed_packet
+    max_query_params = 65535
+
+
+    def as_sql(self, fields, n_rows):
+        qn = self.qn
+        table = qn(self.model._meta.db_table)
+        alias = qn(self.alias)
+        n_columns = len(fields) + 1
+
+        first = 'SELECT %s' % ', '.join('%%s AS %s' % self.column_alias(i) for i in range(n_columns))
+        rest = ' UNION ALL SELECT %s' % ', '.join(['%s'] * n_columns)
+
+        assignments = ', '.join(
+            '%s.%s = %s.%s' % (table, qn(f.column), alias, self.column_alias(i + 1)) for i, f in enumerate(fields)
+        )
+
+        return 'UPDATE %s INNER JOIN (%s%s) AS %s ON %s.%s = %s.%s SET %s' % (
+            table, first, rest * (n_rows - 1), alias,
+            table, qn(self.model._meta.pk.column), alias, self.column_alias(0), assignments,
+        )
+
+
+
+UPDATE_ENGINES = [
+    PostgresUpdateEngine,
+    SQLiteUpdateEngine,
+    MySQLUpdateEngine,
+]
+
+
+def get_update_engine(model, connection):
+    """
+    Returns an update engine for the connection's backend, or None if the backend
+    has no supported engine (in which case updates fall back to CASE / WHEN)
+
+    :param model:
+    :param connection:
+    :return:
+    """
+    for engine_class in UPDATE_ENGINES:
+        if engine_class.is_supported(connection):
+            return engine_class(model, connection)
+
+    return None
+
+
+
+class UpsertEngine(Engine):
+    """
+    Inserts rows, updating the existing row instead when a row conflicts on a unique constraint,
+    with one INSERT statement per batch
+
+    """
+
+    def get_params(self, fields, objs):
+        conn = self.connection
+
+        params = []
+        for obj in objs:
+            params.extend(f.get_db_prep_save(f.pre_save(obj, True), conn) for f in fields)
+
+        return params
+
+
+    def conflict_sql(self, unique_fields, update_fields):
+        raise NotImplementedError('subclasses of UpsertEngine must provide a conflict_sql() method')
+
+
+    def as_sql(self, fields, n_rows, unique_fields, update_fields):
+        qn = self.qn
+        row = '(%s)' % ', '.join(['%s'] * len(fields))
+
+        return 'INSERT INTO %s (%s) VALUES %s %s' % (
+            qn(self.model._meta.db_table),
+            ', '.join(qn(f.column) for f in fields),
+            ', '.join([row] * n_rows),
+            self.conflict_sql(unique_fields, update_fields),
+        )
+
+
+    def execute(self, fields, objs, unique_fields, update_fields):
+        """
+        Inserts objs, or updates update_fields on rows that conflict on unique_fields
+
+        :param list fields: model fields to insert
+        :param list objs: model instances
+        :param list unique_fields: fields making up the unique constraint to detect conflicts on
+        :param list update_fields: fields to overwrite on conflict; if empty, conflicting rows are left as they are
+        :return: number of rows affected, as reported by the database (see MySQLUpsertEngine for MySQL's count)
+        """
+        n_rows = len(objs)
+        if not n_rows:
+            return 0
+
+        batch_size = self.get_batch_size(len(fields)) or n_rows
+        n = 0
+
+        with transaction.atomic(using=self.connection.alias, savepoint=False):
+            with self.connection.cursor() as cursor:
+                for start in range(0, n_rows, batch_size):
+                    batch = objs[start:start + batch_size]
+                    cursor.execute(
+                        self.as_sql(fields, len(batch), unique_fields, update_fields),
+                        self.get_params(fields, batch)
+                    )
+                    n += cursor.rowcount
+
+        return n
+
+
+
+class PostgresUpsertEngine(UpsertEngine):
+    """
+    INSERT ... ON CONFLICT (...) DO UPDATE SET col = EXCLUDED.col
+
+    """
+    vendor = 'postgresql'
+    max_query_params = 65535
+
+
+    def conflict_sql(self, unique_fields, update_fields):
+        qn = self.qn
+        target = ', '.join(qn(f.column) for f in unique_fields)
+
+        if not update_fields:
+            return 'ON CONFLICT (%s) DO NOTHING' % target
+
+        return 'ON CONFLICT (%s) DO UPDATE SET %s' % (
+            target, ', '.join('%s = EXCLUDED.%s' % (qn(f.column), qn(f.column)) for f in update_fields)
+        )
+
+
+
+class SQLiteUpsertEngine(PostgresUpsertEngine):
+    """
+    Same syntax as PostgreSQL; requires SQLite 3.24 or newer
+
+    """
+    vendor = 'sqlite'
+    max_query_params = None
+
+
+    @classmethod
+    def is_supported(cls, connection):
+        if connection.vendor != cls.vendor:
+            return False
+
+        return connection.Database.sqlite_version_info >= (3, 24, 0)
+
+
+
+class MySQLUpsertEngine(UpsertEngine):
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE col = VALUES(col)
+
+    MySQL detects conflicts on any unique key, so unique_fields isn't used in the statement. Its affected row count
+    is 1 for each inserted row, 2 for each updated row and 1 for each row left unchanged, since Django connects
+    with CLIENT_FOUND_ROWS; the engine returns that count as it is
+
+    """
+    vendor = 'mysql'
+    max_query_params = 65535
+
+
+    def conflict_sql(self, unique_fields, update_fields):
+        qn = self.qn
+
+        if not update_fields:
+            # a no-op assignment keeps the existing row without ignoring other errors (unlike INSERT IGNORE)
+            column = qn(unique_fields[0].column)
+            return 'ON DUPLICATE KEY UPDATE %s = %s' % (column, column)
+
+        return 'ON DUPLICATE KEY UPDATE %s' % ', '.join(
+            '%s = VALUES(%s)' % (qn(f.column), qn(f.column)) for f in update_fields
+        )
+
+
+
+class StagingEngine(Engine):
+    """
+    Base class for engines that COPY rows into a temporary staging table, then apply them to the target
+    table with a single set-based statement
+
+    The staging table has the target's column types, lives in the writing transaction and is dropped
+    before the transaction ends. Requires PostgreSQL
+
+    """
+    vendor = 'postgresql'
+
+    # staging tables are named with this prefix and a random suffix
+    table_prefix = 'bm_staging_'
+
+
+    def get_staging_table_name(self):
+        return '%s%s' % (self.table_prefix, uuid.uuid4().hex[:16])
+
+
+    def create_staging_table(self, cursor, fields):
+        """
+        Creates an empty temporary table with the columns of fields
+
+        :param cursor:
+        :param list fields: fields of the target model
+        :return: quoted name of the staging table
+        """
+        qn = self.qn
+        staging = qn(self.get_staging_table_name())
+
+        cursor.execute('CREATE TEMPORARY TABLE %s ON COMMIT DROP AS SELECT %s FROM %s WITH NO DATA' % (
+            staging, ', '.join(qn(f.column) for f in fields), qn(self.model._meta.db_table),
+        ))
+
+        return staging
+
+
+    def copy_rows(self, cursor, staging, fields, rows, format='text'):
+        """
+        Copies rows into the staging table, encoding them as the driver reads them
+
+        :param cursor:
+        :param str staging: quoted name of the staging table
+        :param list fields:
+        :param collections.Iterable rows: model instances, or tuples of values ordered like fields
+        :param str format: 'text' or 'binary'
+        :return:
+        """
+        from .buffers import CopyBuffer, get_row_encoder
+        from .loaders import copy_from_buffer
+
+        sql = 'COPY %s (%s) FROM STDIN' % (staging, ', '.join(self.qn(f.column) for f in fields))
+
+        if format == 'binary':
+            encoder = get_row_encoder(fields, format, self.connection)
+            sql += ' WITH (FORMAT binary)'
+        else:
+            encoder = get_row_encoder(fields)
+
+        buf = CopyBuffer(encoder.encode_rows(rows), binary=format == 'binary')
+        copy_from_buffer(cursor, sql, buf)
+        self.stats.bytes += buf.bytes_read
+
+        # fresh statistics let the planner pick a hash join for large tables
+        cursor.execute('ANALYZE %s' % staging)
+
+
+    def apply_sql(self, staging, *args):
+        raise NotImplementedError('subclasses of StagingEngine must provide an apply_sql() method')
+
+
+    def read_result(self, cursor):
+        return cursor.rowcount
+
+
+    def stage_and_apply(self, fields, rows, *args, format='text'):
+        """
+        Copies rows into a staging table and runs the statement built by apply_sql()
+
+        :param list fields: fields of the columns being copied
+        :param collections.Iterable rows: model instances, or tuples of values ordered like fields
+        :param args: passed on to apply_sql()
+        :param str format: COPY format, 'text' or 'binary'
+        :return: result of the statement, as read by read_result(); by default the number of rows affected
+        """
+        with transaction.atomic(using=self.connection.alias, savepoint=False):
+            with self.connection.cursor() as cursor, self.stats.timing('execute'):
+                staging = self.create_staging_table(cursor, fields)
+                self.copy_rows(cursor, staging, fields, rows, format)
+
+                cursor.execute(self.apply_sql(staging, *args))
+                n = self.read_result(cursor)
+
+                cursor.execute('DROP TABLE %s' % staging)
+
+        return n
+
+
+
+class StagingUpdateEngine(StagingEngine):
+    """
+    COPY (pk, value, value, ...) rows into a staging table, then
+    UPDATE table SET ... FROM staging WHERE table.pk = staging.pk
+
+    Rows are locked by a single statement, and there are no per-statement parameter limits
+
+    """
+
+    def apply_sql(self, staging, fields):
+        qn = self.qn
+        table = qn(self.model._meta.db_table)
+        pk_column = qn(self.model._meta.pk.column)
+
+        return 'UPDATE %s SET %s FROM %s WHERE %s.%s = %s.%s' % (
+            table, ', '.join('%s = %s.%s' % (qn(f.column), staging, qn(f.column)) for f in fields), staging,
+            table, pk_column, staging, pk_column,
+        )
+
+
+    def execute(self, fields, pks, columns):
+        """
+        Writes values to the rows identified by pks
+
+        :param list fields: model fields to write; must not include the primary key
+        :param list pks: primary keys of the rows to update
+        :param list[list] columns: one list of values per field, aligned with pks
+        :return: number of rows updated
+        """
+        if not pks or not fields:
+            return 0
+
+        return self.stage_and_apply([self.model._meta.pk] + list(fields), zip(pks, *columns), fields)
+
+
+
+class StagingUpsertEngine(StagingEngine, PostgresUpsertEngine):
+    """
+    COPY rows into a staging table, then
+    INSERT INTO table SELECT ... FROM staging ON CONFLICT (...) DO UPDATE SET ...
+
+    Inserts and updates happen in a single pass over the staged rows
+
+    """
+
+    def apply_sql(self, staging, fields, unique_fields, update_fields):
+        qn = self.qn
+        columns = ', '.join(qn(f.column) for f in fields)
+
+        return 'INSERT INTO %s (%s) SELECT %s FROM %s %s' % (
+            qn(self.model._meta.db_table), columns, columns, staging,
+            self.conflict_sql(unique_fields, update_fields),
+        )
+
+
+    def execute(self, fields, objs, unique_fields, update_fields):
+        """
+        Inserts objs, or updates update_fields on rows that conflict on unique_fields
+
+        :param list fields: model fields to insert
+        :param list objs: model instances
+        :param list unique_fields: fields making up the unique constraint to detect conflicts on
+        :param list update_fields: fields to overwrite on conflict; if empty, conflicting rows are left as they are
+        :return: number of rows inserted or updated
+        """
+        if not objs:
+            return 0
+
+        rows = ([f.pre_save(obj, True) for f in fields] for obj in objs)
+        return self.stage_and_apply(fields, rows, fields, unique_fields, update_fields)
+
+
+
+class StagingInsertEngine(StagingEngine):
+    """
+    COPY rows into a staging table, then
+    INSERT INTO table SELECT ... FROM staging ORDER BY row RETURNING pk
+
+    Rows are inserted in the order they were copied, so the primary keys the database assigns can be
+    matched back to the objects they were copied from. Requires an auto-incrementing primary key
+
+    """
+    # sequence column numbering staged rows in the order they were copied
+    row_column = 'bm_row'
+
+
+    def create_staging_table(self, cursor, fields):
+        staging = super().create_staging_table(cursor, fields)
+        cursor.execute('ALTER TABLE %s ADD COLUMN %s bigserial' % (staging, self.qn(self.row_column)))
+        return staging
+
+
+    def apply_sql(self, staging, fields):
+        qn = self.qn
+        columns = ', '.join(qn(f.column) for f in fields)
+
+        return 'INSERT INTO %s (%s) SELECT %s FROM %s ORDER BY %s RETURNING %s' % (
+            qn(self.model._meta.db_table), columns, columns, staging, qn(self.row_column),
+            qn(self.model._meta.pk.column),
+        )
+
+
+    def read_result(self, cursor):
+        # keys are drawn from the sequence as rows are inserted, so they ascend in row order
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+    def execute(self, fields, objs, format='text'):
+        """
+        Inserts objs and returns the primary keys assigned to them
+
+        :param list fields: model fields to insert; must not include the primary key
+        :param list objs: model instances, or tuples of values ordered like fields
+        :param str format: COPY format, 'text' or 'binary'
+        :return: list of primary keys, aligned with objs
+        """
+        if not objs:
+            return []
+
+        return self.stage_and_apply(fields, objs, fields, format=format)
+
+
+
+def get_staging_engine(engine_class, model, connection):
+    if not engine_class.is_supported(connection):
+        raise NotSupportedError(
+            'Staging tables are not supported for database vendor {}'.format(connection.vendor)
+        )
+
+    return engine_class(model, connection)
+
+
+
+UPSERT_ENGINES = [
+    PostgresUpsertEngine,
+    SQLiteUpsertEngine,
+    MySQLUpsertEngine,
+]
+
+
+def get_upsert_engine(model, connection, strategy=None):
+    """
+    Returns an upsert engine for the connection's backend
+
+    :param model:
+    :param connection:
+    :param str strategy: 'staging' to stage rows with COPY; None (the default) for multi-row INSERT statements
+    :return:
+    """
+    if strategy == 'staging':
+        return get_staging_engine(StagingUpsertEngine, model, connection)
+
+    if strategy is not None:
+        raise ValueError('Unknown upsert strategy: {}'.format(strategy))
+
+    for engine_class in UPSERT_ENGINES:
+        if engine_class.is_supported(connection):
+            return engine_class(model, connection)
+
+    raise NotSupportedError('Upserts are not supported for database vendor {}'.format(connection.vendor))
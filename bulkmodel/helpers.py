@@ -1,22 +1,380 @@
+import itertools
+from collections.abc import Mapping
+from django.db.models import Q
+
 
 def get_chunks(l, n, max_chunks=None):
     """
     Returns a chunked version of list l with a maximum of n items in each chunk
 
     :param iterable[T] l: list of items of type T
-    :param int n: max size of each chunk
+    :param int n: max size of each chunk; None for a single chunk, or for max_chunks chunks of even size
     :param int max_chunks: maximum number of chunks that can be returned. Pass none (the default) for unbounded
     :return: list of chunks
     :rtype: list[T]
     """
     if n is None:
-        return [l]
+        if not max_chunks or max_chunks <= 0:
+            return [l]
+
+        # no size limit: the chunks are grown below until there are max_chunks of them
+        n = 1
 
     if n <= 0:
         raise ValueError('get_chunk: n must be a positive value. Received {}'.format(n))
 
     if max_chunks is not None and max_chunks > 0:
-        n = max(max_chunks, int(float(len(l)) / float(n)) + 1)
+        # grow the chunks just enough that there are no more than max_chunks of them
+        n = max(n, -(-len(l) // max_chunks))
 
     return [l[i:i+n] for i in range(0, len(l), n)]
 
+
+
+def iter_chunks(iterable, n):
+    """
+    Lazily splits any iterable (including generators) into chunks of at most n items
+
+    Each chunk is itself an iterator over the shared source, so it must be consumed
+    before the next chunk is requested
+
+    :param iterable[T] iterable:
+    :param int n: max size of each chunk; pass None for a single chunk
+    :return: generator of iterators
+    """
+    if n is not None and n <= 0:
+        raise ValueError('iter_chunks: n must be a positive value. Received {}'.format(n))
+
+    iterator = iter(iterable)
+
+    while True:
+        try:
+            first = next(iterator)
+        except StopIteration:
+            return
+
+        if n is None:
+            yield itertools.chain([first], iterator)
+        else:
+            yield itertools.chain([first], itertools.islice(iterator, n - 1))
+
+
+
+
+def get_pk_filter(name, pks):
+    """
+    Returns a filter matching the given sorted, distinct key values
+
+    A run of consecutive integers is matched as a range, which keeps the statement small and lets
+    the database scan the index once; any other list is matched with IN
+
+    :param str name: field (or lookup path) being filtered
+    :param list pks: sorted, distinct values
+    :return: Q
+    """
+    first, last = pks[0], pks[-1]
+
+    if isinstance(first, int) and isinstance(last, int) and last - first + 1 == len(pks):
+        return Q(**{name + '__range': (first, last)})
+
+    return Q(**{name + '__in': pks})
+
+
+
+class UpdateSnapshot(object):
+    """
+    A pk-indexed, column-oriented copy of the values written by a heterogeneous update
+
+    Values are read from the source once; chunks are slices of the columns, so building
+    the statements for every chunk is linear in the number of rows and fields
+
+    """
+    def __init__(self, fields, pks=None, columns=None):
+        """
+        :param list fields: the model fields being written, excluding the primary key
+        :param list pks: primary keys, one per row
+        :param list[list] columns: one list of values per field, aligned with pks
+        """
+        self.fields = list(fields)
+        self.pks = pks if pks is not None else []
+        self.columns = columns if columns is not None else [[] for _ in self.fields]
+        self.index = {pk: i for i, pk in enumerate(self.pks)}
+
+
+    @classmethod
+    def from_instances(cls, instances, fields):
+        """
+        Builds a snapshot by reading each field off each instance in a single pass
+
+        :param collections.Iterable instances: saved model instances
+        :param list fields: the model fields to read
+        :return:
+        """
+        snapshot = cls(fields)
+        attnames = [f.attname for f in snapshot.fields]
+
+        for instance in instances:
+            snapshot.add(instance.pk, [getattr(instance, attname) for attname in attnames])
+
+        return snapshot
+
+
+    @classmethod
+    def from_rows(cls, model, rows, fields=None):
+        """
+        Builds a snapshot from rows of new values in a single pk-indexed pass, without building model instances
+
+        rows can be any of:
+
+        - a mapping of columns (lists or NumPy arrays) keyed by field name or attname, with the primary keys
+          keyed by 'pk' or the primary key's name
+        - an iterable of mappings keyed the same way
+        - an iterable of (pk, value, ...) tuples, with values ordered like fields
+        - an iterable of objects with the fields as attributes, such as model instances
+
+        Fields default to the keys of the mappings, or to every concrete field for objects. Rows without
+        a primary key are skipped; when several rows have the same primary key the last one wins
+
+        :param model:
+        :param rows:
+        :param list fields: the concrete fields to read, excluding the primary key
+        :return:
+        """
+        opts = model._meta
+        to_python = opts.pk.to_python
+
+        if isinstance(rows, Mapping):
+            return cls._from_columns(opts, rows, fields)
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return cls(fields or [])
+
+        if isinstance(first, Mapping):
+            pk_key = _get_pk_key(opts, first)
+            if pk_key is None:
+                raise ValueError("Rows must include the primary key, keyed by 'pk' or '{}'".format(opts.pk.name))
+
+            fields = fields or _get_mapping_fields(opts, first)
+            readers = [_get_mapping_reader(field, first) for field in fields]
+
+            def read(row):
+                return row.get(pk_key), [reader(row) for reader in readers]
+
+        elif isinstance(first, (tuple, list)):
+            if not fields:
+                raise ValueError('Field names are required to read (pk, value, ...) tuples')
+
+            def read(row):
+                if len(row) != len(fields) + 1:
+                    raise ValueError('Expected (pk, value, ...) tuples of {} values: {}'.format(len(fields) + 1, row))
+                return row[0], row[1:]
+
+        else:
+            fields = fields or [f for f in opts.concrete_fields if not f.primary_key]
+            attnames = [f.attname for f in fields]
+
+            def read(obj):
+                return _get_object_pk(obj), [getattr(obj, attname) for attname in attnames]
+
+        snapshot = cls(fields)
+
+        for row in itertools.chain([first], rows):
+            pk, values = read(row)
+            if pk is not None:
+                snapshot.add(to_python(pk), values)
+
+        return snapshot
+
+
+    @classmethod
+    def _from_columns(cls, opts, columns, fields=None):
+        pk_key = _get_pk_key(opts, columns)
+        if pk_key is None:
+            raise ValueError("Columns must include the primary keys, keyed by 'pk' or '{}'".format(opts.pk.name))
+
+        fields = fields or _get_mapping_fields(opts, columns)
+        to_python = opts.pk.to_python
+
+        pks = [None if pk is None else to_python(pk) for pk in to_list(columns[pk_key])]
+        values = [_get_column(field, columns) for field in fields]
+
+        for field, column in zip(fields, values):
+            if len(column) != len(pks):
+                raise ValueError('Column {} has {} values for {} primary keys'.format(field.name, len(column), len(pks)))
+
+        # distinct keys can be used as they are; otherwise rows are merged one at a time
+        if None not in pks and len(set(pks)) == len(pks):
+            return cls(fields, pks, values)
+
+        snapshot = cls(fields)
+        for i, pk in enumerate(pks):
+            if pk is not None:
+                snapshot.add(pk, [column[i] for column in values])
+
+        return snapshot
+
+
+    def restrict(self, pks):
+        """
+        Returns a snapshot of only the rows whose primary key is in pks
+
+        :param set pks:
+        :return:
+        """
+        keep = [i for i, pk in enumerate(self.pks) if pk in pks]
+        if len(keep) == len(self.pks):
+            return self
+
+        return UpdateSnapshot(
+            self.fields, [self.pks[i] for i in keep], [[column[i] for i in keep] for column in self.columns]
+        )
+
+
+    def add(self, pk, values):
+        """
+        Adds a row; a row that was already added for the same pk is overwritten
+
+        :param pk:
+        :param list values: one value per field
+        :return:
+        """
+        if pk is None:
+            raise RuntimeError('Attempting to update an unsaved db record')
+
+        i = self.index.get(pk)
+        if i is None:
+            self.index[pk] = len(self.pks)
+            self.pks.append(pk)
+            for column, value in zip(self.columns, values):
+                column.append(value)
+
+        else:
+            for column, value in zip(self.columns, values):
+                column[i] = value
+
+
+    def __len__(self):
+        return len(self.pks)
+
+
+    def __getitem__(self, item):
+        # only slices are supported, so snapshots can be split like lists
+        if not isinstance(item, slice) or item.step not in (None, 1):
+            raise TypeError('UpdateSnapshot only supports contiguous slices')
+
+        return self.slice(item.start, item.stop)
+
+
+    def slice(self, start, end):
+        return UpdateSnapshot(self.fields, self.pks[start:end], [column[start:end] for column in self.columns])
+
+
+    def get_chunks(self, chunk_size, max_chunks=None):
+        """
+        Splits the snapshot into smaller snapshots, following the same rules as get_chunks()
+
+        :param int chunk_size:
+        :param int max_chunks:
+        :return: list of snapshots
+        :rtype: list[UpdateSnapshot]
+        """
+        return [
+            self.slice(r.start, r.stop) for r in get_chunks(range(len(self)), chunk_size, max_chunks=max_chunks)
+        ]
+
+
+
+def to_list(column):
+    # NumPy arrays (and pandas series) are converted to python values in one call
+    if hasattr(column, 'tolist'):
+        return column.tolist()
+
+    return list(column)
+
+
+
+def _get_object_pk(obj):
+    pk = getattr(obj, 'pk', None)
+    return pk if pk is not None else getattr(obj, 'id', None)
+
+
+
+def _get_pk_key(opts, mapping):
+    for key in ('pk', opts.pk.name, opts.pk.attname):
+        if key in mapping:
+            return key
+
+    return None
+
+
+
+def _get_mapping_fields(opts, mapping):
+    """
+    Resolves the keys of a row or column mapping to the concrete fields they hold, excluding the primary key
+
+    :param opts: model options
+    :param mapping:
+    :return: list of fields
+    """
+    by_key = {}
+    for field in opts.concrete_fields:
+        by_key[field.name] = by_key[field.attname] = field
+
+    fields = []
+    for key in mapping:
+        if key == 'pk':
+            continue
+
+        field = by_key.get(key)
+        if field is None:
+            raise ValueError('{} is not a concrete field of {}'.format(key, opts.label))
+
+        if not field.primary_key and field not in fields:
+            fields.append(field)
+
+    return fields
+
+
+
+def get_related_pk(value):
+    # related objects given by field name are written by primary key
+    return value.pk if hasattr(value, '_meta') else value
+
+
+
+def _get_mapping_reader(field, row):
+    """
+    Returns a function reading a field's value from row mappings shaped like row
+
+    :param field:
+    :param Mapping row:
+    :return:
+    """
+    if field.attname in row:
+        key = field.attname
+    elif field.name in row:
+        key = field.name
+    else:
+        raise ValueError('No value for {} in row: {}'.format(field.name, row))
+
+    if field.is_relation and key == field.name:
+        return lambda row: get_related_pk(row[key])
+
+    return lambda row: row[key]
+
+
+
+def _get_column(field, columns):
+    if field.attname in columns:
+        return to_list(columns[field.attname])
+
+    if field.name not in columns:
+        raise ValueError('No column for {}'.format(field.name))
+
+    column = to_list(columns[field.name])
+    if field.is_relation:
+        column = [get_related_pk(value) for value in column]
+
+    return column
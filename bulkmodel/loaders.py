@@ -0,0 +1,472 @@
+import itertools
+import os
+import tempfile
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import NotSupportedError
+from .stats import NULL_CHUNK
+
+
+def copy_from_buffer(cursor, sql, buf, size=65536):
+    """
+    Runs a COPY ... FROM STDIN statement, reading its payload from buf
+
+    psycopg2 cursors read the buffer themselves; with psycopg 3 it's written to cursor.copy() in blocks
+
+    :param cursor:
+    :param str sql:
+    :param buf: a file-like object returning str (text format) or bytes (binary format)
+    :param int size: size of the blocks read from buf
+    :return:
+    """
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, buf)
+        return
+
+    with cursor.copy(sql) as copy:
+        while True:
+            data = buf.read(size)
+            if not data:
+                return
+
+            copy.write(data)
+
+
+
+def iter_prepared_rows(rows, fields, connection):
+    """
+    Lazily converts rows into tuples of database values, as django would bind them
+
+    :param collections.Iterable rows: model instances, or tuples of values ordered like fields
+    :param list fields:
+    :param connection:
+    :return: generator of tuples
+    """
+    from .buffers import get_values_getter
+
+    get_values = get_values_getter([f.attname for f in fields])
+    preps = [f.get_db_prep_save for f in fields]
+
+    for row in rows:
+        values = row if isinstance(row, (tuple, list)) else get_values(row)
+        yield tuple([prep(value, connection) for prep, value in zip(preps, values)])
+
+
+
+class Loader(object):
+    """
+    Base class for the fastest bulk-load primitive of a database backend, used by copy_from_objects, and the
+    reads of copy_to_iterator and copy_to_columns
+
+    """
+    vendor = None
+
+    # formats of pre-encoded payloads the loader accepts; loaders without any encode rows themselves
+    formats = ()
+
+    # ChunkStats of the chunk being written, if stats are being collected
+    stats = NULL_CHUNK
+
+
+    def __init__(self, model, connection):
+        self.model = model
+        self.connection = connection
+        self.qn = connection.ops.quote_name
+
+
+    @classmethod
+    def is_supported(cls, connection):
+        return connection.vendor == cls.vendor
+
+
+    def load(self, tablename, fields, rows, format='text'):
+        """
+        Inserts rows into the table
+
+        :param str tablename:
+        :param list fields: model fields of the columns being written
+        :param collections.Iterable rows: model instances, or tuples of values ordered like fields
+        :param str format: payload format, for loaders that send one
+        :return: number of bytes sent, or 0 when rows aren't sent as a payload
+        """
+        raise NotImplementedError('subclasses of Loader must provide a load() method')
+
+
+    def load_columns(self, tablename, fields, columns, format='text'):
+        """
+        Inserts rows given as one sequence of values per field
+
+        :param str tablename:
+        :param list fields: model fields of the columns being written
+        :param list columns: sequences of values, ordered like fields and all of the same length
+        :param str format: payload format, for loaders that send one
+        :return: number of bytes sent, or 0 when rows aren't sent as a payload
+        """
+        return self.load(tablename, fields, zip(*columns), format)
+
+
+    def load_buffer(self, tablename, fields, buf, format='text'):
+        """
+        Inserts rows from a payload encoded ahead of time in one of the loader's formats
+
+        :param str tablename:
+        :param list fields:
+        :param buf: file-like object
+        :param str format:
+        :return:
+        """
+        raise NotSupportedError('{} does not accept encoded payloads'.format(type(self).__name__))
+
+
+    def read_blocks(self, compiler, sql, params, fields, offset=0, chunk_size=65536):
+        """
+        Runs a compiled SELECT and lazily yields its rows in blocks of at most chunk_size rows, as lists of the
+        values of fields converted the way django converts them
+
+        :param compiler: the compiler sql was generated by
+        :param str sql:
+        :param params:
+        :param list fields: fields of the columns read
+        :param int offset: position of the first column read in the compiler's select list
+        :param int chunk_size: number of rows fetched at a time
+        :return: generator of lists of rows
+        """
+        end = offset + len(fields)
+        converters = compiler.get_converters([expression for expression, _, _ in compiler.select[offset:end]])
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+
+                rows = [row[offset:end] for row in rows]
+                if converters:
+                    rows = list(compiler.apply_converters(rows, converters))
+
+                yield rows
+
+
+    def read_rows(self, compiler, sql, params, fields, offset=0, chunk_size=65536, stats=None):
+        """
+        Lazily reads the rows of a compiled SELECT as sequences of python values for fields; the base loader
+        runs the SELECT and fetches chunk_size rows at a time
+
+        :param compiler:
+        :param str sql:
+        :param params:
+        :param list fields:
+        :param int offset: position of the first column read in the compiler's select list
+        :param int chunk_size:
+        :param OperationStats stats: records each block read, if given
+        :return: generator of sequences
+        """
+        from .stats import record_reads
+
+        blocks = self.read_blocks(compiler, sql, params, fields, offset, chunk_size)
+        if stats is not None:
+            blocks = record_reads(stats, blocks)
+
+        for rows in blocks:
+            yield from rows
+
+
+    def read_columns(self, compiler, sql, params, fields, names, output='lists', offset=0, chunk_size=65536,
+                     stats=None):
+        """
+        Reads the result of a compiled SELECT into columns
+
+        :param compiler:
+        :param str sql:
+        :param params:
+        :param list fields:
+        :param list names: column names, aligned with fields
+        :param str output: 'lists', 'tuples', 'numpy' or 'pandas' (see columnar.read_columns)
+        :param int offset:
+        :param int chunk_size:
+        :param OperationStats stats:
+        :return:
+        """
+        from .columnar import rows_to_columns
+
+        rows = self.read_rows(compiler, sql, params, fields, offset, chunk_size, stats) if sql else ()
+        return rows_to_columns(rows, fields, names, output)
+
+
+
+class PostgresLoader(Loader):
+    """
+    COPY ... FROM STDIN, in PostgreSQL's text or binary format, with psycopg2 or psycopg 3
+
+    """
+    vendor = 'postgresql'
+    formats = ('text', 'binary')
+
+
+    def get_sql(self, tablename, fields, format='text'):
+        qn = self.qn
+        sql = 'COPY %s (%s) FROM STDIN' % (qn(tablename), ', '.join(qn(f.column) for f in fields))
+
+        if format == 'binary':
+            sql += ' WITH (FORMAT binary)'
+
+        return sql
+
+
+    def get_encoder(self, fields, format='text'):
+        from .buffers import get_row_encoder
+
+        if format == 'binary':
+            return get_row_encoder(fields, format, self.connection)
+
+        return get_row_encoder(fields)
+
+
+    def load(self, tablename, fields, rows, format='text'):
+        from .buffers import CopyBuffer
+
+        # rows are encoded as the driver reads them, so the payload is never held in memory
+        buf = CopyBuffer(self.get_encoder(fields, format).encode_rows(rows), binary=format == 'binary')
+        self.load_buffer(tablename, fields, buf, format)
+
+        return buf.bytes_read
+
+
+    def load_columns(self, tablename, fields, columns, format='text'):
+        from .buffers import CopyBuffer
+
+        encoder = self.get_encoder(fields, format)
+        n, size = len(columns[0]) if columns else 0, encoder.block_size
+
+        # blocks are encoded from slices of the columns, without building rows
+        blocks = (encoder.encode_columns([column[i:i + size] for column in columns]) for i in range(0, n, size))
+
+        if format == 'binary':
+            from .pgcopy import PGCOPY_HEADER, PGCOPY_TRAILER
+            blocks = itertools.chain([PGCOPY_HEADER], blocks, [PGCOPY_TRAILER])
+
+        buf = CopyBuffer(blocks, binary=format == 'binary')
+        self.load_buffer(tablename, fields, buf, format)
+
+        return buf.bytes_read
+
+
+    def load_buffer(self, tablename, fields, buf, format='text'):
+        # note there's no need to commit here because there's no transaction
+        with self.connection.cursor() as cursor, self.stats.timing('execute'):
+            copy_from_buffer(cursor, self.get_sql(tablename, fields, format), buf)
+
+
+    def get_copy_to_sql(self, cursor, sql, params):
+        # COPY doesn't take bind parameters, so they're interpolated by the driver
+        query = cursor.mogrify(sql, params)
+        if isinstance(query, bytes):
+            query = query.decode('utf-8')
+
+        return 'COPY (%s) TO STDOUT' % query
+
+
+    def read_chunks(self, sql, params, chunk_size=65536, stats=None):
+        """
+        Lazily yields the output of COPY (SELECT ...) TO STDOUT in chunks of roughly chunk_size characters
+
+        :return: generator of str
+        """
+        from .buffers import iter_copy_to
+        from .stats import record_reads
+
+        with self.connection.cursor() as cursor:
+            chunks = iter_copy_to(cursor, self.get_copy_to_sql(cursor, sql, params), chunk_size)
+            if stats is not None:
+                chunks = record_reads(stats, chunks)
+
+            yield from chunks
+
+
+    def read_rows(self, compiler, sql, params, fields, offset=0, chunk_size=65536, stats=None):
+        from .buffers import get_row_parser
+
+        # COPY outputs every column of the select list, so the fields' columns are sliced from offset;
+        # chunk_size is in characters
+        return get_row_parser(fields).parse_chunks(self.read_chunks(sql, params, chunk_size, stats), offset)
+
+
+    def read_columns(self, compiler, sql, params, fields, names, output='lists', offset=0, chunk_size=65536,
+                     stats=None):
+        from .columnar import read_columns
+
+        chunks = self.read_chunks(sql, params, chunk_size, stats) if sql else ()
+        return read_columns(chunks, fields, names, output, offset)
+
+
+
+class MySQLLoader(Loader):
+    """
+    LOAD DATA LOCAL INFILE
+
+    Rows are encoded into a temporary file as they're read, so memory use doesn't grow with the chunk, and
+    the file is sent by the driver. The client needs local_infile enabled (e.g., OPTIONS = {'local_infile': 1}
+    with mysqlclient or PyMySQL) and the server must allow it
+
+    """
+    vendor = 'mysql'
+
+    # backslash, tab, newline, carriage return and NUL are escaped with the default ESCAPED BY '\\'
+    escapes = str.maketrans({
+        '\\': '\\\\',
+        '\t': '\\t',
+        '\n': '\\n',
+        '\r': '\\r',
+        '\x00': '\\0',
+    })
+
+
+    def format_value(self, value):
+        if value is None:
+            return '\\N'
+
+        if isinstance(value, bool):
+            return '1' if value else '0'
+
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            # the file is read as utf8mb4 text, which can't carry arbitrary bytes
+            raise TypeError('Binary values cannot be loaded with LOAD DATA; use bulk_create instead')
+
+        return str(value).translate(self.escapes)
+
+
+    def get_sql(self, tablename, fields):
+        qn = self.qn
+
+        return (
+            "LOAD DATA LOCAL INFILE %%s INTO TABLE %s CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' (%s)"
+        ) % (qn(tablename), ', '.join(qn(f.column) for f in fields))
+
+
+    def load(self, tablename, fields, rows, format='text'):
+        format_value = self.format_value
+
+        # the file is reopened by the driver, so it's closed before loading and removed after
+        fd, path = tempfile.mkstemp(prefix='bm_load_', suffix='.tsv')
+
+        try:
+            with open(fd, 'w', encoding='utf-8', newline='') as f:
+                for values in iter_prepared_rows(rows, fields, self.connection):
+                    f.write('\t'.join([format_value(value) for value in values]))
+                    f.write('\n')
+
+            n_bytes = os.path.getsize(path)
+
+            with self.connection.cursor() as cursor, self.stats.timing('execute'):
+                cursor.execute(self.get_sql(tablename, fields), [path])
+
+        finally:
+            os.remove(path)
+
+        return n_bytes
+
+
+
+class SQLiteLoader(Loader):
+    """
+    A prepared single-row INSERT run with executemany() inside one transaction
+
+    When no transaction is open, the load runs in its own BEGIN IMMEDIATE transaction, which takes the write
+    lock up front so concurrent loads wait for each other (up to the busy timeout) instead of failing to
+    upgrade their locks. The pragmas in the SQLITE_LOAD_PRAGMAS setting (by default a larger page cache and
+    synchronous = NORMAL) are applied for the duration of the load and restored after; SQLite doesn't allow
+    changing some of them inside a transaction
+
+    """
+    vendor = 'sqlite'
+
+    pragmas = {
+        'cache_size': -65536,
+        'synchronous': 'NORMAL',
+    }
+
+
+    def get_sql(self, tablename, fields):
+        qn = self.qn
+
+        return 'INSERT INTO %s (%s) VALUES (%s)' % (
+            qn(tablename), ', '.join(qn(f.column) for f in fields), ', '.join(['%s'] * len(fields)),
+        )
+
+
+    def in_transaction(self):
+        return self.connection.in_atomic_block or not self.connection.get_autocommit()
+
+
+    @contextmanager
+    def tuned(self, cursor):
+        pragmas = getattr(settings, 'SQLITE_LOAD_PRAGMAS', self.pragmas)
+
+        if self.in_transaction() or not pragmas:
+            yield
+            return
+
+        previous = {}
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s' % name)
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+        try:
+            yield
+        finally:
+            for name, value in previous.items():
+                cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+    @contextmanager
+    def immediate_transaction(self, cursor):
+        if self.in_transaction():
+            yield
+            return
+
+        cursor.execute('BEGIN IMMEDIATE')
+
+        try:
+            yield
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+
+        cursor.execute('COMMIT')
+
+
+    def load(self, tablename, fields, rows, format='text'):
+        sql = self.get_sql(tablename, fields)
+
+        with self.connection.cursor() as cursor, self.tuned(cursor):
+            with self.immediate_transaction(cursor), self.stats.timing('execute'):
+                cursor.executemany(sql, iter_prepared_rows(rows, fields, self.connection))
+
+        return 0
+
+
+
+LOADERS = [
+    PostgresLoader,
+    MySQLLoader,
+    SQLiteLoader,
+]
+
+
+def get_loader(model, connection):
+    """
+    Returns the bulk loader for the connection's backend
+
+    :param model:
+    :param connection:
+    :return:
+    """
+    for loader_class in LOADERS:
+        if loader_class.is_supported(connection):
+            return loader_class(model, connection)
+
+    raise NotSupportedError('Bulk loading is not supported for database vendor {}'.format(connection.vendor))
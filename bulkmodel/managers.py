@@ -2,8 +2,9 @@ from django.db import models
 from django.db import InterfaceError
 from django.db.utils import OperationalError
 from django.db import connections
-from io import StringIO
+from django.conf import settings
 import collections
+import time
 
 
 class BulkModelManager(models.Manager):
@@ -11,7 +12,7 @@ class BulkModelManager(models.Manager):
     def get_queryset(self):
         """
         Retrieves a queryset that refreshes the database connection when dropped
-        The retry only happens once, and errors raised beyond this single retry attempt will be re-raised
+        The connection is checked at most once per CONNECTION_CHECK_INTERVAL seconds (see ensure_connected)
 
         :return:
         """
@@ -74,19 +75,38 @@ class BulkModelManager(models.Manager):
 
 
 
-    def ensure_connected(self):
+    def ensure_connected(self, force=False):
         """
         Makes sure the connection is established by running a select 1 against the cursor
 
+        A connection that passed the check less than CONNECTION_CHECK_INTERVAL seconds ago (30 by default; 0 checks
+        every time) isn't checked again. Connections that aren't open yet are left for Django to open, and
+        connections inside a transaction are left alone, since closing them would lose the transaction
+
+        :param bool force: check the connection even if it was checked recently
         :return:
         """
         dbconn = connections[self.db]
 
+        if dbconn.connection is None or dbconn.in_atomic_block:
+            return
+
+        # the raw connection is kept with the time it was checked, so a reopened connection is checked again
+        checked = getattr(dbconn, 'bm_checked', None)
+        now = time.monotonic()
+        interval = getattr(settings, 'CONNECTION_CHECK_INTERVAL', 30)
+
+        if not force and checked is not None and checked[0] is dbconn.connection and now - checked[1] < interval:
+            return
+
         try:
             with dbconn.cursor() as c:
                 c.execute('select 1;')
 
+            dbconn.bm_checked = (dbconn.connection, now)
+
         except (OperationalError, InterfaceError):
+            dbconn.bm_checked = None
             dbconn.close()
 
 
@@ -104,7 +124,7 @@ class BulkModelManager(models.Manager):
         return self
 
 
-    def update_m2m_fields(self, fieldname, mapping):
+    def update_m2m_fields(self, fieldname, mapping, batch_size=None, use_copy=False, send_signal=True):
         """
         Updates m2m relationship across several model instances.
 
@@ -114,15 +134,31 @@ class BulkModelManager(models.Manager):
 
         :param str fieldname:
         :param dict[int, list[int]] mapping:
-        :return:
+        :param int batch_size:
+        :param bool use_copy:
+        :param bool send_signal:
+        :return: tuple of the number of pairs added and the number of pairs removed
         """
-        return self.get_queryset().update_m2m_fields(fieldname, mapping)
+        return self.get_queryset().update_m2m_fields(
+            fieldname, mapping, batch_size=batch_size, use_copy=use_copy, send_signal=send_signal
+        )
 
 
     # region wrappers so that it's easier for IDEs to pick up these queryset methods
 
+    def with_stats(self, callback=None):
+        """
+        Returns a queryset whose bulk operations collect stats; see BulkModelQuerySet.with_stats
+
+        :param callback: called with the OperationStats of each operation once it has finished
+        :return:
+        """
+        return self.get_queryset().with_stats(callback=callback)
+
+
     def update_fields(self, *fieldnames, objects=None, batch_size=None, send_signal=True,
-                      concurrent=False, max_concurrent_workers=None, return_queryset=False):
+                      concurrent=False, max_concurrent_workers=None, return_queryset=False,
+                      strategy=None):
         """
         Performs a hetergeneous update
 
@@ -132,12 +168,13 @@ class BulkModelManager(models.Manager):
         :param send_signal:
         :param concurrent:
         :param max_concurrent_workers:
+        :param strategy:
         :return:
         """
         return self.get_queryset().update_fields(
-            *fieldnames, objects = objects, send_signal=send_signal,
+            *fieldnames, objects = objects, batch_size=batch_size, send_signal=send_signal,
             concurrent=concurrent, max_concurrent_workers=max_concurrent_workers,
-            return_queryset = return_queryset
+            return_queryset = return_queryset, strategy=strategy
         )
 
 
@@ -162,52 +199,213 @@ class BulkModelManager(models.Manager):
             return_queryset=return_queryset
         )
 
+
+    def bulk_create_from_columns(self, columns, bm_create_uuid=None, batch_size=None, send_signal=True,
+                                 concurrent=False, max_concurrent_workers=None, return_queryset=False):
+        """
+        Inserts rows given as columns, without building model instances; see BulkModelQuerySet.bulk_create_from_columns
+
+        :param Mapping columns: lists, NumPy arrays or pandas series keyed by field name or attname
+        :param UUID bm_create_uuid: a uuid to use as the bm_create_uuid in the model
+        :param batch_size:
+        :param bool send_signal:
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool return_queryset: whether to return a queryset of the created records
+        :return: the number of rows created, or a queryset of them if return_queryset
+        """
+        return self.get_queryset().bulk_create_from_columns(
+            columns, bm_create_uuid=bm_create_uuid, batch_size=batch_size, send_signal=send_signal,
+            concurrent=concurrent, max_concurrent_workers=max_concurrent_workers,
+            return_queryset=return_queryset
+        )
+
+
+    def bulk_upsert(self, objs, unique_fields=None, update_fields=None, bm_create_uuid=None, batch_size=None,
+                    send_signal=True, concurrent=False, max_concurrent_workers=None,
+                    return_queryset=False, strategy=None):
+        """
+        Inserts objects in bulk, updating existing rows that conflict on a unique constraint
+
+        :param objs:
+        :param List[str] unique_fields: field names of the unique constraint to detect conflicts on; defaults to the primary key
+        :param List[str] update_fields: field names to overwrite on conflict; defaults to all fields except the unique ones
+        :param UUID bm_create_uuid: a uuid to use as the bm_create_uuid in the model
+        :param batch_size:
+        :param bool send_signal:
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool return_queryset: whether to return a queryset of inserted and updated records
+        :param str strategy: 'staging' or None
+        :return:
+        """
+        return self.get_queryset().bulk_upsert(
+            objs, unique_fields=unique_fields, update_fields=update_fields, bm_create_uuid=bm_create_uuid,
+            batch_size=batch_size, send_signal=send_signal, concurrent=concurrent,
+            max_concurrent_workers=max_concurrent_workers, return_queryset=return_queryset, strategy=strategy
+        )
+
+
+    def merge_from_objects(self, objs, unique_fields=None, update_fields=None, bm_create_uuid=None,
+                           batch_size=None, send_signal=True, concurrent=False, max_concurrent_workers=None,
+                           return_queryset=False):
+        """
+        Inserts and updates objects in one pass through a COPY-filled staging table;
+        see BulkModelQuerySet.merge_from_objects
+
+        :param objs:
+        :param List[str] unique_fields:
+        :param List[str] update_fields:
+        :param UUID bm_create_uuid:
+        :param batch_size:
+        :param bool send_signal:
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool return_queryset:
+        :return:
+        """
+        return self.get_queryset().merge_from_objects(
+            objs, unique_fields=unique_fields, update_fields=update_fields, bm_create_uuid=bm_create_uuid,
+            batch_size=batch_size, send_signal=send_signal, concurrent=concurrent,
+            max_concurrent_workers=max_concurrent_workers, return_queryset=return_queryset
+        )
+
+
+    def bulk_delete(self, batch_size=None, concurrent=False, max_concurrent_workers=None, cascade=True,
+                    send_signal=True):
+        """
+        Deletes all records by primary key, in chunks; see BulkModelQuerySet.bulk_delete
+
+        :param int batch_size:
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool cascade:
+        :param bool send_signal:
+        :return:
+        """
+        return self.get_queryset().bulk_delete(
+            batch_size=batch_size, concurrent=concurrent, max_concurrent_workers=max_concurrent_workers,
+            cascade=cascade, send_signal=send_signal
+        )
+
     # endregion
 
 
-    def copy_to_instances(self, columns=None):
+    # region coroutine wrappers; the queryset is built without the connection check, which would block the loop
+
+    def _get_async_queryset(self):
+        from .queryset import BulkModelQuerySet
+        return BulkModelQuerySet(self.model, using=self._db)
+
+
+    async def abulk_create(self, objs, bm_create_uuid=None, batch_size=None, send_signal=True,
+                           max_concurrent_workers=None, return_queryset=False):
         """
-        Populates data in instances of the queryset using the COPY TO function, if supported by the
-        database being used
+        Coroutine counterpart of bulk_create; see BulkModelQuerySet.abulk_create
 
-        :param columns:
+        :param objs:
+        :param UUID bm_create_uuid:
+        :param batch_size:
+        :param bool send_signal:
+        :param int max_concurrent_workers:
+        :param bool return_queryset:
         :return:
         """
-        dbconn = connections[self.db]
-        tablename = self.model._meta.db_table
-        ls = []
+        return await self._get_async_queryset().abulk_create(
+            objs, bm_create_uuid=bm_create_uuid, batch_size=batch_size, send_signal=send_signal,
+            max_concurrent_workers=max_concurrent_workers, return_queryset=return_queryset
+        )
+
+
+    async def aupdate_fields(self, *fieldnames, objects=None, batch_size=None, send_signal=True,
+                             max_concurrent_workers=None, return_queryset=False, strategy=None):
+        """
+        Coroutine counterpart of update_fields; see BulkModelQuerySet.aupdate_fields
+
+        :param fieldnames:
+        :param objects:
+        :param batch_size:
+        :param bool send_signal:
+        :param int max_concurrent_workers:
+        :param bool return_queryset:
+        :param str strategy:
+        :return:
+        """
+        return await self._get_async_queryset().aupdate_fields(
+            *fieldnames, objects=objects, batch_size=batch_size, send_signal=send_signal,
+            max_concurrent_workers=max_concurrent_workers, return_queryset=return_queryset, strategy=strategy
+        )
+
+
+    async def acopy_from_objects(self, objs, bm_create_uuid=None, exclude_id=True, signal=True,
+                                 max_concurrent_workers=None, fieldnames=None, batch_size=None,
+                                 return_queryset=False, stream=None, format='text'):
+        """
+        Coroutine counterpart of copy_from_objects; see BulkModelQuerySet.acopy_from_objects
+
+        :param objs:
+        :param bm_create_uuid:
+        :param exclude_id:
+        :param signal:
+        :param int max_concurrent_workers:
+        :param fieldnames:
+        :param batch_size:
+        :param return_queryset:
+        :param bool stream:
+        :param str format:
+        :return:
+        """
+        return await self._get_async_queryset().acopy_from_objects(
+            objs, bm_create_uuid=bm_create_uuid, exclude_id=exclude_id, signal=signal,
+            max_concurrent_workers=max_concurrent_workers, fieldnames=fieldnames, batch_size=batch_size,
+            return_queryset=return_queryset, stream=stream, format=format
+        )
+
+    # endregion
 
-        buf = StringIO()
 
-        with dbconn.cursor() as cursor:
-            cursor.copy_to(buf, tablename, columns=columns)
-            buf.seek(0,0)
+    def copy_to_iterator(self, tuples=False, chunk_size=65536):
+        """
+        Lazily reads rows with the backend's loader; see BulkModelQuerySet.copy_to_iterator
+
+        :param bool tuples:
+        :param int chunk_size:
+        :return:
+        """
+        return self.get_queryset().copy_to_iterator(tuples=tuples, chunk_size=chunk_size)
+
+
+    def copy_to_columns(self, output='lists', chunk_size=65536):
+        """
+        Reads the table into column-oriented data; see BulkModelQuerySet.copy_to_columns
 
-        fields = self.model._meta.fields
-        data = buf.read()
-        buf.close()
-        del buf
+        :param str output: 'lists', 'tuples', 'numpy' or 'pandas'
+        :param int chunk_size:
+        :return:
+        """
+        return self.get_queryset().copy_to_columns(output=output, chunk_size=chunk_size)
 
-        rows = data.split('\n')
-        for row in rows:
-            if not row:
-                continue
 
-            cols = row.split('\t')
-            objdata = {}
-            for field, value in zip(fields, cols):
-                objdata[field.name] = field.to_python(value)
+    def copy_to_instances(self, columns=None):
+        """
+        Populates data in instances of the queryset using the COPY TO function on PostgreSQL, or a chunked
+        SELECT on other databases
 
-            ls.append(self.model(**objdata))
+        :param columns: names of the fields to load; others are deferred
+        :return:
+        """
+        qs = self.get_queryset()
+        if columns:
+            qs = qs.only(*columns)
 
-        return ls
+        return list(qs.copy_to_iterator())
 
 
 
     def copy_from_objects(self, objs, bm_create_uuid=None, exclude_id=True, signal=True,
                           concurrent=False, max_concurrent_workers=None,
                           fieldnames=None, batch_size=None,
-                          return_queryset=False):
+                          return_queryset=False, stream=None, format='text', encoding_processes=None):
         """
         Updates data in the databse using the COPY FROM operaiton, if supported by the database being used
 
@@ -220,12 +418,16 @@ class BulkModelManager(models.Manager):
         :param fieldnames:
         :param batch_size:
         :param return_queryset:
+        :param bool stream: stream objs (any iterable) with constant memory; defaults to True for non-list inputs
+        :param str format: 'text' or 'binary'
+        :param int encoding_processes: number of processes encoding COPY payloads
         :return:
         """
         return self.get_queryset().copy_from_objects(
             objs, bm_create_uuid=bm_create_uuid, exclude_id=exclude_id, signal=signal,
             concurrent=concurrent, max_concurrent_workers=max_concurrent_workers,
             fieldnames=fieldnames, batch_size=batch_size,
-            return_queryset=return_queryset
+            return_queryset=return_queryset, stream=stream, format=format,
+            encoding_processes=encoding_processes
         )
 
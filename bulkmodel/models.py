@@ -1,5 +1,6 @@
 from django.db import models
 from .managers import BulkModelManager
+import copy
 
 
 class BulkModel(models.Model):
@@ -12,7 +13,11 @@ class BulkModel(models.Model):
 
     on your model
 
-    If you do inherit from it you'll need to run migrations to pick up an additional data field (bm_create_uuid)
+    If you do inherit from it you'll need to run migrations to pick up an additional data field (bm_create_uuid).
+    It's used to find bulk-created rows again on databases that can't return the primary keys of inserted rows
+
+    Set bm_track_changes = True on a subclass to record the values loaded from the database, so that
+    update_fields() called without field names only writes the columns that changed
 
     """
 
@@ -23,3 +28,90 @@ class BulkModel(models.Model):
 
     objects = BulkModelManager()
 
+    # opt-in change tracking
+    bm_track_changes = False
+
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        if cls.bm_track_changes:
+            instance._bm_loaded_values = {
+                attname: cls._bm_copy_value(value) for attname, value in zip(field_names, values)
+            }
+
+        return instance
+
+
+    @staticmethod
+    def _bm_copy_value(value):
+        # mutable values (e.g., array or json fields) can be changed in place
+        if isinstance(value, (list, dict)):
+            return copy.deepcopy(value)
+
+        return value
+
+
+    def bm_changed_fields(self, fields=None):
+        """
+        Returns the fields whose values differ from the ones loaded from the database
+
+        Instances that were not loaded from the database (or were loaded without change tracking)
+        report every field as changed
+
+        :param list fields: fields to check; defaults to all concrete fields
+        :return: list of changed fields, in the order given
+        """
+        if fields is None:
+            fields = self._meta.concrete_fields
+
+        loaded = getattr(self, '_bm_loaded_values', None)
+        if loaded is None:
+            return list(fields)
+
+        changed = []
+        for field in fields:
+            attname = field.attname
+
+            if attname not in loaded:
+                # deferred when loaded; only changed if it has been set since
+                if attname in self.__dict__:
+                    changed.append(field)
+
+                continue
+
+            if getattr(self, attname) != loaded[attname]:
+                changed.append(field)
+
+        return changed
+
+
+    def bm_mark_clean(self, fields=None):
+        """
+        Records the current values as the ones stored in the database
+
+        :param list fields: fields to mark as clean; defaults to all loaded concrete fields
+        :return:
+        """
+        if fields is None:
+            fields = self._meta.concrete_fields
+
+        loaded = getattr(self, '_bm_loaded_values', None)
+        if loaded is None:
+            loaded = self._bm_loaded_values = {}
+
+        for field in fields:
+            if field.attname in self.__dict__:
+                loaded[field.attname] = self._bm_copy_value(getattr(self, field.attname))
+
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        if self.bm_track_changes:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                self.bm_mark_clean([self._meta.get_field(name) for name in update_fields])
+            else:
+                self.bm_mark_clean()
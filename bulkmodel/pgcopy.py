@@ -0,0 +1,429 @@
+import datetime
+import decimal
+import itertools
+import json
+import struct
+import uuid
+from django.utils import timezone
+from .buffers import get_row_encoder, get_row_values, get_values_getter
+
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+# every field is written as an int32 length followed by its data; fixed-size types pack both in one call
+_int2 = struct.Struct('>h')
+_int4 = struct.Struct('>i')
+_field_int2 = struct.Struct('>ih')
+_field_int4 = struct.Struct('>ii')
+_field_int8 = struct.Struct('>iq')
+_field_float8 = struct.Struct('>id')
+_field_interval = struct.Struct('>iqii')
+
+_NULL = _int4.pack(-1)
+_TRUE = _int4.pack(1) + b'\x01'
+_FALSE = _int4.pack(1) + b'\x00'
+_UUID_LENGTH = _int4.pack(16)
+
+PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+PG_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+# element type oids, needed inside array values
+OIDS = {
+    'bool': 16,
+    'bytea': 17,
+    'int8': 20,
+    'int2': 21,
+    'int4': 23,
+    'text': 25,
+    'json': 114,
+    'float8': 701,
+    'varchar': 1043,
+    'date': 1082,
+    'time': 1083,
+    'timestamptz': 1184,
+    'interval': 1186,
+    'numeric': 1700,
+    'uuid': 2950,
+    'jsonb': 3802,
+}
+
+
+# maps Field.get_internal_type() to a postgres type
+INTERNAL_TYPES = {
+    'AutoField': 'int4',
+    'IntegerField': 'int4',
+    'PositiveIntegerField': 'int4',
+    'BigAutoField': 'int8',
+    'BigIntegerField': 'int8',
+    'PositiveBigIntegerField': 'int8',
+    'SmallAutoField': 'int2',
+    'SmallIntegerField': 'int2',
+    'PositiveSmallIntegerField': 'int2',
+    'FloatField': 'float8',
+    'DecimalField': 'numeric',
+    'BooleanField': 'bool',
+    'NullBooleanField': 'bool',
+    'CharField': 'varchar',
+    'SlugField': 'varchar',
+    'FileField': 'varchar',
+    'FilePathField': 'varchar',
+    'TextField': 'text',
+    'UUIDField': 'uuid',
+    'DateTimeField': 'timestamptz',
+    'DateField': 'date',
+    'TimeField': 'time',
+    'DurationField': 'interval',
+    'BinaryField': 'bytea',
+    'JSONField': 'jsonb',
+}
+
+
+
+def _prefixed(data):
+    return _int4.pack(len(data)) + data
+
+
+def _encode_int2(value):
+    return _field_int2.pack(2, value)
+
+
+def _encode_int4(value):
+    return _field_int4.pack(4, value)
+
+
+def _encode_int8(value):
+    return _field_int8.pack(8, value)
+
+
+def _encode_float8(value):
+    return _field_float8.pack(8, value)
+
+
+def _encode_bool(value):
+    return _TRUE if value else _FALSE
+
+
+def _encode_text(value):
+    data = str(value).encode('utf-8')
+    return _int4.pack(len(data)) + data
+
+
+def _encode_bytea(value):
+    return _prefixed(bytes(value))
+
+
+def _encode_uuid(value):
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(str(value))
+
+    return _UUID_LENGTH + value.bytes
+
+
+def _encode_date(value):
+    return _field_int4.pack(4, (value - PG_EPOCH_DATE).days)
+
+
+def _encode_time(value):
+    micros = ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+    return _field_int8.pack(8, micros)
+
+
+def _encode_interval(value):
+    micros = value.seconds * 1000000 + value.microseconds
+    return _field_interval.pack(16, micros, value.days, 0)
+
+
+# structs packing the length prefix, header and base-10000 digits of a numeric, keyed on the number of digits
+_numeric_structs = {}
+
+
+def _get_numeric_struct(n_groups):
+    packer = _numeric_structs.get(n_groups)
+    if packer is None:
+        packer = _numeric_structs[n_groups] = struct.Struct('>ihhHH%dH' % n_groups)
+
+    return packer
+
+
+def _encode_numeric(value):
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(value)
+
+    # str() is much cheaper than as_tuple(), and only uses exponents for very large or small values
+    text = str(value)
+
+    if 'E' in text or not value.is_finite():
+        if value.is_nan():
+            return _prefixed(struct.pack('>hhHH', 0, 0, 0xC000, 0))
+
+        if value.is_infinite():
+            raise ValueError('Cannot encode an infinite decimal: {}'.format(value))
+
+        sign, digits, exponent = value.as_tuple()
+        coefficient = int(''.join(map(str, digits)))
+
+    else:
+        sign = text[0] == '-'
+        integer, _, fraction = text.lstrip('-').partition('.')
+        exponent = -len(fraction)
+        coefficient = int(integer + fraction)
+
+    dscale = -exponent if exponent < 0 else 0
+
+    # align the exponent to a multiple of 4 so the coefficient splits into base-10000 digits
+    shift = exponent % 4
+    coefficient *= 10 ** shift
+    exponent -= shift
+
+    groups = []
+    while coefficient:
+        coefficient, group = divmod(coefficient, 10000)
+        groups.append(group)
+
+    weight = exponent // 4 + len(groups) - 1 if groups else 0
+
+    # groups are least significant first; trailing zeros don't need to be sent
+    start = 0
+    while start < len(groups) and groups[start] == 0:
+        start += 1
+
+    groups = groups[:start - 1 if start else None:-1]
+    n_groups = len(groups)
+
+    return _get_numeric_struct(n_groups).pack(
+        8 + 2 * n_groups, n_groups, weight, 0x4000 if sign else 0, dscale, *groups
+    )
+
+
+
+def _get_session_timezone(connection):
+    # the session time zone: TIME_ZONE when USE_TZ is off, otherwise the database's TIME_ZONE or UTC
+    name = getattr(connection, 'timezone_name', None) or 'UTC'
+
+    try:
+        import zoneinfo
+    except ImportError:
+        import pytz
+        return pytz.timezone(name)
+
+    return zoneinfo.ZoneInfo(name)
+
+
+
+def _get_timestamptz_encoder(connection):
+    # naive datetimes are interpreted in the session's time zone, as they are for text input
+    tz = _get_session_timezone(connection)
+
+    def encode(value):
+        if value.tzinfo is None:
+            value = timezone.make_aware(value, tz)
+
+        delta = value - PG_EPOCH
+        return _field_int8.pack(8, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+    return encode
+
+
+def _get_json_encoder(field, binary_version):
+    encoder_class = getattr(field, 'encoder', None)
+
+    def encode(value):
+        return _prefixed(binary_version + json.dumps(value, cls=encoder_class).encode('utf-8'))
+
+    return encode
+
+
+def _get_array_encoder(element_oid, encode_element):
+    def encode(value):
+        # dimensions are taken from the first element at each level; postgres requires them to be rectangular
+        dims = []
+        level = value
+        while isinstance(level, (list, tuple)):
+            dims.append(len(level))
+            if not level:
+                break
+            level = level[0]
+
+        if not dims or dims[0] == 0:
+            return _prefixed(struct.pack('>iii', 0, 0, element_oid))
+
+        elements = value
+        for _ in range(len(dims) - 1):
+            elements = [item for sub in elements for item in sub]
+
+        has_null = any(e is None for e in elements)
+        parts = [struct.pack('>iii', len(dims), int(has_null), element_oid)]
+        for dim in dims:
+            parts.append(struct.pack('>ii', dim, 1))
+
+        # array elements use the same length-prefixed layout as fields
+        parts.extend(_NULL if element is None else encode_element(element) for element in elements)
+
+        return _prefixed(b''.join(parts))
+
+    return encode
+
+
+_SCALAR_ENCODERS = {
+    'int2': _encode_int2,
+    'int4': _encode_int4,
+    'int8': _encode_int8,
+    'float8': _encode_float8,
+    'bool': _encode_bool,
+    'varchar': _encode_text,
+    'text': _encode_text,
+    'bytea': _encode_bytea,
+    'uuid': _encode_uuid,
+    'date': _encode_date,
+    'time': _encode_time,
+    'interval': _encode_interval,
+    'numeric': _encode_numeric,
+}
+
+
+
+def get_pg_type(field):
+    """
+    Returns the postgres type a model field is stored as, following foreign keys to their target
+
+    :param field:
+    :return:
+    """
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return get_pg_type(field.target_field)
+
+    if internal_type == 'ArrayField':
+        return get_pg_type(field.base_field) + '[]'
+
+    pg_type = INTERNAL_TYPES.get(internal_type)
+    if pg_type is None:
+        raise NotImplementedError(
+            'Binary COPY does not support field {} of type {}'.format(field.name, internal_type)
+        )
+
+    return pg_type
+
+
+
+def get_binary_encoder(field, connection):
+    """
+    Returns a function encoding a non-null python value of the field into its binary COPY representation,
+    including the length prefix
+
+    :param field:
+    :param connection:
+    :return:
+    """
+    internal_type = field.get_internal_type()
+
+    if internal_type in ('ForeignKey', 'OneToOneField'):
+        return get_binary_encoder(field.target_field, connection)
+
+    if internal_type == 'ArrayField':
+        base_field = field.base_field
+        while base_field.get_internal_type() == 'ArrayField':
+            base_field = base_field.base_field
+
+        element_type = get_pg_type(base_field)
+        return _get_array_encoder(OIDS[element_type], get_binary_encoder(base_field, connection))
+
+    pg_type = get_pg_type(field)
+
+    if pg_type == 'timestamptz':
+        return _get_timestamptz_encoder(connection)
+
+    if pg_type == 'jsonb':
+        return _get_json_encoder(field, b'\x01')
+
+    return _SCALAR_ENCODERS[pg_type]
+
+
+
+class BinaryRowEncoder(object):
+    """
+    Encodes rows of values into binary COPY tuples for a fixed list of fields
+
+    """
+    # rows encoded per block yielded by encode_rows()
+    block_size = 1000
+
+
+    def __init__(self, fields, connection):
+        self.attnames = [f.attname for f in fields]
+        self.get_values = get_values_getter(self.attnames)
+        self.encoders = tuple(get_binary_encoder(f, connection) for f in fields)
+        self.field_count = _int2.pack(len(fields))
+
+
+    def encode(self, values):
+        return self.field_count + b''.join([
+            _NULL if value is None else encode(value) for encode, value in zip(self.encoders, values)
+        ])
+
+
+    def encode_many(self, rows):
+        """
+        Encodes a batch of rows column by column into a single block of tuples
+
+        :param list rows: model instances, or tuples of values ordered like fields
+        :return: bytes
+        """
+        if not rows:
+            return b''
+
+        return self.encode_columns(list(zip(*get_row_values(rows, self.get_values))))
+
+
+    def encode_columns(self, columns):
+        """
+        Encodes a batch of rows given as one sequence of values per field
+
+        :param list columns: sequences of values, ordered like fields and all of the same length
+        :return: bytes
+        """
+        if not columns or not len(columns[0]):
+            return b''
+
+        encoded = []
+        for encode, column in zip(self.encoders, columns):
+            if None in column:
+                encoded.append([_NULL if value is None else encode(value) for value in column])
+            else:
+                encoded.append(map(encode, column))
+
+        # joining each tuple first is cheaper than chaining every value into one join
+        return b''.join(map(b''.join, zip(itertools.repeat(self.field_count, len(columns[0])), *encoded)))
+
+
+    def encode_rows(self, rows):
+        yield PGCOPY_HEADER
+
+        rows = iter(rows)
+        while True:
+            block = list(itertools.islice(rows, self.block_size))
+            if not block:
+                break
+
+            yield self.encode_many(block)
+
+        yield PGCOPY_TRAILER
+
+
+
+def encode_binary_rows(rows, fields, connection):
+    """
+    Lazily encodes rows into a binary COPY stream, including the header and trailer
+
+    Values are written in each type's binary representation, so the server doesn't parse text
+    and values containing tabs, newlines or backslashes round-trip unchanged
+
+    :param collections.Iterable rows: model instances, or tuples of values ordered like fields
+    :param list fields: model fields being copied
+    :param connection: database connection the data is copied into
+    :return: generator of bytes
+    """
+    return get_row_encoder(fields, 'binary', connection).encode_rows(rows)
@@ -1,5 +1,8 @@
 from django.db import models
-from django.db.models import Case, Value, When
+from django.db.models import sql
+from django.db.models import Case, Q, Value, When
+from django.db.models.query import FlatValuesListIterable, ModelIterable, NamedValuesListIterable, ValuesIterable
+from django.core.exceptions import EmptyResultSet
 from .signals import (
     pre_update_fields,
     post_update_fields,
@@ -9,73 +12,236 @@ from .signals import (
     post_bulk_create,
     pre_copy_from_instances,
     post_copy_from_instances,
+    pre_bulk_delete,
+    post_bulk_delete,
+    pre_update_m2m_fields,
+    post_update_m2m_fields,
 )
-from .ce import ConcurrentExecutor
+from .ce import BoundedSubmitter, ConcurrentExecutor, ConnectionThreadPool, gather_bounded
+from .helpers import UpdateSnapshot, get_chunks, get_pk_filter, iter_chunks
+from .stats import NULL_CHUNK, count_rows
+from .batching import AdaptiveBatchSize, get_max_batch_size
+import asyncio
+import io
+import time
 import uuid
 from django.conf import settings
 from functools import partial
-from django.db import connections
-from io import StringIO
-import collections
-from collections import defaultdict
+from django.db import connections, transaction
+import collections.abc
+from collections import Counter, defaultdict
 
 
 class BulkModelQuerySet(models.QuerySet):
 
+    # OperationStats of the last bulk operation run on this queryset, if stats were collected; see with_stats()
+    stats = None
+
+    _collect_stats = False
+    _stats_callback = None
+
+    # stats of the operation in progress; chunks are recorded to it
+    _active_stats = None
+
+    # picks the insert batch sizes of a bulk_create run with batch_size='auto'
+    _batch_sizer = None
+
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._collect_stats = self._collect_stats
+        clone._stats_callback = self._stats_callback
+        return clone
+
+
+    def with_stats(self, callback=None):
+        """
+        Returns a copy of the queryset whose bulk operations collect stats: rows and bytes written per chunk,
+        per-chunk latency, time spent building statements versus executing them and worker utilization
+
+        The OperationStats of the last operation is set as the queryset's stats attribute. Stats are collected
+        for every operation, without calling with_stats(), while a StatsHook is registered
+
+        :param callback: called with the OperationStats of each operation once it has finished
+        :return:
+        """
+        clone = self._clone()
+        clone._collect_stats = True
+        clone._stats_callback = callback
+        return clone
+
+
+    def _begin_stats(self, operation, batch_size=None):
+        """
+        Starts collecting the stats of an operation, if they're requested or a hook is registered
+
+        :param str operation:
+        :param batch_size:
+        :return: OperationStats, or None
+        """
+        from .stats import OperationStats, get_hooks
+
+        hooks = get_hooks()
+        if not self._collect_stats and not hooks:
+            self._active_stats = None
+            return None
+
+        self.stats = self._active_stats = OperationStats(
+            operation, self.model, batch_size, callback=self._stats_callback, hooks=hooks
+        )
+        return self.stats
+
+
+    def _finish_stats(self, stats, rows=None):
+        if stats is None:
+            return
+
+        if self._active_stats is stats:
+            self._active_stats = None
+
+        stats.finish(rows)
+
+
+    def _chunk_stats(self, rows=0, bytes=0):
+        """
+        Returns a context manager recording a chunk of the operation in progress; measurements
+        are discarded when no stats are being collected
+
+        :return:
+        """
+        if self._active_stats is None:
+            return NULL_CHUNK
+
+        return self._active_stats.chunk(rows, bytes)
+
+
     def _get_n_concurrent_workers(self, n, default=30):
+        """
+        Returns the size of the worker pool for a concurrent write: n if given, capped by the
+        MAX_CONCURRENT_BATCH_WRITES setting
+
+        :param int n: requested number of workers
+        :param int default: used when neither n nor the setting is given
+        :return:
+        """
+        _max = getattr(settings, 'MAX_CONCURRENT_BATCH_WRITES', None)
+
         if not n:
-            return 0
+            return int(_max or default)
 
-        _max = getattr(settings, 'MAX_CONCURRENT_BATCH_WRITES', default)
+        if _max:
+            return min(int(_max), int(n))
 
-        if _max and n:
-            return max(int(_max), int(n))
+        return int(n)
 
-        return n
+
+    def _get_concurrent_chunks(self, objs, batch_size, n_workers):
+        """
+        Splits objs for a write on a pool of n_workers: into chunks of batch_size, or evenly across the
+        workers when batch_size is None, so a single chunk doesn't leave the other workers idle
+
+        :param list objs:
+        :param int batch_size:
+        :param int n_workers:
+        :return: list of chunks
+        """
+        return get_chunks(objs, batch_size, max_chunks=n_workers if batch_size is None else None)
+
+
+    def _get_concurrent_batch_size(self, batch_size, n_workers):
+        """
+        Returns the chunk size of a write on a pool of n_workers that chunks the queryset itself: batch_size,
+        or when it's None, the size that splits the queryset's rows evenly across the workers
+
+        :param int batch_size:
+        :param int n_workers:
+        :return:
+        """
+        if batch_size is not None or n_workers <= 1:
+            return batch_size
+
+        return max(1, -(-self.order_by().count() // n_workers))
 
 
     def _get_concurrent(self, flag, default=False):
         return flag or getattr(settings, 'ALWAYS_USE_CONCURRENT_BATCH_WRITES', default)
 
 
+    @staticmethod
+    def _is_auto_batch_size(batch_size):
+        if isinstance(batch_size, str):
+            if batch_size != 'auto':
+                raise ValueError("batch_size must be a positive int, None or 'auto'. Received {}".format(batch_size))
+            return True
+
+        return False
+
+
+    def _get_batch_sizer(self, operation, upper_bound=None):
+        """
+        Returns the AdaptiveBatchSize picking chunk sizes for an operation run with batch_size='auto'
+
+        Chunks are capped by the AUTO_BATCH_MAX_SIZE setting and upper_bound
+
+        :param str operation:
+        :param int upper_bound: most rows the backend's limits allow per chunk, if they apply
+        :return: AdaptiveBatchSize
+        """
+        limit = int(getattr(settings, 'AUTO_BATCH_MAX_SIZE', 100000))
+        if upper_bound:
+            limit = min(limit, upper_bound)
+
+        # sizes are learned separately for each database, model, operation and bound (which depends on
+        # the number of fields written)
+        key = (self.db, self.model._meta.label, operation, upper_bound)
+        return AdaptiveBatchSize(key, limit)
+
+
     def _update_chunk(self, chunk, **kwargs):
-        pks = [i.pk for i in chunk]
-        return self.filter(id__in = pks).update(_use_super=True, **kwargs)
+        with self._chunk_stats() as chunk_stats:
+            with chunk_stats.timing('execute'):
+                n = models.QuerySet.update(chunk, **kwargs)
+
+            chunk_stats.rows = n
+
+        return n
 
 
     def populate_queryset_values(self, objects, *fieldnames):
         """
         Sets values on objects in the existing queryset from a given set of objects and optional set of fieldnames
 
+        objects can be model instances or other objects with attributes, mappings, (pk, value, ...) tuples ordered
+        like fieldnames, or a mapping of columns (lists or NumPy arrays) that includes the primary keys; see
+        UpdateSnapshot.from_rows. Rows are merged by primary key and only concrete fields are set
+
         :param collections.Iterable objects: a list of objects with data to use as a source for updates to apply within the queryset
         :param List[str] fieldnames: a list of field names to apply updates to. If blank all fields will be updated
         :return:
         """
-        if not isinstance(objects, collections.Iterable):
+        if not isinstance(objects, collections.abc.Iterable):
             raise TypeError('Must provide an iterable collection of objects')
 
-        if not fieldnames:
-            fieldnames = [i.name for i in self.model._meta.get_fields()]
-
-        object_by_id = {
-            getattr(obj, 'id') or getattr(obj, 'pk'): obj for obj in objects if getattr(obj, 'id') or getattr(obj, 'pk')
-        }
+        snapshot = self._get_rows_snapshot(objects, fieldnames)
+        attnames = [f.attname for f in snapshot.fields]
 
         for instance in self:
-            obj = object_by_id.get(instance.pk)
-            if not obj:
-                # no object found; cannot populate values for this instance
+            i = snapshot.index.get(instance.pk)
+            if i is None:
+                # no row found; cannot populate values for this instance
                 continue
 
-            for fieldname in fieldnames:
-                if not hasattr(obj, fieldname):
-                    raise AttributeError(f'Attribute {fieldname} does not exist on provided object: {obj}')
-
-                setattr(instance, fieldname, getattr(obj, fieldname, None))
+            for attname, column in zip(attnames, snapshot.columns):
+                setattr(instance, attname, column[i])
 
         return self
 
 
+    def _get_rows_snapshot(self, objects, fieldnames):
+        fields = self._get_update_fields(fieldnames) if fieldnames else None
+        return UpdateSnapshot.from_rows(self.model, objects, fields)
+
+
 
     def update(self, batch_size=None, concurrent=False, max_concurrent_workers=None,
                send_signals=True, _use_super=False, return_queryset=False, **kwargs):
@@ -93,61 +259,192 @@ class BulkModelQuerySet(models.QuerySet):
         if _use_super:
             return super().update(**kwargs)
 
+        stats = self._begin_stats('update', batch_size)
+
         if send_signals:
-            pre_update.send(sender=self.model, instances = self)
+            pre_update.send_lazy(
+                self.model,
+                payload=lambda: dict(instances = self),
+                lightweight_payload=lambda: dict(queryset = self.all(), batch_size = batch_size),
+            )
 
         n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
         concurrent = self._get_concurrent(concurrent)
 
-        chunks = self.get_chunks(batch_size, n_concurrent_writers)
+        # an update binds the same parameters however many rows it matches, so only latency bounds the size
+        sizer = self._get_batch_sizer('update') if self._is_auto_batch_size(batch_size) else None
+        if concurrent and sizer is None:
+            chunks = self._get_update_chunk_querysets(
+                self._get_concurrent_batch_size(batch_size, n_concurrent_writers)
+            )
+        else:
+            chunks = self._get_update_chunk_querysets(sizer or batch_size)
 
         n = 0
+        bounds = []
 
         if concurrent:
             # question: how do you pass arguments in this function?
-            jobs = [partial(BulkModelQuerySet._update_chunk, self, chunk, **kwargs) for chunk in chunks if chunk]
-            executor = ConcurrentExecutor(jobs)
+            jobs = []
+            for chunk_bounds, chunk in chunks:
+                bounds.append(chunk_bounds)
+                jobs.append(partial(BulkModelQuerySet._update_chunk, self, chunk, **kwargs))
+
+            executor = ConcurrentExecutor(jobs, max_workers=n_concurrent_writers, stats=stats)
             results = executor.run_async()
             n = sum(results)
 
-        else:
-            for chunk in chunks:
-                if not chunk:
-                    # skip empty chunks (only happens in the case of an empty queryset)
-                    continue
+        elif sizer is not None:
+            for chunk_bounds, chunk in chunks:
+                bounds.append(chunk_bounds)
+                start = time.perf_counter()
+                updated = self._update_chunk(chunk, **kwargs)
+                sizer.record(updated, time.perf_counter() - start)
+                n += updated
 
+        else:
+            for chunk_bounds, chunk in chunks:
+                bounds.append(chunk_bounds)
                 n += self._update_chunk(chunk, **kwargs)
 
+        self._finish_stats(stats, n)
+
         if send_signals:
-            post_update.send(sender = self.model, instances = self)
+            post_update.send_lazy(
+                self.model,
+                payload=lambda: dict(instances = self),
+                lightweight_payload=lambda: dict(n = n, chunks = bounds, batch_size = batch_size),
+            )
 
         if return_queryset:
-            _ids = []
-            for obj in self:
-                _id = getattr(obj, 'id') or getattr(obj, 'pk')
-                if _id:
-                    _ids.append(_id)
-
+            _ids = list(self.values_list('pk', flat=True))
             return self.filter(id__in = _ids)
 
         return n
 
 
-    def _cased_update_chunk(self, chunk, fieldnames):
-        pks = [i.pk for i in chunk]
-        cases = self._get_case_conditions(pks, fieldnames)
+    def _get_update_engine(self, strategy=None):
+        """
+        Resolves the engine used for heterogeneous updates
+
+        :param str strategy: 'values' to require an UPDATE ... FROM (VALUES ...) engine, 'case' to force CASE / WHEN,
+            'staging' to COPY values into a staging table (PostgreSQL), or None to pick the values engine when the
+            backend supports it
+        :return: an engine, or None when CASE / WHEN should be used
+        """
+        from .engines import StagingUpdateEngine, get_staging_engine, get_update_engine
+
+        if strategy not in (None, 'values', 'case', 'staging'):
+            raise ValueError('Unknown update strategy: {}'.format(strategy))
+
+        if strategy == 'case':
+            return None
+
+        if strategy == 'staging':
+            return get_staging_engine(StagingUpdateEngine, self.model, connections[self.db])
+
+        engine = get_update_engine(self.model, connections[self.db])
+        if engine is None and strategy == 'values':
+            raise ValueError(
+                'No values update engine available for database vendor {}'.format(connections[self.db].vendor)
+            )
+
+        return engine
+
+
+    def _get_update_fields(self, fieldnames):
+        """
+        Resolves field names to the concrete fields written by a heterogeneous update; the primary key is never written
+
+        :param list[str] fieldnames:
+        :return:
+        """
+        fields = [self.model._meta.get_field(fieldname) for fieldname in fieldnames]
+        return [f for f in fields if not f.primary_key]
+
+
+    def _get_update_snapshots(self, fields, track_changes=False):
+        """
+        Reads the values to write from the queryset in a single pass
+
+        Without change tracking this is one snapshot of every field for every row. With change tracking
+        rows are grouped by the set of fields that changed, and rows without changes are left out
+
+        :param list fields:
+        :param bool track_changes:
+        :return: list of snapshots
+        :rtype: list[UpdateSnapshot]
+        """
+        if not track_changes:
+            return [UpdateSnapshot.from_instances(self, fields)]
+
+        groups = {}
+        for instance in self:
+            changed = tuple(instance.bm_changed_fields(fields))
+            if not changed:
+                continue
+
+            snapshot = groups.get(changed)
+            if snapshot is None:
+                snapshot = groups[changed] = UpdateSnapshot(changed)
+
+            snapshot.add(instance.pk, [getattr(instance, f.attname) for f in changed])
+
+        return list(groups.values())
+
+
+    def _update_fields_chunk(self, snapshot, strategy=None):
+        with self._chunk_stats() as chunk_stats:
+            engine = self._get_update_engine(strategy)
+
+            if engine is None:
+                n = self._cased_update_chunk(snapshot, chunk_stats)
+            else:
+                engine.stats = chunk_stats
+                n = engine.execute(snapshot.fields, snapshot.pks, snapshot.columns)
+
+            chunk_stats.rows = n
+
+        return n
+
+
+    def _cased_update_chunk(self, snapshot, chunk_stats=NULL_CHUNK):
+        with chunk_stats.timing('build'):
+            cases = self._get_case_conditions(snapshot)
+            empty_array = self._get_empty_array_value_records(snapshot)
 
         n_empty_array = 0
 
-        empty_array = self._get_empty_array_value_records(pks, fieldnames)
-        for fieldname, _ids in empty_array.items():
-            n_empty_array = self.filter(id__in = _ids).update(**{fieldname: []})
+        with chunk_stats.timing('execute'):
+            for attname, _ids in empty_array.items():
+                n_empty_array = self.filter(pk__in = _ids).update(_use_super=True, **{attname: []})
+
+            n_updated = self.filter(pk__in = snapshot.pks).update(_use_super=True, **cases)
 
-        n_updated = self.filter(id__in = pks).update(**cases)
         return max(n_updated, n_empty_array)
 
 
-    def update_m2m_fields(self, fieldname, mapping):
+    def _get_m2m_pairs(self, through, key_field, value_field, keys, batch_size=None):
+        """
+        Reads the through-rows of the given keys
+
+        :return: dictionary of key to a dictionary of value to the through-row's primary key
+        """
+        manager = through._base_manager.db_manager(self.db)
+        pairs = defaultdict(dict)
+
+        for chunk in get_chunks(keys, batch_size):
+            rows = manager.filter(**{key_field.attname + '__in': chunk}).values_list(
+                'pk', key_field.attname, value_field.attname
+            )
+
+            for pk, key, value in rows.iterator():
+                pairs[key][value] = pk
+
+        return pairs
+
+
+    def update_m2m_fields(self, fieldname, mapping, batch_size=None, use_copy=False, send_signal=True):
         """
         Updates m2m relationship across several model instances.
 
@@ -155,9 +452,16 @@ class BulkModelQuerySet(models.QuerySet):
         Mapping is a a dictionary keyed on PKs of the relationship's owning model,
             valued on a list of PKs of the other model (i.e., the target of the m2m relationship)
 
+        Existing relationships of the keys are read once and compared with the mapping: only pairs that
+        are no longer in the mapping are deleted, and only pairs that are new are inserted. Keys missing
+        from the mapping are left as they are
+
         :param str fieldname:
         :param dict[int, list[int]] mapping:
-        :return:
+        :param int batch_size: max number of keys read, rows deleted or rows inserted per statement
+        :param bool use_copy: insert new pairs with COPY FROM, if supported by the database being used
+        :param bool send_signal: send pre_update_m2m_fields and post_update_m2m_fields
+        :return: tuple of the number of pairs added and the number of pairs removed
         """
         _typemsg = "Mapping must be a dictionary, with keys valued on the primary keys of instances in the queryset, " \
                    "valued on a list of primary keys of instances in the related object queryset"
@@ -172,125 +476,256 @@ class BulkModelQuerySet(models.QuerySet):
         if not isinstance(field, models.ManyToManyField):
             raise TypeError('Field must be a many-to-many type')
 
-        field_instance = getattr(self.model, fieldname, None)
-        if not field_instance:
-            raise ValueError('Field not found')
+        ThroughModel = field.remote_field.through
+
+        # align which through model field holds the mapping's keys and which holds its values;
+        # both point at the same model for self-referential relationships
+        key_field = ThroughModel._meta.get_field(field.m2m_field_name())
+        value_field = ThroughModel._meta.get_field(field.m2m_reverse_field_name())
+
+        to_key = key_field.target_field.to_python
+        to_value = value_field.target_field.to_python
+
+        wanted = {to_key(key): {to_value(value) for value in values} for key, values in mapping.items()}
+        existing = self._get_m2m_pairs(ThroughModel, key_field, value_field, list(wanted), batch_size)
+
+        added = {}
+        removed = {}
+        removed_pks = []
+
+        for key, values in wanted.items():
+            current = existing.get(key, {})
 
-        ThroughModel = field_instance.through
-        through_model_fields = ThroughModel._meta.get_fields()
+            new = [value for value in values if value not in current]
+            if new:
+                added[key] = new
 
-        # align which field goes with which through model field
+            gone = [value for value in current if value not in values]
+            if gone:
+                removed[key] = gone
+                removed_pks.extend(current[value] for value in gone)
 
-        mapping_key_fieldname = ''
-        mapping_value_fieldname = ''
+        if send_signal:
+            pre_update_m2m_fields.send(
+                sender=self.model, field_name=fieldname, through=ThroughModel, added=added, removed=removed
+            )
 
-        for f in through_model_fields:
-            if isinstance(f, models.ForeignKey) and f.target_field.model == self.model:
-                mapping_key_fieldname = f.attname
+        rows = [(key, value) for key, values in added.items() for value in values]
 
-            elif isinstance(f, models.ForeignKey):
-                mapping_value_fieldname = f.attname
+        with transaction.atomic(using=self.db, savepoint=False):
+            manager = ThroughModel._base_manager.db_manager(self.db)
 
+            if removed_pks:
+                for chunk in get_chunks(sorted(removed_pks), batch_size):
+                    manager.filter(get_pk_filter('pk', chunk))._raw_delete(self.db)
 
-        # delete existing m2m relationships for the provided keys
-        key_ids = [i for i in mapping.keys()]
-        ThroughModel.objects.filter(**{
-            mapping_key_fieldname + '__in': key_ids
-        }).delete()
+            if rows and use_copy:
+                BulkModelQuerySet(model=ThroughModel, using=self.db).copy_from_objects(
+                    rows, fieldnames=[key_field.name, value_field.name], batch_size=batch_size, signal=False
+                )
 
-        ls = []
-        for key, values in mapping.items():
-            for value in values:
-                ls.append(ThroughModel(**{
-                    mapping_key_fieldname: key,
-                    mapping_value_fieldname: value
-                }))
+            elif rows:
+                manager.bulk_create([
+                    ThroughModel(**{key_field.attname: key, value_field.attname: value}) for key, value in rows
+                ], batch_size=batch_size)
+
+        if send_signal:
+            post_update_m2m_fields.send(
+                sender=self.model, field_name=fieldname, through=ThroughModel, added=added, removed=removed
+            )
 
-        ThroughModel.objects.bulk_create(ls)
+        return len(rows), len(removed_pks)
 
 
 
     def update_fields(self, *fieldnames, objects=None, batch_size=None, send_signal=True,
-                      concurrent=False, max_concurrent_workers=None, return_queryset=False):
+                      concurrent=False, max_concurrent_workers=None, return_queryset=False,
+                      strategy=None):
         """
         Performs a hetergeneous update
 
+        Where the backend supports it (PostgreSQL, SQLite 3.33+, MySQL) each batch is written with a single
+        UPDATE joined against a derived table of new values; otherwise a CASE / WHEN update is used.
+        On PostgreSQL, strategy='staging' copies each batch into a temporary table and applies it with
+        one UPDATE ... FROM, which suits very large updates (leave batch_size unset for a single statement)
+
         :param fieldnames:
-        :param objects:
+        :param objects: new values, as objects, mappings, (pk, value, ...) tuples or a mapping of columns (see
+            populate_queryset_values); rows are merged by primary key with the queryset without building instances
         :param batch_size:
         :param send_signal:
         :param concurrent:
         :param max_concurrent_workers:
         :param return_queryset:
+        :param str strategy: 'values', 'case', 'staging' or None (the default) to choose automatically
         :return:
         """
-        if not fieldnames:
-            fieldnames = [
-                i.name for i in self.model._meta.fields
+        auto = self._is_auto_batch_size(batch_size)
+        stats = self._begin_stats('update_fields', batch_size)
+
+        fieldnames, fields, snapshots, track_changes = self._begin_update_fields(
+            fieldnames, objects, batch_size, send_signal
+        )
+
+        sizer = self._get_update_fields_sizer(snapshots, strategy) if auto else None
+        n = 0
+
+        if self._get_concurrent(concurrent):
+            n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
+            jobs = [
+                (BulkModelQuerySet._update_fields_chunk, self, chunk, strategy,)
+                for chunk in self._get_update_chunks(
+                    snapshots, sizer.size if auto else batch_size, max_chunks=n_concurrent_writers
+                )
             ]
+            executor = ConcurrentExecutor(jobs, max_workers=n_concurrent_writers, stats=stats)
+            results = executor.run_async()
+            n = sum(results)
+
+        elif auto:
+            for snapshot in snapshots:
+                for chunk in sizer.split(snapshot):
+                    n += self._update_fields_chunk(chunk, strategy)
+
+        else:
+            for chunk in self._get_update_chunks(snapshots, batch_size):
+                result = self._update_fields_chunk(chunk, strategy)
+                n += result
+
+        self._finish_stats(stats, n)
+
+        return self._end_update_fields(
+            fieldnames, fields, snapshots, track_changes, n, batch_size, send_signal, return_queryset
+        )
+
 
+    def _begin_update_fields(self, fieldnames, objects, batch_size, send_signal):
+        """
+        Resolves the fields to write, sends pre_update_fields and reads the values to write, from objects
+        when they're given
+
+        :return: tuple of (fieldnames, fields, snapshots, track_changes)
+        """
         if objects is not None:
-            if not isinstance(objects, collections.Iterable):
+            if not isinstance(objects, collections.abc.Iterable):
                 raise TypeError('objects must be iterable')
 
-            self.populate_queryset_values(objects, *fieldnames)
+            return self._begin_update_fields_from_rows(fieldnames, objects, batch_size, send_signal)
+
+        # with change tracking enabled, an update without field names only writes what changed
+        track_changes = not fieldnames and getattr(self.model, 'bm_track_changes', False)
 
-        concurrent_write = self._get_concurrent(concurrent)
+        if not fieldnames:
+            fieldnames = [
+                i.name for i in self.model._meta.fields
+            ]
 
         if send_signal:
-            pre_update_fields.send(
+            # the queryset is read right after, so listing its keys here doesn't add a query
+            pre_update_fields.send_lazy(
                 self.model,
-                instances = self,
-                field_names = fieldnames,
-                batch_size = batch_size
+                payload=lambda: dict(instances = self, field_names = fieldnames, batch_size = batch_size),
+                lightweight_payload=lambda: dict(
+                    pks = [instance.pk for instance in self], field_names = fieldnames, batch_size = batch_size
+                ),
             )
 
         # TODO: ensure connected each time an update happens within the loop
         self.model.objects.ensure_connected()
 
-        n = 0
+        # read the values to write once; chunks are slices of these snapshots
+        fields = self._get_update_fields(fieldnames)
+        snapshots = self._get_update_snapshots(fields, track_changes)
 
-        if concurrent_write:
-            n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
-            chunks = self.get_chunks(batch_size, n_concurrent_writers)
+        return fieldnames, fields, snapshots, track_changes
 
-            jobs = [(BulkModelQuerySet._cased_update_chunk, self, chunk, fieldnames,) for chunk in chunks if chunk]
-            executor = ConcurrentExecutor(jobs)
-            results = executor.run_async()
-            n = sum(results)
 
+    def _begin_update_fields_from_rows(self, fieldnames, objects, batch_size, send_signal):
+        """
+        Reads the values to write from objects, merged by primary key with the queryset's keys instead of
+        being set on its instances, so no model instances are built
+
+        :return: tuple of (fieldnames, fields, snapshots, track_changes)
+        """
+        snapshot = self._get_rows_snapshot(objects, fieldnames)
+
+        self.model.objects.ensure_connected()
+
+        # rows outside the queryset are dropped; without filters every row is kept, and rows
+        # whose keys don't exist simply match nothing
+        if self.query.where or not self.query.can_filter():
+            snapshot = snapshot.restrict(set(self.values_list('pk', flat=True)))
+
+        fields = snapshot.fields
+        fieldnames = [f.name for f in fields]
+
+        if send_signal:
+            pre_update_fields.send_lazy(
+                self.model,
+                payload=lambda: dict(instances = self, field_names = fieldnames, batch_size = batch_size),
+                lightweight_payload=lambda: dict(pks = snapshot.pks, field_names = fieldnames, batch_size = batch_size),
+            )
+
+        return fieldnames, fields, [snapshot], False
+
+
+    def _get_update_fields_sizer(self, snapshots, strategy=None):
+        """
+        Returns the AdaptiveBatchSize for an update_fields run with batch_size='auto', bounded by the
+        parameters each row binds with the engine that writes it
+
+        :param list[UpdateSnapshot] snapshots:
+        :param str strategy:
+        :return: AdaptiveBatchSize
+        """
+        from .engines import StagingEngine
+
+        engine = self._get_update_engine(strategy)
+        n_fields = max([len(snapshot.fields) for snapshot in snapshots] or [0])
+
+        if engine is None:
+            # CASE / WHEN binds a key and a value per field, and the key again to filter the rows
+            upper_bound = get_max_batch_size(connections[self.db], 2 * n_fields + 1)
+        elif isinstance(engine, StagingEngine):
+            # rows are copied, not bound
+            upper_bound = None
         else:
-            chunks = self.get_chunks(batch_size)
+            upper_bound = engine.get_batch_size(n_fields + 1)
 
-            for chunk in chunks:
-                if not chunk:
-                    # skip empty chunks (only happens in the case of an empty queryset)
-                    continue
+        return self._get_batch_sizer('update_fields', upper_bound)
 
-                result = self._cased_update_chunk(chunk, fieldnames)
-                n += result
 
+    def _get_update_chunks(self, snapshots, batch_size, max_chunks=None):
+        # without a batch_size, each snapshot is split into max_chunks chunks if given (one per concurrent writer)
+        max_chunks = max_chunks if batch_size is None else None
 
-        if return_queryset:
-            _ids = []
-            for obj in self:
-                _id = getattr(obj, 'id') or getattr(obj, 'pk')
-                if _id is not None:
-                    _ids.append(_id)
+        # empty chunks only happen in the case of an empty queryset
+        return [chunk for snapshot in snapshots for chunk in snapshot.get_chunks(batch_size, max_chunks) if chunk]
 
-            qs = self.filter(id__in = _ids)
+
+    def _end_update_fields(self, fieldnames, fields, snapshots, track_changes, n, batch_size, send_signal,
+                           return_queryset):
+        if track_changes:
+            for instance in self:
+                instance.bm_mark_clean(fields)
+
+
+        if return_queryset:
+            qs = self.filter(pk__in = [pk for snapshot in snapshots for pk in snapshot.pks])
         else:
             qs = self.none()
 
 
         if send_signal:
-            post_update_fields.send(
+            post_update_fields.send_lazy(
                 self.model,
-                instances = self,
-                queryset = qs,
-                field_names = fieldnames,
-                batch_size = batch_size,
-                n = n
+                payload=lambda: dict(
+                    instances = self, queryset = qs, field_names = fieldnames, batch_size = batch_size, n = n
+                ),
+                lightweight_payload=lambda: dict(
+                    pks = [pk for snapshot in snapshots for pk in snapshot.pks],
+                    field_names = fieldnames, batch_size = batch_size, n = n
+                ),
             )
 
         if return_queryset:
@@ -305,31 +740,123 @@ class BulkModelQuerySet(models.QuerySet):
         Splits the queryset results into chunks
 
         WARNING this method is destructive: it returns a list of lists,
-        not a queryset. The queryset object will be lost
+        not a queryset. The queryset object will be lost. See iter_keyset_chunks
+        and iter_pk_chunks to chunk a queryset without loading its rows
 
         :param chunk_size:
         :param max_chunks:
         :return:
         """
-        from .helpers import get_chunks as chunker
-        return chunker(self, chunk_size, max_chunks=max_chunks)
+        return get_chunks(self, chunk_size, max_chunks=max_chunks)
 
 
+    def iter_pk_ranges(self, chunk_size):
+        """
+        Walks the queryset in primary key order (keyset pagination) and yields the bounds of consecutive chunks
+        of at most chunk_size rows
 
-    def _get_field_when_conditions(self, field, id_list):
-        fieldname = field.attname
-        conditions = []
+        Only the key closing each chunk is read, with one indexed query per chunk, so no rows are loaded.
+        Bounds are (lower, upper): lower is exclusive and None for the first chunk, upper is inclusive and
+        None for the last chunk
 
-        check_empty_object = type(field).__name__ == 'ArrayField'
+        :param int|AdaptiveBatchSize chunk_size: an AdaptiveBatchSize is read again for each chunk
+        :return: generator of tuples
+        """
+        sizer = chunk_size if isinstance(chunk_size, AdaptiveBatchSize) else None
 
-        for record in self:
-            if record.pk is None:
-                raise RuntimeError('Attempting to update an unsaved db record')
+        if sizer is None and (chunk_size is None or chunk_size <= 0):
+            raise ValueError('iter_pk_ranges: chunk_size must be a positive value. Received {}'.format(chunk_size))
 
-            if record.pk not in id_list:
-                continue
+        pks = self.order_by('pk').values_list('pk', flat=True)
+        lower = None
+
+        while True:
+            if sizer is not None:
+                chunk_size = sizer.size
+
+            remaining = pks if lower is None else pks.filter(pk__gt=lower)
+            upper = list(remaining[chunk_size - 1:chunk_size])
+
+            if not upper:
+                if remaining.exists():
+                    yield lower, None
+                return
+
+            yield lower, upper[0]
+            lower = upper[0]
+
+
+    def iter_keyset_chunks(self, chunk_size):
+        """
+        Splits the queryset into querysets of at most chunk_size rows each, without evaluating it
+
+        Each chunk is this queryset narrowed to a range of primary keys (see iter_pk_ranges), so it
+        keeps the queryset's filters and can be updated or deleted directly
+
+        :param int chunk_size:
+        :return: generator of querysets
+        """
+        for lower, upper in self.iter_pk_ranges(chunk_size):
+            yield self._filter_pk_range(lower, upper)
+
+
+    def _filter_pk_range(self, lower, upper):
+        chunk = self.order_by()
+
+        if lower is not None:
+            chunk = chunk.filter(pk__gt=lower)
+
+        if upper is not None:
+            chunk = chunk.filter(pk__lte=upper)
+
+        return chunk
+
+
+    def iter_pk_chunks(self, chunk_size):
+        """
+        Reads the queryset's primary keys with a server-side cursor (where the database supports it) and yields
+        them in lists of at most chunk_size keys
+
+        Unlike iter_keyset_chunks this works on sliced querysets, and keeps the queryset's ordering
 
-            val = getattr(record, fieldname)
+        :param int chunk_size:
+        :return: generator of lists
+        """
+        pks = self.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+
+        for chunk in iter_chunks(pks, chunk_size):
+            yield list(chunk)
+
+
+    def _get_update_chunk_querysets(self, chunk_size):
+        """
+        Returns the querysets a homogeneous update writes, one per chunk
+
+        :param int|AdaptiveBatchSize chunk_size: max rows per chunk; None for a single chunk
+        :return: iterable of (bounds, queryset) tuples; bounds are the (lower, upper) primary keys of
+            a keyset chunk (see iter_pk_ranges), or None
+        """
+        if self.query.can_filter():
+            if chunk_size is None:
+                return [(None, self.order_by())]
+
+            return ((bounds, self._filter_pk_range(*bounds)) for bounds in self.iter_pk_ranges(chunk_size))
+
+        # a sliced queryset can't be narrowed to a range; its keys are read first
+        if isinstance(chunk_size, AdaptiveBatchSize):
+            chunk_size = chunk_size.size
+
+        manager = self.model._base_manager.db_manager(self.db)
+        return [(None, manager.filter(pk__in=pks)) for pks in self.iter_pk_chunks(chunk_size or 2000)]
+
+
+
+    def _get_field_when_conditions(self, field, pks, values):
+        conditions = []
+
+        check_empty_object = type(field).__name__ == 'ArrayField'
+
+        for pk, val in zip(pks, values):
             if val is None:
                 continue
 
@@ -337,39 +864,31 @@ class BulkModelQuerySet(models.QuerySet):
                 continue
 
             conditions.append(When(
-                id = record.pk,
+                pk = pk,
                 then = Value(val)
             ))
 
         return conditions
 
 
-    def _get_empty_array_value_records(self, id_list, fieldnames):
-        # keyed on the name of the field, valued on a set of ids for which to update to an empty list
+    def _get_empty_array_value_records(self, snapshot):
+        # keyed on the attname of the field, valued on a set of ids for which to update to an empty list
         empty = defaultdict(set)
 
-        for fieldname in fieldnames:
-            field = self.model._meta.get_field(fieldname)
-
+        for field, values in zip(snapshot.fields, snapshot.columns):
             if type(field).__name__ == 'ArrayField':
-                for record in self:
-                    if record.pk not in id_list:
-                        continue
-
-                    value = getattr(record, fieldname)
+                for pk, value in zip(snapshot.pks, values):
                     if isinstance(value, list) and len(value) == 0:
-                        empty[fieldname].add(record.pk)
+                        empty[field.attname].add(pk)
 
         return empty
 
 
 
-    def _get_case_conditions(self, id_list, fieldnames):
+    def _get_case_conditions(self, snapshot):
         cases = {}
 
-        for fieldname in fieldnames:
-            field = self.model._meta.get_field(fieldname)
-
+        for field, values in zip(snapshot.fields, snapshot.columns):
             if type(field).__name__ == 'JSONField':
                 # json fields aren't supported at the moment
                 continue
@@ -378,7 +897,7 @@ class BulkModelQuerySet(models.QuerySet):
             defaultvalue = field.get_default()
 
             # get the when conditions for this field
-            when_conditions = self._get_field_when_conditions(field, id_list)
+            when_conditions = self._get_field_when_conditions(field, snapshot.pks, values)
 
             cases[attname] = Case(*when_conditions, default = Value(defaultvalue))
 
@@ -395,27 +914,205 @@ class BulkModelQuerySet(models.QuerySet):
         :param send_signal:
         :return:
         """
+        objs = list(objs)
+
         if send_signal:
-            pre_bulk_create.send(self.model, instances=objs)
+            pre_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=objs),
+                lightweight_payload=lambda: dict(n=len(objs)),
+            )
 
         result = super().bulk_create(objs, batch_size=batch_size)
 
         if send_signal:
-            post_bulk_create.send(self.model, instances=objs)
+            post_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=objs),
+                lightweight_payload=lambda: dict(n=len(objs), pks=self._get_returned_pks(objs, self._returns_pks())),
+            )
 
         return result
 
 
-    def _attach_bm_create_uuids(self, objs, bm_create_uuid):
-        if bm_create_uuid is None:
-            bm_create_uuid = uuid.uuid4()
-        elif isinstance(bm_create_uuid, str):
-            bm_create_uuid = uuid.UUID(bm_create_uuid)
+    def _can_insert_returning(self):
+        """
+        Returns whether primary keys are read back with INSERT ... RETURNING by _batched_insert,
+        for databases where Django doesn't do it itself (SQLite 3.35+)
 
-        attached = set()
-        for obj in objs:
-            if not getattr(obj, 'bm_create_uuid'):
-                setattr(obj, 'bm_create_uuid', bm_create_uuid)
+        :return: bool
+        """
+        connection = connections[self.db]
+
+        if connection.vendor != 'sqlite':
+            return False
+
+        return connection.Database.sqlite_version_info >= (3, 35)
+
+
+    def _returns_pks(self):
+        """
+        Returns whether inserting objects sets the primary keys the database assigns onto them
+
+        :return: bool
+        """
+        features = connections[self.db].features
+
+        if getattr(features, 'can_return_rows_from_bulk_insert', False):
+            return True
+
+        if getattr(features, 'can_return_ids_from_bulk_insert', False):
+            return True
+
+        return self._can_insert_returning()
+
+
+    def _batched_insert(self, objs, fields, batch_size, ignore_conflicts=False, **kwargs):
+        features = connections[self.db].features
+        native = (
+            getattr(features, 'can_return_rows_from_bulk_insert', False) or
+            getattr(features, 'can_return_ids_from_bulk_insert', False)
+        )
+
+        # rows skipped on conflict aren't returned, so keys couldn't be matched to objects
+        if native or ignore_conflicts or kwargs.get('on_conflict') or not self._can_insert_returning():
+            if self._active_stats is None and self._batch_sizer is None:
+                return super()._batched_insert(objs, fields, batch_size, ignore_conflicts=ignore_conflicts, **kwargs)
+
+            # batches are handed to django one at a time, so each is recorded as a chunk
+            returned = []
+
+            for batch in self._iter_insert_batches(objs, fields, batch_size):
+                with self._chunk_stats(len(batch)) as chunk_stats, chunk_stats.timing('execute'):
+                    returned.extend(
+                        super()._batched_insert(batch, fields, len(batch), ignore_conflicts=ignore_conflicts, **kwargs)
+                        or ()
+                    )
+
+            return returned
+
+        pks = self._insert_returning(objs, fields, batch_size)
+
+        if hasattr(features, 'can_return_rows_from_bulk_insert'):
+            # Django 3.0+ reads back rows of returned columns
+            return [(pk,) for pk in pks]
+
+        return pks
+
+
+    def _iter_insert_batches(self, objs, fields, batch_size):
+        """
+        Splits objs into the batches _batched_insert writes: by the current size of the bulk_create's
+        AdaptiveBatchSize when its batch_size is 'auto', otherwise the same way django does
+
+        :param list objs:
+        :param list fields:
+        :param int batch_size:
+        :return: iterable of lists
+        """
+        if self._batch_sizer is not None:
+            return self._batch_sizer.split(objs)
+
+        batch_size = batch_size or max(connections[self.db].ops.bulk_batch_size(fields, objs), 1)
+        return (objs[i:i + batch_size] for i in range(0, len(objs), batch_size))
+
+
+    def _get_max_insert_batch_size(self):
+        """
+        Returns the most rows one INSERT can hold: the backend's bulk batch size, capped by
+        its limit on bound parameters
+
+        :return: int
+        """
+        connection = connections[self.db]
+        fields = self.model._meta.concrete_fields
+
+        upper_bound = get_max_batch_size(connection, len(fields))
+        return max(1, min(upper_bound, connection.ops.bulk_batch_size(fields, range(upper_bound))))
+
+
+    def _insert_returning(self, objs, fields, batch_size):
+        """
+        Inserts objs in batches with INSERT ... RETURNING
+
+        :param list objs:
+        :param list fields:
+        :param int batch_size:
+        :return: list of primary keys, aligned with objs
+        """
+        connection = connections[self.db]
+        opts = self.model._meta
+
+        returning = ' RETURNING %s' % connection.ops.quote_name(opts.pk.column)
+
+        # SQLite doesn't guarantee the order of returned rows, but assigns new rowids in insertion order
+        assigned = opts.auto_field is not None and opts.auto_field not in fields
+
+        pks = []
+        with connection.cursor() as cursor:
+            for batch in self._iter_insert_batches(objs, fields, batch_size):
+                with self._chunk_stats(len(batch)) as chunk_stats:
+                    with chunk_stats.timing('build'):
+                        query = sql.InsertQuery(self.model)
+                        query.insert_values(fields, batch, raw=False)
+                        statements = query.get_compiler(using=self.db).as_sql()
+
+                    for statement, params in statements:
+                        with chunk_stats.timing('execute'):
+                            cursor.execute(statement + returning, params)
+                            returned = [row[0] for row in cursor.fetchall()]
+
+                        pks.extend(sorted(returned) if assigned else returned)
+
+        return pks
+
+
+    @staticmethod
+    def _get_returned_pks(objs, returns_pks):
+        if not returns_pks:
+            return None
+
+        pks = [obj.pk for obj in objs]
+        return None if None in pks else pks
+
+
+    def _get_created_queryset(self, pks, uuids):
+        """
+        Returns a queryset of created records: by primary key when the database returned them,
+        otherwise by bm_create_uuid
+
+        :param list pks: primary keys of the created records, or None if they aren't known
+        :param set uuids: bm_create_uuids the records were stamped with
+        :return:
+        """
+        if pks is not None:
+            pks = sorted(set(pks))
+            return self.filter(get_pk_filter('pk', pks)) if pks else self.none()
+
+        if uuids:
+            return self.filter(bm_create_uuid__in = uuids)
+
+        return self.none()
+
+
+    @staticmethod
+    def _get_bm_create_uuid(bm_create_uuid=None):
+        if bm_create_uuid is None:
+            return uuid.uuid4()
+
+        if isinstance(bm_create_uuid, str):
+            return uuid.UUID(bm_create_uuid)
+
+        return bm_create_uuid
+
+
+    def _attach_bm_create_uuids(self, objs, bm_create_uuid):
+        bm_create_uuid = self._get_bm_create_uuid(bm_create_uuid)
+
+        attached = set()
+        for obj in objs:
+            if not getattr(obj, 'bm_create_uuid'):
+                setattr(obj, 'bm_create_uuid', bm_create_uuid)
             attached.add(getattr(obj, 'bm_create_uuid'))
 
         return attached
@@ -428,8 +1125,12 @@ class BulkModelQuerySet(models.QuerySet):
         """
         A signal-enabled override of django's bulk_create
 
+        Where the database returns primary keys (PostgreSQL, SQLite 3.35+) they are set on objs and
+        the returned queryset selects them by primary key
+
         :param objs:
-        :param UUID bm_create_uuid: a uuid to use as the bm_create_uuid in the model
+        :param UUID bm_create_uuid: a uuid to stamp objects with; by default objects are only stamped when the
+            database can't return primary keys
         :param batch_size:
         :param bool send_signal:
         :param bool concurrent:
@@ -437,36 +1138,66 @@ class BulkModelQuerySet(models.QuerySet):
         :param bool return_queryset: whether to return instances; if false, returns the default from django's method
         :return:
         """
-        is_bulkmodel = hasattr(self.model, 'bm_create_uuid')
-        if is_bulkmodel:
+        objs = list(objs)
+
+        # where the database returns primary keys, objects are only stamped with a uuid that's given
+        returns_pks = self._returns_pks()
+
+        if hasattr(self.model, 'bm_create_uuid') and (bm_create_uuid is not None or not returns_pks):
             uuids = self._attach_bm_create_uuids(objs, bm_create_uuid)
         else:
             uuids = set()
 
         if send_signal:
-            pre_bulk_create.send(sender=self.model, instances=objs)
+            pre_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=objs),
+                lightweight_payload=lambda: dict(n=len(objs)),
+            )
 
         n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
         concurrent = self._get_concurrent(concurrent)
 
+        sizer = None
+        if self._is_auto_batch_size(batch_size):
+            sizer = self._get_batch_sizer('bulk_create', self._get_max_insert_batch_size())
+
+        stats = self._begin_stats('bulk_create', batch_size)
+
         if concurrent:
-            chunks = self.get_chunks(batch_size, n_concurrent_writers)
+            chunks = self._get_concurrent_chunks(
+                objs, sizer.size if sizer is not None else batch_size, n_concurrent_writers
+            )
             f = super().bulk_create
 
             jobs = [(f, chunk,) for chunk in chunks if chunk]
-            executor = ConcurrentExecutor(jobs)
+            executor = ConcurrentExecutor(jobs, max_workers=n_concurrent_writers, stats=stats)
             result = executor.run_async()
 
+        elif sizer is not None:
+            # _batched_insert splits objs by the sizer's current size as it writes them
+            self._batch_sizer = sizer
+            try:
+                result = super().bulk_create(objs, batch_size=sizer.size)
+            finally:
+                self._batch_sizer = None
+
         else:
             result = super().bulk_create(objs, batch_size=batch_size)
 
-        if is_bulkmodel and return_queryset:
-            qs = self.filter(bm_create_uuid__in = uuids)
+        self._finish_stats(stats, len(objs))
+
+        if return_queryset:
+            qs = self._get_created_queryset(self._get_returned_pks(objs, returns_pks), uuids)
         else:
             qs = self.none()
 
         if send_signal:
-            post_bulk_create.send(sender=self.model, instances=objs, queryset=qs)
+            post_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=objs, queryset=qs),
+                lightweight_payload=lambda: dict(n=len(objs), pks=self._get_returned_pks(objs, returns_pks)),
+            )
 
         if return_queryset:
             return qs
@@ -475,49 +1206,641 @@ class BulkModelQuerySet(models.QuerySet):
 
 
 
-    def _copy_from_chunk(self, tablename, fieldnames, chunk):
-        dbconn = connections[self.db]
+    def _insert_columns_returning(self, fields, columns, chunk_stats=NULL_CHUNK):
+        """
+        Inserts rows given as columns with multi-row INSERT ... RETURNING statements (SQLite 3.35+)
+
+        :param list fields:
+        :param list columns: one list of values per field
+        :param chunk_stats:
+        :return: list of primary keys
+        """
+        from .loaders import iter_prepared_rows
+
+        connection = connections[self.db]
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+
+        statement = 'INSERT INTO %s (%s) VALUES ' % (qn(opts.db_table), ', '.join(qn(f.column) for f in fields))
+        placeholder = '(%s)' % ', '.join(['%s'] * len(fields))
+        returning = ' RETURNING %s' % qn(opts.pk.column)
+
+        with chunk_stats.timing('build'):
+            rows = list(iter_prepared_rows(zip(*columns), fields, connection))
+
+        n = get_max_batch_size(connection, len(fields))
+
+        pks = []
+        with connection.cursor() as cursor:
+            for i in range(0, len(rows), n):
+                batch = rows[i:i + n]
+                params = [value for row in batch for value in row]
+
+                with chunk_stats.timing('execute'):
+                    cursor.execute(statement + ', '.join([placeholder] * len(batch)) + returning, params)
+                    pks.extend(row[0] for row in cursor.fetchall())
+
+        return pks
+
+
+    def _create_from_columns_chunk(self, fields, columns, returning=False):
+        """
+        Inserts one batch of rows given as columns
+
+        :param list fields:
+        :param list columns: one list of values per field
+        :param bool returning: whether to read back the primary keys the database assigns
+        :return: list of primary keys if returning, otherwise None
+        """
+        from .engines import StagingInsertEngine, get_staging_engine
+
+        connection = connections[self.db]
+
+        with self._chunk_stats(len(columns[0])) as chunk_stats:
+            if not returning:
+                loader = self._get_loader()
+                loader.stats = chunk_stats
+                chunk_stats.bytes = loader.load_columns(self.model._meta.db_table, fields, columns)
+                return None
+
+            if StagingInsertEngine.is_supported(connection):
+                engine = get_staging_engine(StagingInsertEngine, self.model, connection)
+                engine.stats = chunk_stats
+                return engine.execute(fields, list(zip(*columns)))
+
+            return self._insert_columns_returning(fields, columns, chunk_stats)
+
+
+
+    def bulk_create_from_columns(self, columns, bm_create_uuid=None, batch_size=None, send_signal=True,
+                                 concurrent=False, max_concurrent_workers=None, return_queryset=False):
+        """
+        Inserts rows given as columns, without building model instances
+
+        Column names and types are checked against the model's fields once per column: NumPy arrays and pandas
+        series by dtype, other sequences by converting their first value. Every other concrete field, except
+        an auto-incrementing primary key, is filled with its default (or the current time for auto_now and
+        auto_now_add fields); a field with neither a column nor a default raises ValueError
+
+        Batches are written with the backend's bulk loader (see bulkmodel.loaders) straight from slices of the
+        columns. When return_queryset is set and the database can return primary keys, batches are instead
+        inserted through a staging table (PostgreSQL) or with INSERT ... RETURNING (SQLite 3.35+)
+
+        :param Mapping columns: lists, NumPy arrays or pandas series of equal length, keyed by field name or
+            attname; arrays of datetimes are read as naive UTC, like copy_to_columns() returns them
+        :param UUID bm_create_uuid: a uuid to stamp rows with; by default rows are only stamped when primary
+            keys aren't read back
+        :param batch_size: number of rows per batch, 'auto', or None for a single batch
+        :param bool send_signal: send pre_bulk_create and post_bulk_create, with instances=None
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool return_queryset: whether to return a queryset of the created records
+        :return: the number of rows created, or a queryset of them if return_queryset
+        """
+        from .columnar import get_insert_columns
+
+        fields, values, n = get_insert_columns(self.model, columns)
+        opts = self.model._meta
+
+        returning = return_queryset and opts.auto_field is not None and opts.auto_field not in fields and (
+            self._can_copy_returning(fields) or self._can_insert_returning()
+        )
+
+        uuids = set()
+        if hasattr(self.model, 'bm_create_uuid') and (bm_create_uuid is not None or not returning):
+            bm_create_uuid = self._get_bm_create_uuid(bm_create_uuid)
+
+            # uuids given in a bm_create_uuid column are kept
+            i = fields.index(opts.get_field('bm_create_uuid'))
+            values[i] = [value or bm_create_uuid for value in values[i]]
+            uuids = set(values[i])
+
+        if send_signal:
+            pre_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=None),
+                lightweight_payload=lambda: dict(n=n),
+            )
+
+        n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
+        concurrent = self._get_concurrent(concurrent)
+
+        sizer = self._get_batch_sizer('bulk_create_from_columns') if self._is_auto_batch_size(batch_size) else None
+        if sizer is not None:
+            batch_size = sizer.size
+
+        stats = self._begin_stats('bulk_create_from_columns', batch_size)
+
+        # batches are ranges of rows, sliced out of every column as they're written
+        if concurrent:
+            batches = self._get_concurrent_chunks(range(n), batch_size, n_concurrent_writers)
+        elif sizer is None:
+            batches = get_chunks(range(n), batch_size)
+        else:
+            batches = sizer.split(range(n))
+
+        jobs = (
+            (BulkModelQuerySet._create_from_columns_chunk, self, fields,
+             [column[batch.start:batch.stop] for column in values], returning)
+            for batch in batches if batch
+        )
+
+        if concurrent:
+            results = ConcurrentExecutor(list(jobs), max_workers=n_concurrent_writers, stats=stats).run_async()
+        else:
+            results = [ConcurrentExecutor._run_job(job) for job in jobs]
+
+        self._finish_stats(stats, n)
+
+        pks = [pk for chunk_pks in results for pk in chunk_pks] if returning else None
+
+        if return_queryset:
+            qs = self._get_created_queryset(pks, uuids)
+        else:
+            qs = self.none()
+
+        if send_signal:
+            post_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=None, queryset=qs),
+                lightweight_payload=lambda: dict(n=n, pks=pks),
+            )
+
+        if return_queryset:
+            return qs
+
+        return n
+
+
+
+    def _upsert_chunk(self, chunk, unique_fields, update_fields, strategy=None):
+        from .engines import get_upsert_engine
+
+        engine = get_upsert_engine(self.model, connections[self.db], strategy)
+        fields = self.model._meta.concrete_fields
+        auto_field = self.model._meta.auto_field
+
+        # objects with a primary key keep it; the database assigns one to the others
+        with_pk = [obj for obj in chunk if obj.pk is not None]
+        without_pk = [obj for obj in chunk if obj.pk is None]
+
+        n = 0
+        if with_pk:
+            n += engine.execute(fields, with_pk, unique_fields, update_fields)
+
+        if without_pk:
+            n += engine.execute([f for f in fields if f is not auto_field], without_pk, unique_fields, update_fields)
+
+        return n
+
+
+    def _get_upserted_queryset(self, objs, unique_fields, uuids):
+        """
+        Returns a queryset of upserted records
+
+        :param list objs: objects to find by the values of their unique fields
+        :param list unique_fields:
+        :param set uuids: bm_create_uuids to find records by
+        :return:
+        """
+        condition = Q(bm_create_uuid__in = uuids) if uuids else Q()
+
+        if objs and len(unique_fields) == 1:
+            attname = unique_fields[0].attname
+            condition |= Q(**{attname + '__in': [getattr(obj, attname) for obj in objs]})
+
+        elif objs:
+            for obj in objs:
+                condition |= Q(**{f.attname: getattr(obj, f.attname) for f in unique_fields})
+
+        return self.filter(condition) if condition else self.none()
+
+
+
+    def bulk_upsert(self, objs, unique_fields=None, update_fields=None, bm_create_uuid=None, batch_size=None,
+                    send_signal=True, concurrent=False, max_concurrent_workers=None,
+                    return_queryset=False, strategy=None):
+        """
+        Inserts objects in bulk, updating existing rows that conflict on a unique constraint
+
+        Each batch is written with a single INSERT ... ON CONFLICT DO UPDATE (PostgreSQL, SQLite 3.24+)
+        or INSERT ... ON DUPLICATE KEY UPDATE (MySQL). Fires the pre_bulk_create / post_bulk_create signals
+
+        :param objs:
+        :param List[str] unique_fields: field names of the unique constraint to detect conflicts on; defaults to the primary key.
+            Ignored by MySQL, which detects conflicts on any unique key
+        :param List[str] update_fields: field names to overwrite on conflict; defaults to all fields except the unique ones.
+            Pass an empty list to leave conflicting rows as they are
+        :param UUID bm_create_uuid: a uuid to stamp objects with; objects that already have a bm_create_uuid keep it
+        :param batch_size:
+        :param bool send_signal:
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool return_queryset: whether to return a queryset of inserted and updated records
+        :param str strategy: 'staging' to COPY each batch into a staging table and upsert from it (PostgreSQL),
+            or None (the default) for multi-row INSERT statements
+        :return: number of rows affected as reported by the database, or a queryset if return_queryset is set.
+            PostgreSQL and SQLite count each inserted or updated row once. MySQL counts an inserted row once, an
+            updated row twice and a row that's left unchanged once (Django connects with CLIENT_FOUND_ROWS), so
+            the count there lies between the number of objects and twice that number
+        """
+        objs = list(objs)
+        opts = self.model._meta
+
+        if not unique_fields:
+            unique_fields = [opts.pk.name]
+
+        unique_fields = [opts.get_field(name) for name in unique_fields]
+
+        # records are found again by uuid, except objects that already had one, which rows of other writes can
+        # share: those are found by their unique fields when they're all set
+        uuids = set()
+        found_objs = objs
+
+        if hasattr(self.model, 'bm_create_uuid'):
+            found_objs = [
+                obj for obj in objs
+                if obj.bm_create_uuid and None not in [getattr(obj, f.attname) for f in unique_fields]
+            ]
+            found = set(map(id, found_objs))
+
+            # uuids already set on objects are kept, as bulk_create does
+            self._attach_bm_create_uuids(objs, bm_create_uuid)
+            uuids = {obj.bm_create_uuid for obj in objs if id(obj) not in found}
+
+        if update_fields is None:
+            update_fields = [
+                f for f in opts.concrete_fields
+                if not f.primary_key and f not in unique_fields and f.name != 'bm_create_uuid'
+            ]
+        else:
+            update_fields = [opts.get_field(name) for name in update_fields]
+
+        if uuids and return_queryset and update_fields:
+            # updated rows are stamped too, so they can be found again
+            bm_field = opts.get_field('bm_create_uuid')
+            if bm_field not in update_fields:
+                update_fields.append(bm_field)
+
+        if send_signal:
+            pre_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=objs),
+                lightweight_payload=lambda: dict(n=len(objs)),
+            )
+
+        n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
+        concurrent = self._get_concurrent(concurrent)
+
+        if concurrent:
+            chunks = self._get_concurrent_chunks(objs, batch_size, n_concurrent_writers)
+        else:
+            chunks = get_chunks(objs, batch_size)
+
+        if concurrent:
+            jobs = [
+                (BulkModelQuerySet._upsert_chunk, self, chunk, unique_fields, update_fields, strategy,)
+                for chunk in chunks if chunk
+            ]
+            executor = ConcurrentExecutor(jobs, max_workers=n_concurrent_writers)
+            n = sum(executor.run_async())
+
+        else:
+            n = 0
+            for chunk in chunks:
+                if not chunk:
+                    continue
+
+                n += self._upsert_chunk(chunk, unique_fields, update_fields, strategy)
+
+        if return_queryset:
+            qs = self._get_upserted_queryset(found_objs, unique_fields, uuids)
+        else:
+            qs = self.none()
+
+        if send_signal:
+            # keys of updated rows aren't returned; they're only known by reading the queryset back
+            post_bulk_create.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=objs, queryset=qs),
+                lightweight_payload=lambda: dict(
+                    n=len(objs), pks=list(qs.values_list('pk', flat=True)) if return_queryset else None
+                ),
+            )
+
+        if return_queryset:
+            return qs
+
+        return n
+
+
+    def merge_from_objects(self, objs, unique_fields=None, update_fields=None, bm_create_uuid=None, batch_size=None,
+                           send_signal=True, concurrent=False, max_concurrent_workers=None,
+                           return_queryset=False):
+        """
+        Inserts new objects and updates existing ones in one pass, if supported by the database being used
+
+        Objects are copied into a temporary staging table with COPY, then merged into the table with a single
+        INSERT ... SELECT ... ON CONFLICT DO UPDATE per batch; leave batch_size unset for a single statement.
+        Arguments are as for bulk_upsert
+
+        :param objs:
+        :param List[str] unique_fields:
+        :param List[str] update_fields:
+        :param UUID bm_create_uuid:
+        :param batch_size:
+        :param bool send_signal:
+        :param bool concurrent:
+        :param int max_concurrent_workers:
+        :param bool return_queryset:
+        :return:
+        """
+        return self.bulk_upsert(
+            objs, unique_fields=unique_fields, update_fields=update_fields, bm_create_uuid=bm_create_uuid,
+            batch_size=batch_size, send_signal=send_signal, concurrent=concurrent,
+            max_concurrent_workers=max_concurrent_workers, return_queryset=return_queryset, strategy='staging'
+        )
+
+
+
+    @staticmethod
+    def _get_delete_pks(chunk):
+        return sorted(set(chunk.order_by().values_list('pk', flat=True)))
+
+
+    def _delete_chunk(self, chunk, cascade=True, batch_size=None, deleted_pks=None):
+        """
+        Reads the keys of one chunk of the queryset and deletes them in a single transaction
+
+        :param chunk: the queryset narrowed to the chunk
+        :param bool cascade:
+        :param int batch_size:
+        :param list deleted_pks: the deleted keys are appended to it, if given
+        :return: a dictionary of the number of rows deleted, by model label
+        """
+        from .deletion import delete_pks
+
+        pks = self._get_delete_pks(chunk)
+        if not pks:
+            return {}
+
+        if deleted_pks is not None:
+            deleted_pks.extend(pks)
+
+        return delete_pks(self.model, pks, self.db, cascade, batch_size)
+
+
+
+    def bulk_delete(self, batch_size=None, concurrent=False, max_concurrent_workers=None, cascade=True,
+                    send_signal=True):
+        """
+        Deletes the records in the queryset by primary key, in chunks, without loading instances
+
+        Chunks are walked by primary key (see iter_pk_ranges), so only one chunk's keys are held in memory at a time.
+        Each chunk is deleted in its own transaction, by pk range when its keys are consecutive integers and
+        by pk list otherwise. Relations pointing at deleted rows are resolved with set-based statements where
+        their on_delete handler allows it (see deletion.BulkDeleter); pre_delete / post_delete are not sent
+
+        :param int batch_size: max number of rows per chunk; leave unset to delete all rows in one chunk
+        :param bool concurrent: delete chunks concurrently
+        :param int max_concurrent_workers:
+        :param bool cascade: resolve relations; when false only the rows themselves are deleted
+        :param bool send_signal: send pre_bulk_delete and post_bulk_delete; the primary keys are only read for
+            receivers that aren't connected with lightweight=True
+        :return: the number of rows deleted and a dictionary of the number of rows deleted by model label,
+            as for delete()
+        """
+        if not self.query.can_filter():
+            raise TypeError("Cannot use 'limit' or 'offset' with bulk_delete.")
+
+        if self._fields is not None:
+            raise TypeError('Cannot call bulk_delete() after .values() or .values_list()')
 
-        buf = StringIO()
-        n_objects = len(chunk)
-        n_fieldnames = len(fieldnames)
+        if send_signal:
+            pre_bulk_delete.send_lazy(
+                self.model,
+                payload=lambda: dict(pks=self._get_delete_pks(self), batch_size=batch_size),
+                lightweight_payload=lambda: dict(n=self.order_by().count(), batch_size=batch_size),
+            )
+
+        n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
+        concurrent = self._get_concurrent(concurrent)
+
+        # chunks are keyset ranges (see iter_pk_ranges): only the key closing each one is read up front, and
+        # the keys of a chunk are read when it's deleted. Later ranges start after the keys already deleted
+        if concurrent:
+            # without a batch_size, the rows are split evenly across the writers
+            chunk_size = self._get_concurrent_batch_size(batch_size, n_concurrent_writers)
+            ranges = [None] if chunk_size is None else list(self.iter_pk_ranges(chunk_size))
+        else:
+            ranges = [None] if batch_size is None else self.iter_pk_ranges(batch_size)
+
+        # deleted keys are only kept for receivers of the full payload
+        pks = [] if send_signal and post_bulk_delete.has_listeners(self.model) else None
+        bounds = []
+
+        def get_jobs():
+            for chunk_bounds in ranges:
+                bounds.append(chunk_bounds)
+                chunk = self.order_by() if chunk_bounds is None else self._filter_pk_range(*chunk_bounds)
+                yield (BulkModelQuerySet._delete_chunk, self, chunk, cascade, batch_size, pks)
+
+        if concurrent:
+            executor = ConcurrentExecutor(list(get_jobs()), max_workers=n_concurrent_writers)
+            results = executor.run_async()
+        else:
+            results = [ConcurrentExecutor._run_job(job) for job in get_jobs()]
+
+        deleted = Counter()
+        for result in results:
+            deleted.update(result)
+
+        deleted = dict(deleted)
+        n = sum(deleted.values())
+
+        self._result_cache = None
+
+        if send_signal:
+            post_bulk_delete.send_lazy(
+                self.model,
+                payload=lambda: dict(pks=sorted(pks), batch_size=batch_size, deleted=deleted, n=n),
+                lightweight_payload=lambda: dict(n=n, chunks=bounds, batch_size=batch_size, deleted=deleted),
+            )
+
+        return n, deleted
+
+
+
+    def _get_copy_fields(self, fieldnames=None, exclude_id=True):
+        opts = self.model._meta
+
+        if fieldnames:
+            fields = [opts.get_field(fieldname) for fieldname in fieldnames]
+        else:
+            fields = list(opts.concrete_fields)
+
+        if exclude_id:
+            fields = [f for f in fields if f is not opts.auto_field]
+
+        return fields
 
-        for i, obj in enumerate(chunk):
-            for j, fieldname in enumerate(fieldnames):
-                val = getattr(obj, fieldname)
-                if val is None:
-                    vstr = '\\N'
-                else:
-                    vstr = str(val)
 
-                buf.write(vstr)
+    def _get_loader(self):
+        from .loaders import get_loader
+        return get_loader(self.model, connections[self.db])
 
-                if j < n_fieldnames - 1:
-                    buf.write('\t')
 
-            if i < n_objects - 1:
-                buf.write('\n')
+    def _copy_from_chunk(self, tablename, fields, chunk, format='text'):
+        with self._chunk_stats() as chunk_stats:
+            if chunk_stats is not NULL_CHUNK:
+                chunk = count_rows(chunk, chunk_stats)
 
-        # rewind
-        buf.seek(0,0)
+            loader = self._get_loader()
+            loader.stats = chunk_stats
+            n_bytes = chunk_stats.bytes = loader.load(tablename, fields, chunk, format)
 
-        # iterate through the cursor and set \N for null
-        with dbconn.cursor() as cursor:
-            # run a copy from a cursor; note there's no need to commit here because there's no transaction
-            cursor.copy_from(buf, tablename, columns=tuple(fieldnames), sep='\t', null='\\N')
+        return n_bytes
 
-        buf.close()
-        del buf
+
+    def _can_copy_returning(self, fields):
+        """
+        Returns whether copied rows can be assigned the primary keys the database generates for them,
+        by staging them and inserting with INSERT ... SELECT ... RETURNING (PostgreSQL)
+
+        :param list fields: fields being copied
+        :return: bool
+        """
+        from .engines import StagingInsertEngine
+
+        auto_field = self.model._meta.auto_field
+        if auto_field is None or auto_field in fields:
+            return False
+
+        return StagingInsertEngine.is_supported(connections[self.db])
+
+
+    def _copy_from_chunk_returning(self, fields, chunk, format='text'):
+        """
+        Copies a chunk through a staging table and sets the assigned primary keys on its instances
+
+        :return: list of primary keys, aligned with chunk
+        """
+        from .engines import StagingInsertEngine, get_staging_engine
+
+        engine = get_staging_engine(StagingInsertEngine, self.model, connections[self.db])
+
+        with self._chunk_stats(len(chunk)) as chunk_stats:
+            engine.stats = chunk_stats
+            pks = engine.execute(fields, chunk, format)
+
+        for obj, pk in zip(chunk, pks):
+            if isinstance(obj, models.Model):
+                obj.pk = pk
+                obj._state.adding = False
+                obj._state.db = self.db
+
+        return pks
+
+
+    def _copy_from_payload(self, tablename, fields, payloads, i, format='text'):
+        # payloads is a BoundedSubmitter of COPY payloads encoded in other processes; this writes the i-th one
+        payload = payloads.result(i)
+        buf = io.BytesIO(payload) if format == 'binary' else io.StringIO(payload)
+
+        with self._chunk_stats(bytes=len(payload)) as chunk_stats:
+            loader = self._get_loader()
+            loader.stats = chunk_stats
+            loader.load_buffer(tablename, fields, buf, format)
+
+        return len(payload)
+
+
+    def _copy_from_encoded_chunks(self, tablename, fields, chunks, format, n_processes, n_writers):
+        """
+        Encodes chunks into COPY payloads on a pool of processes while a pool of threads writes
+        each payload as soon as it's ready
+
+        At most two chunks per process are submitted and not yet written; each payload taken by a writer lets
+        the next chunk be submitted, so the columns sent to the processes don't pile up in memory
+
+        :return: list of payload sizes
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from .buffers import encode_copy_payload, get_values_getter, init_encoding_process, pack_copy_columns
+
+        model_label = self.model._meta.label
+        fieldnames = [f.name for f in fields]
+        get_values = get_values_getter([f.attname for f in fields])
+
+        chunks = [chunk for chunk in chunks if chunk]
+
+        with ProcessPoolExecutor(n_processes, initializer=init_encoding_process) as pool:
+            # only columns of plain values are sent to the processes; chunks are packed as they're submitted
+            calls = (
+                (encode_copy_payload, model_label, fieldnames, pack_copy_columns(chunk, fields, get_values),
+                 format, self.db)
+                for chunk in chunks
+            )
+            payloads = BoundedSubmitter(pool, calls, 2 * n_processes)
+
+            jobs = [
+                (BulkModelQuerySet._copy_from_payload, self, tablename, fields, payloads, i, format)
+                for i in range(len(chunks))
+            ]
+            executor = ConcurrentExecutor(jobs, max_workers=n_writers, stats=self._active_stats)
+            return executor.run_async()
+
+
+
+    def _iter_attach_bm_create_uuids(self, objs, bm_create_uuid, attached):
+        # lazy counterpart of _attach_bm_create_uuids for streamed objects; row tuples are passed through
+        for obj in objs:
+            if not isinstance(obj, (tuple, list)):
+                if not getattr(obj, 'bm_create_uuid'):
+                    setattr(obj, 'bm_create_uuid', bm_create_uuid)
+                attached.add(getattr(obj, 'bm_create_uuid'))
+
+            yield obj
+
+
+
+    def _prepare_copy_objects(self, objs, bm_create_uuid, stream, stamp=True):
+        """
+        Stamps objects with a bm_create_uuid (lazily when streaming)
+
+        :return: tuple of (objs, set of bm_create_uuids, instances to send with the copy signals)
+        """
+        if not stamp or not hasattr(self.model, 'bm_create_uuid'):
+            return objs, set(), None if stream else objs
+
+        if not stream:
+            return objs, self._attach_bm_create_uuids(objs, bm_create_uuid), objs
+
+        bm_create_uuid = self._get_bm_create_uuid(bm_create_uuid)
+
+        # filled in as the objects are consumed
+        uuids = set()
+        return self._iter_attach_bm_create_uuids(objs, bm_create_uuid, uuids), uuids, None
 
 
 
     def copy_from_objects(self, objs, bm_create_uuid=None, exclude_id=True, signal=True,
                             concurrent=False, max_concurrent_workers=None,
                             fieldnames=None, batch_size=None,
-                            return_queryset=False):
+                            return_queryset=False, stream=None, format='text', encoding_processes=None):
         """
         Updates data in the databse using the COPY FROM operaiton, if supported by the database being used
 
+        Each batch is written with the backend's fastest bulk-load primitive (see bulkmodel.loaders): COPY on
+        PostgreSQL (psycopg2 or psycopg 3), LOAD DATA LOCAL INFILE on MySQL and a prepared executemany() in
+        one transaction on SQLite. The binary format and encoding_processes require PostgreSQL
+
+        In streaming mode objs can be any iterable, including a generator of model instances or of row tuples
+        ordered like fieldnames. Rows are encoded as the database reads them and each batch is sent as
+        its own COPY, so memory use stays constant regardless of the number of rows. Streamed batches are
+        written sequentially and the copy signals are sent with instances=None, so receivers can't consume
+        the iterator
+
         :param objs:
         :param bm_create_uuid:
         :param exclude_id:
@@ -527,55 +1850,518 @@ class BulkModelQuerySet(models.QuerySet):
         :param fieldnames:
         :param batch_size:
         :param return_queryset:
+        :param bool stream: stream objs instead of slicing them; defaults to True when objs isn't a list or tuple
+        :param str format: 'text' (the default) or 'binary' to send PostgreSQL's binary COPY format, encoded from the
+            model's field types
+        :param int encoding_processes: encode batches into COPY payloads on this many processes, while
+            max_concurrent_workers threads (one if not concurrent) write them; not available when streaming
         :return:
         """
-        from .helpers import get_chunks
+        if format not in ('text', 'binary'):
+            raise ValueError('Unknown COPY format: {}'.format(format))
 
-        is_bulkmodel = hasattr(self.model, 'bm_create_uuid')
-        if is_bulkmodel:
-            uuids = self._attach_bm_create_uuids(objs, bm_create_uuid)
-        else:
-            uuids = set()
+        loader = self._get_loader()
+        if format == 'binary' and format not in loader.formats:
+            raise ValueError('The binary format is not supported by {}'.format(type(loader).__name__))
 
-        # get the field names
-        if not fieldnames:
-            fieldnames = [i.name for i in self.model._meta.get_fields()]
+        if encoding_processes and not loader.formats:
+            raise ValueError('encoding_processes is not supported by {}'.format(type(loader).__name__))
 
+        if stream is None:
+            stream = not isinstance(objs, (list, tuple))
+
+        fields = self._get_copy_fields(fieldnames, exclude_id)
         tablename = self.model._meta.db_table
 
-        if exclude_id:
-            fieldnames = [i for i in fieldnames if i != 'id']
+        # primary keys are read back by staging the rows, unless the objects are streamed or encoded elsewhere
+        returning = (
+            return_queryset and not stream and not encoding_processes and self._can_copy_returning(fields)
+        )
+
+        objs, uuids, instances = self._prepare_copy_objects(
+            objs, bm_create_uuid, stream, stamp=bm_create_uuid is not None or not returning
+        )
 
         if signal:
-            pre_copy_from_instances.send(sender = self.model, instances=objs)
+            pre_copy_from_instances.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=instances),
+                lightweight_payload=lambda: dict(n=len(instances) if instances is not None else None),
+            )
 
         n_concurrent_writers = self._get_n_concurrent_workers(max_concurrent_workers)
-        concurrent = self._get_concurrent(concurrent)
+        concurrent = self._get_concurrent(concurrent) and not stream
+
+        stats = self._begin_stats('copy_from_objects', batch_size)
+        pks = None
+
+        # rows are copied rather than bound, so only latency bounds the size; sequential writes adapt
+        # it chunk by chunk, concurrent ones split objs by the size learned so far
+        sizer = self._get_batch_sizer('copy_from_objects') if self._is_auto_batch_size(batch_size) else None
+        if sizer is not None:
+            batch_size = sizer.size
+
+        if stream:
+            if encoding_processes:
+                raise ValueError('encoding_processes cannot be used when streaming objects')
+
+            for chunk in sizer.split(objs) if sizer is not None else iter_chunks(objs, batch_size):
+                self._copy_from_chunk(tablename, fields, chunk, format)
+
+        elif returning:
+            if concurrent:
+                chunks = self._get_concurrent_chunks(objs, batch_size, n_concurrent_writers)
+            elif sizer is None:
+                chunks = get_chunks(objs, batch_size)
+            else:
+                chunks = sizer.split(objs)
+
+            jobs = (
+                (BulkModelQuerySet._copy_from_chunk_returning, self, fields, chunk, format)
+                for chunk in chunks if chunk
+            )
 
-        chunks = get_chunks(objs, batch_size, n_concurrent_writers)
+            if concurrent:
+                results = ConcurrentExecutor(list(jobs), max_workers=n_concurrent_writers, stats=stats).run_async()
+            else:
+                results = [ConcurrentExecutor._run_job(job) for job in jobs]
 
-        if concurrent:
-            jobs = [(BulkModelQuerySet._copy_from_chunk, self, tablename, fieldnames, chunk) for chunk in chunks if chunk]
-            executor = ConcurrentExecutor(jobs)
+            pks = [pk for chunk_pks in results for pk in chunk_pks]
+
+        elif encoding_processes:
+            self._copy_from_encoded_chunks(
+                tablename, fields, self._get_concurrent_chunks(objs, batch_size, encoding_processes), format,
+                encoding_processes, n_concurrent_writers if concurrent else 1
+            )
+
+        elif concurrent:
+            chunks = self._get_concurrent_chunks(objs, batch_size, n_concurrent_writers)
+            jobs = [
+                (BulkModelQuerySet._copy_from_chunk, self, tablename, fields, chunk, format) for chunk in chunks if chunk
+            ]
+            executor = ConcurrentExecutor(jobs, max_workers=n_concurrent_writers, stats=stats)
             executor.run_async()
 
         else:
-            for chunk in chunks:
+            for chunk in sizer.split(objs) if sizer is not None else get_chunks(objs, batch_size):
                 if not chunk:
                     continue
 
-                self._copy_from_chunk(tablename, fieldnames, chunk)
+                self._copy_from_chunk(tablename, fields, chunk, format)
 
+        # streamed rows are counted as they're copied
+        self._finish_stats(stats, len(instances) if instances is not None else None)
 
-        if is_bulkmodel and return_queryset:
-            qs = self.filter(bm_create_uuid__in = uuids)
+        if return_queryset:
+            qs = self._get_created_queryset(pks, uuids)
         else:
             qs = self.none()
 
         if signal:
-            post_copy_from_instances.send(sender = self.model, instances=objs)
+            post_copy_from_instances.send_lazy(
+                self.model,
+                payload=lambda: dict(instances=instances),
+                lightweight_payload=lambda: dict(n=len(instances) if instances is not None else None, pks=pks),
+            )
 
         if return_queryset:
             return qs
 
         return None
+
+
+
+    def _get_copy_to_query(self):
+        """
+        Compiles the queryset for copy_to_iterator and copy_to_columns
+
+        :return: tuple of (compiler, sql, params, fields read, position of the first field in the select list,
+            whether rows are model instances); sql is None if the queryset is empty
+        """
+        compiler = self.query.get_compiler(self.db)
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            # the select list has been set up by then
+            sql, params = None, ()
+
+        if self._iterable_class is ModelIterable:
+            # model instances; only the model's own columns are read (e.g., not select_related ones)
+            select_fields = compiler.klass_info['select_fields']
+            offset = select_fields[0]
+            select = compiler.select[offset:select_fields[-1] + 1]
+            as_instances = True
+        else:
+            offset = 0
+            select = compiler.select
+            as_instances = False
+
+        fields = []
+        for expression, _, alias in select:
+            target = getattr(expression, 'target', None)
+            if target is None:
+                raise TypeError('copy_to_iterator() can only read columns, not {}'.format(alias or expression))
+
+            fields.append(target)
+
+        return compiler, sql, params, fields, offset, as_instances
+
+
+    def _get_copy_to_names(self, fields):
+        # the values() / values_list() fields, or the model's attnames
+        if self._fields and len(self._fields) == len(fields):
+            return list(self._fields)
+
+        return [f.attname for f in fields]
+
+
+    def copy_to_iterator(self, tuples=False, chunk_size=65536):
+        """
+        Lazily reads the queryset with the backend's loader (see bulkmodel.loaders): COPY (SELECT ...) TO STDOUT
+        on PostgreSQL, and a SELECT fetched chunk_size rows at a time on other databases
+
+        The queryset's filters, ordering, slicing and only() / defer() are applied. Output is parsed in chunks
+        of roughly chunk_size characters as it arrives, so memory use doesn't grow with the number of rows.
+        If the iterator is closed before the end, the COPY is cancelled with the driver's connection.cancel()
+
+        :param bool tuples: yield tuples of values instead of model instances, dicts (values()) or single
+            values (values_list(flat=True))
+        :param int chunk_size: size of the chunks COPY output is read in, or the number of rows fetched at a time
+        :return: generator of model instances, or of what the queryset's values() / values_list() would yield
+        """
+        compiler, sql, params, fields, offset, as_instances = self._get_copy_to_query()
+        stats = self._begin_stats('copy_to_iterator', chunk_size)
+
+        if sql is None:
+            self._finish_stats(stats)
+            return
+
+        rows = self._get_loader().read_rows(compiler, sql, params, fields, offset, chunk_size, stats)
+
+        iterable_class = self._iterable_class
+
+        if as_instances and not tuples:
+            from_db = self.model.from_db
+            db = self.db
+            attnames = [f.attname for f in fields]
+
+            for values in rows:
+                yield from_db(db, attnames, values)
+
+        elif iterable_class is ValuesIterable and not tuples:
+            names = self._get_copy_to_names(fields)
+            for values in rows:
+                yield dict(zip(names, values))
+
+        elif iterable_class is FlatValuesListIterable and not tuples:
+            for values in rows:
+                yield values[0]
+
+        elif iterable_class is NamedValuesListIterable and not tuples:
+            row_class = NamedValuesListIterable.create_namedtuple_class(*self._get_copy_to_names(fields))
+            for values in rows:
+                yield row_class(*values)
+
+        else:
+            for values in rows:
+                yield tuple(values)
+
+        self._finish_stats(stats)
+
+
+    def copy_to_columns(self, output='lists', chunk_size=65536):
+        """
+        Reads the queryset into column-oriented data with the backend's loader: COPY (SELECT ...) TO STDOUT on
+        PostgreSQL, and a SELECT fetched chunk_size rows at a time on other databases
+
+        No model instances are built; COPY output is parsed one column at a time per block of rows. Columns are
+        named after the values() / values_list() fields, or the model's attnames
+
+        :param str output: 'lists' for a dict of lists, 'tuples' for a list of values_list-style tuples,
+            'numpy' for a dict of NumPy arrays, or 'pandas' for a DataFrame
+        :param int chunk_size: size of the chunks COPY output is read in, or the number of rows fetched at a time
+        :return:
+        """
+        compiler, sql, params, fields, offset, _ = self._get_copy_to_query()
+        names = self._get_copy_to_names(fields)
+
+        stats = self._begin_stats('copy_to_columns', chunk_size)
+        columns = self._get_loader().read_columns(
+            compiler, sql, params, fields, names, output, offset, chunk_size, stats
+        )
+
+        self._finish_stats(stats)
+        return columns
+
+
+
+    # region asyncio
+
+    @staticmethod
+    async def _run_on_pool(pool, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(pool, partial(func, *args, **kwargs))
+
+
+    async def abulk_create(self, objs, bm_create_uuid=None, batch_size=None, send_signal=True,
+                           max_concurrent_workers=None, return_queryset=False):
+        """
+        Coroutine counterpart of bulk_create, for use from a running event loop (e.g., an ASGI view)
+
+        Batches are written on a bounded pool of threads, at most max_concurrent_workers at a time, without
+        blocking the loop. Signals are sent from the pool too, so receivers can use the ORM
+
+        :param objs:
+        :param UUID bm_create_uuid:
+        :param batch_size:
+        :param bool send_signal:
+        :param int max_concurrent_workers:
+        :param bool return_queryset:
+        :return: the created objects, or a queryset of them if return_queryset is set
+        """
+        objs = list(objs)
+        returns_pks = self._returns_pks()
+
+        if hasattr(self.model, 'bm_create_uuid') and (bm_create_uuid is not None or not returns_pks):
+            uuids = self._attach_bm_create_uuids(objs, bm_create_uuid)
+        else:
+            uuids = set()
+
+        n_workers = self._get_n_concurrent_workers(max_concurrent_workers)
+        pool = ConnectionThreadPool(n_workers)
+
+        try:
+            # the pool is only entered when there's a receiver to run
+            if send_signal and pre_bulk_create.has_receivers(self.model):
+                await self._run_on_pool(
+                    pool, pre_bulk_create.send_lazy, self.model,
+                    payload=lambda: dict(instances=objs),
+                    lightweight_payload=lambda: dict(n=len(objs)),
+                )
+
+            stats = self._begin_stats('abulk_create', batch_size)
+
+            if self._is_auto_batch_size(batch_size):
+                batch_size = self._get_batch_sizer('bulk_create', self._get_max_insert_batch_size()).size
+
+            f = super().bulk_create
+            jobs = [(f, chunk,) for chunk in self._get_concurrent_chunks(objs, batch_size, n_workers) if chunk]
+            executor = ConcurrentExecutor(jobs, max_workers=n_workers, stats=stats)
+            result = [obj for created in await executor.arun(pool) for obj in created]
+
+            self._finish_stats(stats, len(objs))
+
+            if return_queryset:
+                qs = self._get_created_queryset(self._get_returned_pks(objs, returns_pks), uuids)
+            else:
+                qs = self.none()
+
+            if send_signal and post_bulk_create.has_receivers(self.model):
+                await self._run_on_pool(
+                    pool, post_bulk_create.send_lazy, self.model,
+                    payload=lambda: dict(instances=objs, queryset=qs),
+                    lightweight_payload=lambda: dict(n=len(objs), pks=self._get_returned_pks(objs, returns_pks)),
+                )
+
+        finally:
+            pool.shutdown(wait=False)
+
+        if return_queryset:
+            return qs
+
+        return result
+
+
+    async def aupdate_fields(self, *fieldnames, objects=None, batch_size=None, send_signal=True,
+                             max_concurrent_workers=None, return_queryset=False, strategy=None):
+        """
+        Coroutine counterpart of update_fields, for use from a running event loop
+
+        The queryset is read and the batches are written on a bounded pool of threads, at most
+        max_concurrent_workers at a time, without blocking the loop
+
+        :param fieldnames:
+        :param objects:
+        :param batch_size:
+        :param bool send_signal:
+        :param int max_concurrent_workers:
+        :param bool return_queryset:
+        :param str strategy: 'values', 'case' or None (the default) to choose automatically
+        :return:
+        """
+        auto = self._is_auto_batch_size(batch_size)
+        stats = self._begin_stats('aupdate_fields', batch_size)
+
+        n_workers = self._get_n_concurrent_workers(max_concurrent_workers)
+        pool = ConnectionThreadPool(n_workers)
+
+        try:
+            fieldnames, fields, snapshots, track_changes = await self._run_on_pool(
+                pool, self._begin_update_fields, fieldnames, objects, batch_size, send_signal
+            )
+
+            chunk_size = self._get_update_fields_sizer(snapshots, strategy).size if auto else batch_size
+            jobs = [
+                (BulkModelQuerySet._update_fields_chunk, self, chunk, strategy,)
+                for chunk in self._get_update_chunks(snapshots, chunk_size, max_chunks=n_workers)
+            ]
+            executor = ConcurrentExecutor(jobs, max_workers=n_workers, stats=stats)
+            n = sum(await executor.arun(pool))
+
+            self._finish_stats(stats, n)
+
+            return await self._run_on_pool(
+                pool, self._end_update_fields,
+                fieldnames, fields, snapshots, track_changes, n, batch_size, send_signal, return_queryset
+            )
+
+        finally:
+            pool.shutdown(wait=False)
+
+
+    async def _acopy_chunk(self, writer, sql, encoder, chunk):
+        with self._chunk_stats() as chunk_stats:
+            if chunk_stats is not NULL_CHUNK:
+                chunk = count_rows(chunk, chunk_stats)
+
+            with chunk_stats.timing('execute'):
+                chunk_stats.bytes = await writer.write(sql, encoder.encode_rows(chunk))
+
+
+    async def _acopy_from_chunks(self, tablename, fields, objs, format, stream, batch_size, n_workers):
+        # native COPY over psycopg 3 async connections; rows are encoded on the loop, a block at a time
+        from .aio import AsyncCopyWriter
+        from .buffers import get_row_encoder
+
+        dbconn = connections[self.db]
+        sql = self._get_loader().get_sql(tablename, fields, format)
+        writer = AsyncCopyWriter(dbconn)
+
+        if format == 'binary':
+            encoder = get_row_encoder(fields, 'binary', dbconn)
+        else:
+            encoder = get_row_encoder(fields)
+
+        try:
+            if stream:
+                # chunks share the source iterator, so they're written one after the other
+                for chunk in iter_chunks(objs, batch_size):
+                    await self._acopy_chunk(writer, sql, encoder, chunk)
+
+            else:
+                await gather_bounded([
+                    partial(self._acopy_chunk, writer, sql, encoder, chunk)
+                    for chunk in self._get_concurrent_chunks(objs, batch_size, n_workers) if chunk
+                ], n_workers)
+
+        finally:
+            await writer.close()
+
+
+    async def acopy_from_objects(self, objs, bm_create_uuid=None, exclude_id=True, signal=True,
+                                 max_concurrent_workers=None, fieldnames=None, batch_size=None,
+                                 return_queryset=False, stream=None, format='text'):
+        """
+        Coroutine counterpart of copy_from_objects, for use from a running event loop
+
+        With psycopg 3, batches are copied over async connections; otherwise they're copied on a bounded
+        pool of threads. Either way at most max_concurrent_workers batches are written at once, and
+        streamed objects are written one batch at a time
+
+        :param objs:
+        :param bm_create_uuid:
+        :param exclude_id:
+        :param signal:
+        :param int max_concurrent_workers:
+        :param fieldnames:
+        :param batch_size:
+        :param return_queryset:
+        :param bool stream: stream objs instead of slicing them; defaults to True when objs isn't a list or tuple
+        :param str format: 'text' or 'binary'
+        :return:
+        """
+        from .aio import supports_async_copy
+
+        if format not in ('text', 'binary'):
+            raise ValueError('Unknown COPY format: {}'.format(format))
+
+        loader = self._get_loader()
+        if format == 'binary' and format not in loader.formats:
+            raise ValueError('The binary format is not supported by {}'.format(type(loader).__name__))
+
+        if stream is None:
+            stream = not isinstance(objs, (list, tuple))
+
+        fields = self._get_copy_fields(fieldnames, exclude_id)
+        tablename = self.model._meta.db_table
+
+        returning = return_queryset and not stream and self._can_copy_returning(fields)
+
+        objs, uuids, instances = self._prepare_copy_objects(
+            objs, bm_create_uuid, stream, stamp=bm_create_uuid is not None or not returning
+        )
+
+        n_workers = self._get_n_concurrent_workers(max_concurrent_workers)
+        pool = ConnectionThreadPool(n_workers)
+
+        stats = self._begin_stats('acopy_from_objects', batch_size)
+
+        if self._is_auto_batch_size(batch_size):
+            batch_size = self._get_batch_sizer('copy_from_objects').size
+
+        try:
+            if signal and pre_copy_from_instances.has_receivers(self.model):
+                await self._run_on_pool(
+                    pool, pre_copy_from_instances.send_lazy, self.model,
+                    payload=lambda: dict(instances=instances),
+                    lightweight_payload=lambda: dict(n=len(instances) if instances is not None else None),
+                )
+
+            pks = None
+
+            if returning:
+                jobs = [
+                    (BulkModelQuerySet._copy_from_chunk_returning, self, fields, chunk, format)
+                    for chunk in self._get_concurrent_chunks(objs, batch_size, n_workers) if chunk
+                ]
+                executor = ConcurrentExecutor(jobs, max_workers=n_workers, stats=stats)
+                pks = [pk for chunk_pks in await executor.arun(pool) for pk in chunk_pks]
+
+            elif supports_async_copy(connections[self.db]):
+                await self._acopy_from_chunks(tablename, fields, objs, format, stream, batch_size, n_workers)
+
+            elif stream:
+                for chunk in iter_chunks(objs, batch_size):
+                    # the chunk is consumed on the pool's thread before the next one is requested
+                    await self._run_on_pool(pool, self._copy_from_chunk, tablename, fields, chunk, format)
+
+            else:
+                jobs = [
+                    (BulkModelQuerySet._copy_from_chunk, self, tablename, fields, chunk, format)
+                    for chunk in self._get_concurrent_chunks(objs, batch_size, n_workers) if chunk
+                ]
+                executor = ConcurrentExecutor(jobs, max_workers=n_workers, stats=stats)
+                await executor.arun(pool)
+
+            self._finish_stats(stats, len(instances) if instances is not None else None)
+
+            if return_queryset:
+                qs = self._get_created_queryset(pks, uuids)
+            else:
+                qs = self.none()
+
+            if signal and post_copy_from_instances.has_receivers(self.model):
+                await self._run_on_pool(
+                    pool, post_copy_from_instances.send_lazy, self.model,
+                    payload=lambda: dict(instances=instances),
+                    lightweight_payload=lambda: dict(n=len(instances) if instances is not None else None, pks=pks),
+                )
+
+        finally:
+            pool.shutdown(wait=False)
+
+        if return_queryset:
+            return qs
+
+        return None
+
+    # endregion
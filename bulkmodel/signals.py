@@ -1,38 +1,150 @@
 from django.db.models.signals import ModelSignal
 
 
+class BulkSignal(ModelSignal):
+    """
+    A model signal whose payload is only built when it has live receivers
+
+    Receivers connected with lightweight=True are sent a small payload (e.g., primary keys, row counts or
+    chunk boundaries) instead of model instances; they're kept on a companion signal, self.lightweight
+
+    """
+    def __init__(self, providing_args=None, lightweight_args=None, use_caching=False):
+        super().__init__(providing_args=providing_args, use_caching=use_caching)
+        self.lightweight = ModelSignal(providing_args=lightweight_args, use_caching=use_caching)
+
+
+    def connect(self, receiver, sender=None, weak=True, dispatch_uid=None, apps=None, lightweight=False):
+        if lightweight:
+            return self.lightweight.connect(receiver, sender=sender, weak=weak, dispatch_uid=dispatch_uid, apps=apps)
+
+        return super().connect(receiver, sender=sender, weak=weak, dispatch_uid=dispatch_uid, apps=apps)
+
+
+    def disconnect(self, receiver=None, sender=None, dispatch_uid=None, apps=None, lightweight=False):
+        if lightweight:
+            return self.lightweight.disconnect(receiver, sender=sender, dispatch_uid=dispatch_uid, apps=apps)
+
+        return super().disconnect(receiver, sender=sender, dispatch_uid=dispatch_uid, apps=apps)
+
+
+    def has_receivers(self, sender=None):
+        """
+        Returns whether any live receivers, lightweight or not, are connected for sender
+
+        :param sender:
+        :return: bool
+        """
+        return self.has_listeners(sender) or self.lightweight.has_listeners(sender)
+
+
+    def send_lazy(self, sender, payload=None, lightweight_payload=None):
+        """
+        Sends the signal, building each payload only if receivers of that kind are connected
+
+        :param sender:
+        :param payload: callable returning the keyword arguments sent to receivers
+        :param lightweight_payload: callable returning the keyword arguments sent to lightweight receivers
+        :return: list of (receiver, response) tuples
+        """
+        responses = []
+
+        if payload is not None and self.has_listeners(sender):
+            responses.extend(self.send(sender, **payload()))
+
+        if lightweight_payload is not None and self.lightweight.has_listeners(sender):
+            responses.extend(self.lightweight.send(sender, **lightweight_payload()))
+
+        return responses
+
+
+
 # These signals are sent when model instances are created in bulk
-pre_bulk_create = ModelSignal(providing_args=['instances'])
-post_bulk_create = ModelSignal(providing_args=['instances'])
+pre_bulk_create = BulkSignal(providing_args=['instances'], lightweight_args=['n'])
+post_bulk_create = BulkSignal(providing_args=['instances', 'queryset'], lightweight_args=['n', 'pks'])
 
 
 # These signals are sent when a model is updated homogeneously (i.e.: queryset.update(field=value)
-pre_update = ModelSignal(providing_args=['instances'])
-post_update = ModelSignal(providing_args=['instances'])
+pre_update = BulkSignal(providing_args=['instances'], lightweight_args=['queryset', 'batch_size'])
+post_update = BulkSignal(providing_args=['instances'], lightweight_args=['n', 'chunks', 'batch_size'])
 
 
 # These signals are sent when a model's fields are updated heterogeously (i.e.: queryset.update_fields(...))
-pre_update_fields = ModelSignal(providing_args=[
+pre_update_fields = BulkSignal(providing_args=[
     'instances',
     'field_names',
     'field_defaults',
     'batch_size'
+], lightweight_args=[
+    'pks',
+    'field_names',
+    'batch_size'
 ])
 
-post_update_fields = ModelSignal(providing_args=[
+post_update_fields = BulkSignal(providing_args=[
     'instances',
     'queryset',
     'field_names',
     'field_defaults',
     'batch_size',
     'n'
+], lightweight_args=[
+    'pks',
+    'field_names',
+    'batch_size',
+    'n'
 ])
 
 
-pre_copy_from_instances = ModelSignal(providing_args=[
+pre_copy_from_instances = BulkSignal(providing_args=[
     'instances'
+], lightweight_args=[
+    'n'
 ])
 
-post_copy_from_instances = ModelSignal(providing_args=[
+post_copy_from_instances = BulkSignal(providing_args=[
     'instances'
+], lightweight_args=[
+    'n',
+    'pks'
+])
+
+
+# These signals are sent when rows are deleted in bulk (i.e.: queryset.bulk_delete()); they carry primary keys,
+# not instances
+pre_bulk_delete = BulkSignal(providing_args=[
+    'pks',
+    'batch_size'
+], lightweight_args=[
+    'n',
+    'batch_size'
+])
+
+post_bulk_delete = BulkSignal(providing_args=[
+    'pks',
+    'batch_size',
+    'deleted',
+    'n'
+], lightweight_args=[
+    'n',
+    'chunks',
+    'batch_size',
+    'deleted'
+])
+
+
+# These signals are sent when m2m relationships are updated in bulk (i.e.: queryset.update_m2m_fields(...)); they carry
+# the pairs added and removed, keyed on the primary keys of the model being updated
+pre_update_m2m_fields = ModelSignal(providing_args=[
+    'field_name',
+    'through',
+    'added',
+    'removed'
+])
+
+post_update_m2m_fields = ModelSignal(providing_args=[
+    'field_name',
+    'through',
+    'added',
+    'removed'
 ])
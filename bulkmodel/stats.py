@@ -0,0 +1,345 @@
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ChunkStats(object):
+    """
+    Measurements of one chunk written (or read) by a bulk operation
+
+    """
+    __slots__ = ('rows', 'bytes', 'build_time', 'execute_time', 'latency', 'worker')
+
+
+    def __init__(self, rows=0, bytes=0):
+        # number of rows written or read
+        self.rows = rows
+
+        # number of bytes (or characters, for text COPY) sent or received over COPY
+        self.bytes = bytes
+
+        # seconds spent building statements and executing them; the remainder of the latency is
+        # spent elsewhere, e.g. encoding rows as the driver reads them
+        self.build_time = 0.0
+        self.execute_time = 0.0
+
+        # seconds from the start of the chunk to its end
+        self.latency = 0.0
+
+        # name of the thread the chunk ran on
+        self.worker = threading.current_thread().name
+
+
+    @contextmanager
+    def timing(self, phase):
+        """
+        Adds the time spent in the block to a phase of the chunk
+
+        :param str phase: 'build' or 'execute'
+        :return:
+        """
+        attr = '{}_time'.format(phase)
+        start = time.perf_counter()
+
+        try:
+            yield self
+        finally:
+            setattr(self, attr, getattr(self, attr) + time.perf_counter() - start)
+
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+
+class NullChunkStats(object):
+    """
+    Stands in for a ChunkStats when stats aren't being collected; every measurement is discarded
+
+    """
+    rows = bytes = 0
+    build_time = execute_time = latency = 0.0
+    worker = None
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+    def __setattr__(self, name, value):
+        pass
+
+
+    def timing(self, phase):
+        return self
+
+
+NULL_CHUNK = NullChunkStats()
+
+
+
+def count_rows(rows, chunk):
+    """
+    Passes rows through, counting them on chunk as they're consumed
+
+    :param collections.Iterable rows:
+    :param ChunkStats chunk:
+    :return: generator
+    """
+    for row in rows:
+        chunk.rows += 1
+        yield row
+
+
+
+def record_reads(stats, blocks):
+    """
+    Passes blocks of COPY TO output (or lists of fetched rows) through, recording each as a chunk of stats;
+    the time spent waiting for a block counts as executing
+
+    :param OperationStats stats:
+    :param blocks: iterable of str, one row per line, or of lists of rows
+    :return: generator of str or lists
+    """
+    blocks = iter(blocks)
+
+    while True:
+        start = time.perf_counter()
+        block = next(blocks, None)
+        if block is None:
+            return
+
+        if isinstance(block, str):
+            chunk = ChunkStats(rows=block.count('\n'), bytes=len(block))
+        else:
+            chunk = ChunkStats(rows=len(block))
+
+        chunk.execute_time = chunk.latency = time.perf_counter() - start
+        stats.add_chunk(chunk)
+
+        yield block
+
+
+
+class OperationStats(object):
+    """
+    Measurements of a single bulk operation (e.g., one call to bulk_create)
+
+    Chunks can be recorded from several threads at once, so hooks may be called concurrently
+
+    """
+    def __init__(self, operation, model, batch_size=None, callback=None, hooks=()):
+        """
+        :param str operation: name of the queryset method, e.g. 'bulk_create'
+        :param model:
+        :param batch_size:
+        :param callback: called with the stats once the operation has finished
+        :param list[StatsHook] hooks:
+        """
+        self.operation = operation
+        self.model = model._meta.label
+        self.batch_size = batch_size
+        self.callback = callback
+        self.hooks = list(hooks)
+
+        self.chunks = []
+
+        # total number of rows written or read; set when the operation finishes
+        self.rows = 0
+
+        # seconds each worker thread spent running jobs, by thread name
+        self.worker_time = {}
+
+        # workers available to the operation's concurrent jobs, multiplied by the seconds they were available
+        self.pool_time = 0.0
+        self.n_workers = 0
+
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+        self._lock = threading.Lock()
+
+
+    @property
+    def bytes(self):
+        return sum(chunk.bytes for chunk in self.chunks)
+
+
+    @property
+    def build_time(self):
+        return sum(chunk.build_time for chunk in self.chunks)
+
+
+    @property
+    def execute_time(self):
+        return sum(chunk.execute_time for chunk in self.chunks)
+
+
+    @property
+    def utilization(self):
+        """
+        Fraction of the time concurrent workers were available that they spent running jobs,
+        or None if no jobs ran concurrently
+
+        :return: float
+        """
+        if not self.pool_time:
+            return None
+
+        return sum(self.worker_time.values()) / self.pool_time
+
+
+    @contextmanager
+    def chunk(self, rows=0, bytes=0):
+        """
+        Records a chunk; its latency is the time spent in the block
+
+        :param int rows:
+        :param int bytes:
+        :return: the ChunkStats being recorded
+        """
+        chunk = ChunkStats(rows, bytes)
+        start = time.perf_counter()
+
+        yield chunk
+
+        chunk.latency = time.perf_counter() - start
+        self.add_chunk(chunk)
+
+
+    def add_chunk(self, chunk):
+        with self._lock:
+            self.chunks.append(chunk)
+
+        for hook in self.hooks:
+            hook.on_chunk(self, chunk)
+
+
+    def add_worker_time(self, worker, seconds):
+        with self._lock:
+            self.worker_time[worker] = self.worker_time.get(worker, 0.0) + seconds
+
+
+    def add_pool_time(self, n_workers, seconds):
+        with self._lock:
+            self.n_workers = max(self.n_workers, n_workers)
+            self.pool_time += n_workers * seconds
+
+
+    def finish(self, rows=None):
+        """
+        Marks the operation as finished and passes the stats to the callback and hooks
+
+        :param int rows: total number of rows written or read; defaults to the sum over chunks
+        :return:
+        """
+        self.elapsed = time.perf_counter() - self.started
+        self.rows = rows if rows is not None else sum(chunk.rows for chunk in self.chunks)
+
+        if self.callback is not None:
+            self.callback(self)
+
+        for hook in self.hooks:
+            hook.on_finish(self)
+
+
+    def as_dict(self):
+        return {
+            'operation': self.operation,
+            'model': self.model,
+            'batch_size': self.batch_size,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'elapsed': self.elapsed,
+            'build_time': self.build_time,
+            'execute_time': self.execute_time,
+            'n_workers': self.n_workers,
+            'utilization': self.utilization,
+            'chunks': [chunk.as_dict() for chunk in self.chunks],
+        }
+
+
+    def __repr__(self):
+        return '<OperationStats {} {}: {} rows in {} chunks>'.format(
+            self.operation, self.model, self.rows, len(self.chunks)
+        )
+
+
+
+class StatsHook(object):
+    """
+    Receives the stats of every bulk operation, e.g. to forward them to a metrics system
+
+    Subclass and override either method, then register an instance with register_hook() or list the class's
+    dotted path in the BULKMODEL_STATS_HOOKS setting
+
+    """
+    def on_chunk(self, stats, chunk):
+        """
+        Called after each chunk; may be called from worker threads
+
+        :param OperationStats stats:
+        :param ChunkStats chunk:
+        :return:
+        """
+        pass
+
+
+    def on_finish(self, stats):
+        """
+        Called once the operation has finished
+
+        :param OperationStats stats:
+        :return:
+        """
+        pass
+
+
+
+_hooks = []
+
+# instances of the hooks named in BULKMODEL_STATS_HOOKS, by dotted path
+_settings_hooks = {}
+
+
+def register_hook(hook):
+    """
+    Registers a hook to receive the stats of every bulk operation
+
+    :param StatsHook hook:
+    :return: the hook
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+    return hook
+
+
+
+def unregister_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+
+def get_hooks():
+    """
+    Returns the registered hooks followed by those named in the BULKMODEL_STATS_HOOKS setting
+
+    :return: list[StatsHook]
+    """
+    hooks = list(_hooks)
+
+    for path in getattr(settings, 'BULKMODEL_STATS_HOOKS', ()):
+        hook = _settings_hooks.get(path)
+        if hook is None:
+            hook = _settings_hooks[path] = import_string(path)()
+
+        hooks.append(hook)
+
+    return hooks